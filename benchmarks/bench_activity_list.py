@@ -0,0 +1,64 @@
+'''
+Benchmarks the ActivityList operations on large lists. Each operation should take about the same time per call whatever the size of the list.
+
+Run from the repository root with "python benchmarks/bench_activity_list.py".
+'''
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from Yelist import Activity, ActivityList
+
+SIZES = [100, 1000, 10000]
+
+def run(n, rng):
+
+    '''
+    Builds an activity list of n activities at random priorities, then reprioritizes, looks up and removes activities at random
+
+    Parameters
+    ----------
+    n (int):
+        The number of activities
+    rng (random.Random):
+        The random number generator
+
+    Returns
+    -------
+    A dictionary of operation name, mean microseconds per call pairs
+    '''
+
+    a_list = ActivityList()
+    timings = {}
+
+    start = time.perf_counter()
+    for i in range(n):
+        a_list.add_to_list(Activity(f'Activity {i}', rng.randint(1, i + 1), None))
+    timings['add'] = (time.perf_counter() - start) / n * 1e6
+
+    start = time.perf_counter()
+    for _ in range(n):
+        a_list.change_list_priority(rng.randint(1, n), rng.randint(1, n))
+    timings['change priority'] = (time.perf_counter() - start) / n * 1e6
+
+    start = time.perf_counter()
+    for _ in range(n):
+        a_list.activity(rng.randint(1, n)).prio
+    timings['lookup + prio'] = (time.perf_counter() - start) / n * 1e6
+
+    start = time.perf_counter()
+    for i in range(n):
+        a_list.remove_from_list(rng.randint(1, n - i))
+    timings['remove'] = (time.perf_counter() - start) / n * 1e6
+
+    return timings
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    for n in SIZES:
+        timings = run(n, rng)
+        print(f"{n:>6} activities: " + ", ".join(f"{name} {us:.1f} us" for name, us in timings.items()))
@@ -0,0 +1,86 @@
+'''
+Benchmarks the search fan-out against backends with heavy-tailed latency: one backend alone, two backends searched at once (first adequate answer) and two backends hedged (the second one only starts if the first has not answered within the hedge delay).
+
+Run from the repository root with "python benchmarks/bench_backends.py".
+'''
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from backends import FanOutBackend, SearchBackend, normalize
+from stub_yelp import StubYelpAPI
+
+SEARCHES = 400
+CONCURRENCY = 20
+CATEGORIES = ['coffee', 'bakeries', 'thai', 'sushi', 'pizza']
+
+class SlowBackend(SearchBackend):
+
+    '''
+    A backend answering from the local stand-in after a random latency: mostly about 20 ms, with one search in 20 taking 10 times longer.
+    '''
+
+    def __init__(self, name, rng):
+        self.name = name
+        self.rng = rng
+        self.client = StubYelpAPI()
+        self.calls = 0
+
+    async def search(self, **params):
+        self.calls += 1
+        latency = self.rng.lognormvariate(-3.9, 0.3)
+        if self.rng.random() < 0.05:
+            latency *= 10
+        await asyncio.sleep(latency)
+        return normalize(self.client.search_query(**params))
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+async def run(backend, rng):
+
+    '''
+    Runs the searches through a backend, CONCURRENCY at a time
+
+    Parameters
+    ----------
+    backend (SearchBackend):
+        The backend to search
+    rng (random.Random):
+        The random number generator
+
+    Returns
+    -------
+    A list of the search latencies in milliseconds
+    '''
+
+    latencies = []
+    limit = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with limit:
+            start = time.perf_counter()
+            await backend.search(location='San Francisco', categories=rng.choice(CATEGORIES), radius=16090, sort_by='rating', limit=10, offset=0)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(SEARCHES)))
+    return latencies
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    setups = {
+        'single backend': lambda members: members[0],
+        'fan-out, both at once': lambda members: FanOutBackend(members),
+        'fan-out, hedged after 40 ms': lambda members: FanOutBackend(members, hedge_delay=0.04),
+    }
+    for label, setup in setups.items():
+        members = [SlowBackend('a', rng), SlowBackend('b', rng)]
+        latencies = asyncio.run(run(setup(members), rng))
+        calls = sum(member.calls for member in members)
+        print(f"{label:<28} p50 {percentile(latencies, 50):6.1f} ms, p95 {percentile(latencies, 95):6.1f} ms, p99 {percentile(latencies, 99):6.1f} ms, {calls / SEARCHES:.2f} backend calls per search")
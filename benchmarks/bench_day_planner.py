@@ -0,0 +1,35 @@
+'''
+Benchmarks the DayPlanner on large lists: splitting thousands of stops into daily tours should take a few seconds at most.
+
+Run from the repository root with "python benchmarks/bench_day_planner.py".
+'''
+
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from day_planner import DayPlanner
+
+SIZES = [100, 1000, 5000]
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    origins = [{'latitude': 37.78, 'longitude': -122.42}, {'latitude': 37.72, 'longitude': -122.47}]
+
+    for n in SIZES:
+        # Stand-ins for Activity objects with businesses scattered around San Francisco
+        activities = []
+        for i in range(n):
+            coordinates = {'latitude': 37.70 + rng.uniform(0, 0.12), 'longitude': -122.51 + rng.uniform(0, 0.14)}
+            activities.append(SimpleNamespace(name=f'Activity {i}', prio=i + 1, business=SimpleNamespace(name=f'Business {i}', coordinates=coordinates)))
+
+        start = time.perf_counter()
+        days = DayPlanner(origins).plan(activities)
+        elapsed = time.perf_counter() - start
+
+        miles = sum(day.distance for day in days) / 1609
+        print(f"{n:>5} stops: {len(days)} days, {miles / len(days):.1f} miles per day, {elapsed:.2f} s")
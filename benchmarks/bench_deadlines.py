@@ -0,0 +1,108 @@
+'''
+Benchmarks per-call deadlines and hedged requests against a stand-in YelpAPI with heavy-tailed latency: most calls take about 10 ms, one in 50 takes 300 ms. Each plan searches 12 categories with a new handler, as the program does for every search, and the handlers share one latency tracker; the median and tail plan latencies are reported apart, with the activities left unassigned by the deadlines.
+
+Run from the repository root with "python benchmarks/bench_deadlines.py".
+'''
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from Yelist import Activity, ActivityList, YelpAPIHandler
+from deadlines import HedgedCaller, LatencyTracker
+from stub_yelp import StubYelpAPI
+from yelp_categories import CategoryTree
+
+PLANS = 60
+CATEGORIES = ['coffee', 'bakeries', 'thai', 'sushi', 'pizza', 'bars', 'gyms', 'bookstores', 'parks', 'museums', 'vegan', 'tacos']
+SLOW_RATE = 0.02
+
+class SlowStub(StubYelpAPI):
+
+    '''
+    A StubYelpAPI whose calls take about 10 ms, except one in 50 that takes 300 ms.
+    '''
+
+    def __init__(self, seed):
+        super().__init__()
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def search_query(self, **params):
+        with self.rng_lock:
+            latency = 0.3 if self.rng.random() < SLOW_RATE else self.rng.uniform(0.008, 0.012)
+        time.sleep(latency)
+        return super().search_query(**params)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def run(tree, view, **settings):
+
+    '''
+    Searches PLANS plans, each with a new handler, with the given deadline and hedging settings
+
+    Parameters
+    ----------
+    tree (CategoryTree):
+        The category tree
+    view (CountryView):
+        The categories available in the US
+    **settings:
+        The YelpAPIHandler attributes to set (request_timeout, deadline, hedge)
+
+    Returns
+    -------
+    latencies (float[]):
+        The plan latencies in milliseconds
+    unassigned (int):
+        The number of activities left unassigned by the deadlines
+    caller (HedgedCaller):
+        The caller shared by the handlers
+    '''
+
+    client = SlowStub(0)
+    tracker = LatencyTracker()
+    caller = HedgedCaller()
+
+    latencies = []
+    unassigned = 0
+    for _ in range(PLANS):
+        a_list = ActivityList()
+        for alias in CATEGORIES:
+            a_list.add_to_list(Activity(alias, len(a_list) + 1, tree.nodes[alias]))
+
+        handler = YelpAPIHandler(None, 'San Francisco', 16090, view, tree, client=client, latency=tracker, caller=caller)
+        for name, value in settings.items():
+            setattr(handler, name, value)
+
+        start = time.perf_counter()
+        handler.API_call(a_list.list, 'rating')
+        latencies.append((time.perf_counter() - start) * 1000)
+        unassigned += sum(1 for a in a_list.list if a.category.alias in handler.late)
+
+    caller.shutdown()
+    return latencies, unassigned, caller
+
+if __name__ == "__main__":
+    with open(os.path.join(os.path.dirname(__file__), '..', 'src', 'categories.json')) as file:
+        tree = CategoryTree(json.load(file))
+    view = tree.country_view('US')
+
+    setups = {
+        'no deadlines': {},
+        'hedged after the p95': {'hedge': True},
+        '100 ms per call': {'request_timeout': 0.1},
+        '250 ms per search': {'deadline': 0.25},
+        'hedged, 250 ms per search': {'hedge': True, 'deadline': 0.25},
+    }
+    for label, settings in setups.items():
+        latencies, unassigned, caller = run(tree, view, **settings)
+        hedged = f", {caller.hedged} calls hedged" if caller.hedged else ""
+        print(f"{label:<26} plan p50 {percentile(latencies, 50):6.1f} ms, p95 {percentile(latencies, 95):6.1f} ms, p99 {percentile(latencies, 99):6.1f} ms, {unassigned} of {PLANS * len(CATEGORIES)} activities unassigned{hedged}")
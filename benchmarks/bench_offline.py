@@ -0,0 +1,84 @@
+'''
+Benchmarks the offline snapshot on a city-scale dataset: the time to build it, to open it (only the header is read, the rest is memory-mapped) and to search it around the city center.
+
+Run from the repository root with "python benchmarks/bench_offline.py".
+'''
+
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from offline import OfflineClient, Snapshot, SnapshotBuilder
+
+SIZES = [10000, 100000]
+CATEGORIES = ['coffee', 'bakeries', 'thai', 'sushi', 'pizza', 'bars', 'gyms', 'bookstores', 'parks', 'museums']
+CENTER = {'latitude': 37.7749, 'longitude': -122.4194}
+SEARCHES = 50
+
+def build(n, path, rng):
+
+    '''
+    Builds a snapshot of n businesses spread up to 30 km around the city center
+
+    Parameters
+    ----------
+    n (int):
+        The number of businesses
+    path (str):
+        The snapshot file
+    rng (random.Random):
+        The random number generator
+
+    Returns
+    -------
+    None
+    '''
+
+    builder = SnapshotBuilder()
+    businesses = []
+    for i in range(n):
+        distance = 30000 * rng.random() ** 2
+        bearing = rng.uniform(0, 2 * math.pi)
+        alias = rng.choice(CATEGORIES)
+        businesses.append({
+            'id': f'business-{i}',
+            'name': f'{alias.title()} {i}',
+            'url': f'https://www.yelp.com/biz/business-{i}',
+            'rating': rng.choice([2.5, 3.0, 3.5, 4.0, 4.5, 5.0]),
+            'review_count': int(rng.paretovariate(1.2) * 5),
+            'categories': [{'alias': alias, 'title': alias.title()}],
+            'coordinates': {'latitude': CENTER['latitude'] + distance * math.cos(bearing) / 111320, 'longitude': CENTER['longitude'] + distance * math.sin(bearing) / 88000},
+            'location': {'display_address': [f'{rng.randint(1, 9999)} Market St', 'San Francisco, CA 94103']},
+        })
+    builder.add_search({'location': 'San Francisco'}, {'businesses': businesses, 'region': {'center': CENTER}})
+    builder.write(path)
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        for n in SIZES:
+            path = os.path.join(directory, f'{n}.yelist')
+
+            start = time.perf_counter()
+            build(n, path, rng)
+            built = time.perf_counter() - start
+
+            start = time.perf_counter()
+            client = OfflineClient(Snapshot(path))
+            opened = time.perf_counter() - start
+
+            timings = {}
+            for sort in ['best_match', 'rating', 'distance']:
+                start = time.perf_counter()
+                for _ in range(SEARCHES):
+                    client.search_query(location='San Francisco', categories=rng.choice(CATEGORIES), radius=8045, sort_by=sort, limit=10)
+                timings[sort] = (time.perf_counter() - start) / SEARCHES * 1000
+
+            size = os.path.getsize(path) / 2 ** 20
+            client.snapshot.close()
+            print(f"{n:>7} businesses ({size:.1f} MB): built in {built:.2f} s, opened in {opened * 1000:.1f} ms, 5 mile search " + ", ".join(f"{sort} {ms:.1f} ms" for sort, ms in timings.items()))
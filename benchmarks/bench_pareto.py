@@ -0,0 +1,66 @@
+'''
+Benchmarks the trade-off explorer on large searches: the Pareto front of each category's candidates (rating, number of reviews and distance) and the front of the whole itineraries (total distance and average rating), for growing numbers of candidates per category.
+
+Run from the repository root with "python benchmarks/bench_pareto.py".
+'''
+
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from Yelist import YelpBusiness
+from pareto import business_front, itinerary_front
+
+SIZES = [50, 200, 500, 1000]
+CATEGORIES = 8
+CENTER = {'latitude': 37.7749, 'longitude': -122.4194}
+REPEATS = 5
+
+def candidates(n, category, rng):
+
+    '''
+    Creates n businesses spread up to 16 km around the city center
+
+    Parameters
+    ----------
+    n (int):
+        The number of businesses
+    category (str):
+        The category of the businesses
+    rng (random.Random):
+        The random number generator
+
+    Returns
+    -------
+    A list of YelpBusiness objects
+    '''
+
+    businesses = []
+    for i in range(n):
+        distance = 16090 * rng.random() ** 0.5
+        bearing = rng.uniform(0, 2 * math.pi)
+        coordinates = {'latitude': CENTER['latitude'] + distance * math.cos(bearing) / 111320, 'longitude': CENTER['longitude'] + distance * math.sin(bearing) / 88000}
+        businesses.append(YelpBusiness(f'{category} {i}', category, rng.choice([2.5, 3.0, 3.5, 4.0, 4.5, 5.0]), int(rng.paretovariate(1.2) * 5), '', coordinates, [], distance, business_id=f'{category}-{i}'))
+    return businesses
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    for n in SIZES:
+        layers = [candidates(n, f'category {c}', rng) for c in range(CATEGORIES)]
+
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            fronts = [business_front(layer) for layer in layers]
+        fronts_ms = (time.perf_counter() - start) / REPEATS * 1000
+
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            itineraries = itinerary_front(CENTER, fronts)
+        itineraries_ms = (time.perf_counter() - start) / REPEATS * 1000
+
+        sizes = sorted(len(front) for front in fronts)
+        print(f"{n:>5} candidates x {CATEGORIES} categories: fronts of {sizes[0]}-{sizes[-1]} in {fronts_ms:6.1f} ms, {len(itineraries)} itineraries on the front in {itineraries_ms:6.1f} ms")
@@ -0,0 +1,64 @@
+'''
+Benchmarks the ItineraryScheduler against its performance budget: under 50 ms for 10 stops and under 1 s for 50 stops.
+
+Run from the repository root with "python benchmarks/bench_scheduler.py".
+'''
+
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from scheduler import ItineraryScheduler
+
+BUDGETS = {10: 0.05, 50: 1.0}
+
+def make_activities(n, rng):
+
+    '''
+    Creates n random activities with businesses scattered around downtown San Francisco and random opening hours
+
+    Parameters
+    ----------
+    n (int):
+        The number of activities
+    rng (random.Random):
+        The random number generator
+
+    Returns
+    -------
+    activities (SimpleNamespace[]):
+        Stand-ins for Activity objects with assigned businesses
+    hours (str:dict{}):
+        A dictionary of business id, opening windows pairs
+    '''
+
+    activities = []
+    hours = {}
+    for i in range(n):
+        coordinates = {'latitude': 37.78 + rng.uniform(-0.05, 0.05), 'longitude': -122.42 + rng.uniform(-0.05, 0.05)}
+        business = SimpleNamespace(business_id=str(i), name=f'Business {i}', coordinates=coordinates)
+        activities.append(SimpleNamespace(name=f'Activity {i}', prio=i + 1, business=business))
+
+        open_time = rng.choice([7, 8, 9, 10, 11]) * 60
+        hours[str(i)] = {day: [(open_time, open_time + rng.choice([6, 8, 10, 12]) * 60)] for day in range(7)}
+
+    return activities, hours
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    for n, budget in BUDGETS.items():
+        activities, hours = make_activities(n, rng)
+        scheduler = ItineraryScheduler({'latitude': 37.78, 'longitude': -122.42}, 8 * 60, 2, visit_minutes=10)
+
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            visits, unscheduled = scheduler.schedule(activities, hours)
+        elapsed = (time.perf_counter() - start) / runs
+
+        status = 'OK' if elapsed < budget else 'OVER BUDGET'
+        print(f'{n:>3} stops: {elapsed * 1000:8.2f} ms (budget {budget * 1000:.0f} ms) {status} - {len(visits)} scheduled, {len(unscheduled)} unscheduled')
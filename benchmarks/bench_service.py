@@ -0,0 +1,99 @@
+'''
+Load-tests the Yelist HTTP service against the local stand-in for the Yelp API. Each client creates a plan and searches it, all clients running concurrently.
+
+Run from the repository root with "python benchmarks/bench_service.py [clients]".
+'''
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from service import PlannerService, load_tree
+from stub_yelp import StubYelpAPI
+
+CATEGORIES_FILE = os.path.join(os.path.dirname(__file__), '..', 'src', 'categories.json')
+
+async def request(port, method, path, body=None, tenant='bench'):
+
+    '''
+    Sends one HTTP request to the service
+
+    Parameters
+    ----------
+    port (int):
+        The port of the service
+    method (str):
+        The HTTP method
+    path (str):
+        The request path
+    body (dict):
+        The JSON request body
+    tenant (str):
+        The X-Tenant header value
+
+    Returns
+    -------
+    status (int):
+        The HTTP status code
+    payload (dict):
+        The decoded JSON response
+    '''
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nX-Tenant: {tenant}\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+async def client(port, i, latencies):
+
+    '''
+    Creates and searches one plan, recording the end-to-end latency
+
+    Parameters
+    ----------
+    port (int):
+        The port of the service
+    i (int):
+        The client number (used as the tenant)
+    latencies (float[]):
+        The list the latency is appended to
+
+    Returns
+    -------
+    None
+    '''
+
+    start = time.perf_counter()
+    status, plan = await request(port, 'POST', '/plans', {'activities': [{'name': 'Lunch', 'category': 'pizza'}, {'name': 'Coffee', 'category': 'coffee'}, {'name': 'Books', 'category': 'bookstores'}]}, tenant=f'tenant-{i % 10}')
+    assert status == 201, plan
+    status, result = await request(port, 'POST', f"/plans/{plan['id']}/search", {'address': 'San Francisco, CA', 'sort': 'rating'}, tenant=f'tenant-{i % 10}')
+    assert status == 200, result
+    latencies.append(time.perf_counter() - start)
+
+async def main(clients):
+    service = PlannerService(load_tree(CATEGORIES_FILE), client=StubYelpAPI(latency=0.02), max_workers=128)
+    server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0, backlog=4096)
+    port = server.sockets[0].getsockname()[1]
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, i, latencies) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    server.close()
+    latencies.sort()
+    print(f"{clients} concurrent plans in {elapsed:.2f} s ({clients / elapsed:.0f} plans/s), {service.client.calls} stand-in API calls")
+    print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300))
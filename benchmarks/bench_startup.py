@@ -0,0 +1,102 @@
+'''
+Benchmarks the startup of Yelist.py: the time to import the Yelist module (measured with "python -X importtime") and the time from launching the program to its first prompt. Both should stay well under 100 ms on top of the bare interpreter startup.
+
+Run from the repository root with "python benchmarks/bench_startup.py". The yelpapi and config modules do not need to be importable, since neither is loaded before the first search.
+'''
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+RUNS = 10
+TARGET_MS = 100
+PROMPT = b'What activity will you be doing?'
+
+def import_time():
+
+    '''
+    Imports Yelist in a fresh interpreter with "-X importtime" and reads the cumulative import time of the module
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    A tuple of the cumulative import time of Yelist in milliseconds and a list of (milliseconds, module name) pairs of its slowest imports
+    '''
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import Yelist'], cwd=SRC, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:   self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative) / 1000, name.strip()))
+    total = next(ms for ms, name in reversed(modules) if name == 'Yelist')
+    nested = sorted((entry for entry in modules if entry[1] != 'Yelist'), reverse=True)
+    return total, nested[:5]
+
+def interpreter_startup():
+
+    '''
+    Times the startup of a bare interpreter, the baseline every launch pays
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    The startup time in milliseconds
+    '''
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return (time.perf_counter() - start) * 1000
+
+def first_prompt():
+
+    '''
+    Launches Yelist.py and times how long it takes to show its first prompt
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    The time to the first prompt in milliseconds
+    '''
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'Yelist.py', '--no-browser', '--prefetch-budget', '0'], cwd=SRC, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b''
+    while PROMPT not in output:
+        chunk = process.stdout.read1(4096)
+        if not chunk:
+            raise RuntimeError("Yelist.py exited before its first prompt")
+        output += chunk
+    elapsed = (time.perf_counter() - start) * 1000
+    process.kill()
+    process.wait()
+    return elapsed
+
+if __name__ == "__main__":
+    # Warm up the bytecode caches so the runs measure a normal launch
+    import_time()
+
+    imports = [import_time()[0] for _ in range(RUNS)]
+    total, slowest = import_time()
+    baseline = statistics.median(interpreter_startup() for _ in range(RUNS))
+    prompts = [first_prompt() for _ in range(RUNS)]
+    prompt = statistics.median(prompts)
+
+    print(f"import Yelist: median {statistics.median(imports):.1f} ms, max {max(imports):.1f} ms")
+    print("slowest imports: " + ", ".join(f"{name} {ms:.1f} ms" for ms, name in slowest))
+    print(f"first prompt: median {prompt:.1f} ms ({prompt - baseline:.1f} ms over the {baseline:.1f} ms interpreter startup), max {max(prompts):.1f} ms")
+    print(f"target: {TARGET_MS} ms over the interpreter startup, {'met' if prompt - baseline < TARGET_MS else 'MISSED'}")
@@ -5,10 +5,67 @@ The Yelp search will be conducted based on user provided criteria, such as searc
 '''
 
 import json
-from yelpapi import YelpAPI
-import config
-from yelp_categories import CategoryTree
-from google_maps import Map
+import argparse
+import contextlib
+import math
+import random
+import time
+import sys
+import shutil
+import threading
+from yelp_categories import CategoryTree, format_level
+import profiling
+from scheduler import ItineraryScheduler, parse_hours
+from prefetch import Prefetcher, load_session, save_session
+from result_cache import ResultCache
+from category_stats import CategoryStats
+from output import OutputPipeline, PlanOutput, TableSink, MapSink, FileSink
+from deadlines import DeadlineExceeded, HedgedCaller, LatencyTracker
+from offline import OfflineError
+import datetime
+from collections import defaultdict
+
+# Modules only needed once a search runs: the YelpAPI client and its HTTP stack, the API key and the NumPy-based ranking and day planning. They are imported in the background at startup
+DEFERRED_MODULES = ['yelpapi', 'config', 'ranking', 'day_planner', 'urllib.request']
+
+def preload(modules=DEFERRED_MODULES):
+
+    '''
+    Imports modules ahead of their first use, so the import does not delay the search (runs on a background thread). Modules that cannot be imported are skipped, the error is raised again where they are used
+
+    Parameters
+    ----------
+    modules (str[]):
+        The names of the modules to import
+
+    Returns
+    -------
+    None
+    '''
+
+    for module in modules:
+        try:
+            with profiling.span(f'import.{module}'):
+                __import__(module)
+        except Exception:
+            pass
+
+def api_key():
+
+    '''
+    Returns the YelpAPI key, importing config.py the first time it is needed
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    The YelpAPI key
+    '''
+
+    import config
+    return config.yelp_api_key
 
 class UI():
 
@@ -27,9 +84,57 @@ class UI():
         The search address
     cat_tree_obj (CategoryTree):
         The category tree containing the mapping of all categories and their respective subcategories
+    country (str):
+        The two-letter code of the country being searched
+    cat_view (CountryView):
+        The category tree filtered to the categories Yelp supports in the searched country
+    handler (YelpAPIHandler):
+        The handler used for the Yelp search (None until a search is conducted)
+    route (Activity[]):
+        The order in which the activities will be visited (defaults to the order of priority)
+    ranker (Ranker):
+        The weighting used by the custom ranking search
+    session (dict):
+        The address, radius and sort type of the previous session (empty if there is none)
+    prefetch_budget (int):
+        The maximum number of speculative YelpAPI calls made while the activity list is built (0 to disable)
+    prefetcher (Prefetcher):
+        The background searcher (None until the first speculative search)
+    days (DayPlan[]):
+        The daily tours the activities are split into (None for a single tour)
+    results (PlanOutput):
+        The results table last printed (None until the results are printed)
+    value ((str, callable)):
+        The column of the results table showing the value the results were sorted by
+    result_cache (ResultCache):
+        The search results kept between searches
+    stats (CategoryStats):
+        The number of results seen for each category and area, used to predict empty searches
+    open_browser (bool):
+        Whether the map is opened in a web browser (False to print the directions link, e.g. on a server)
+    export (str):
+        The JSON file the final plan is exported to (None to not export it)
+    snapshot (Snapshot):
+        The offline snapshot searched instead of the YelpAPI (None to search online)
+    fan_out (str):
+        "first" or "merge" to search the offline snapshot and the YelpAPI in parallel (None to search one of them)
+    hedge_delay (float):
+        The seconds a fan-out waits for the snapshot before also searching the YelpAPI
+    backend_client (BackendClient):
+        The client searching the fan-out (None until the first search)
+    request_timeout (float):
+        The seconds each YelpAPI call of the search may take (None for no limit)
+    deadline (float):
+        The seconds the whole search may take, activities not searched in time are left unassigned (None for no limit)
+    hedge (bool):
+        Whether a duplicate of a slow YelpAPI call is sent once it has taken longer than the p95 latency
+    latency (LatencyTracker):
+        The latencies of the recent YelpAPI calls, of this session and the previous ones, shared by every handler
+    caller (HedgedCaller):
+        The caller running the YelpAPI calls with deadlines or hedging, shared by every handler (None without deadlines or hedging)
     '''
 
-    def __init__(self, categories_file):
+    def __init__(self, categories_file, country='US', prefetch_budget=10, open_browser=True, export=None, offline=None, fan_out=None, hedge_delay=0.0, request_timeout=None, deadline=None, hedge=False):
 
         '''
         Constructs the UI object
@@ -38,6 +143,26 @@ class UI():
         ----------
         categories_file (str):
             The JSON file name containing the categories
+        country (str):
+            The two-letter code of the country being searched
+        prefetch_budget (int):
+            The maximum number of speculative YelpAPI calls made while the activity list is built (0 to disable)
+        open_browser (bool):
+            Whether the map is opened in a web browser (False to print the directions link, e.g. on a server)
+        export (str):
+            The JSON file the final plan is exported to (None to not export it)
+        offline (str):
+            The offline snapshot file to search instead of the YelpAPI (None to search online)
+        fan_out (str):
+            "first" or "merge" to search the offline snapshot and the YelpAPI in parallel (None to search one of them)
+        hedge_delay (float):
+            The seconds a fan-out waits for the snapshot before also searching the YelpAPI
+        request_timeout (float):
+            The seconds each YelpAPI call of the search may take (None for no limit)
+        deadline (float):
+            The seconds the whole search may take, activities not searched in time are left unassigned (None for no limit)
+        hedge (bool):
+            Whether a duplicate of a slow YelpAPI call is sent once it has taken longer than the p95 latency
 
         Returns
         -------
@@ -48,12 +173,48 @@ class UI():
         self.b_dict = {}
         self.option = 0
         self.address = ''
-
-        # Read in the business categories JSON file (from Yelp Fusion API website)
-        with open(categories_file) as __file:
-            __categories = json.load(__file) 
-
-        self.cat_tree_obj = CategoryTree(__categories)
+        self.handler = None
+        self.route = None
+        self.ranker = None
+        self.session = load_session()
+
+        # The p95 latency hedging waits for is learned across sessions, a single search makes too few calls
+        self.latency = LatencyTracker()
+        for seconds in self.session.get('latencies', []):
+            if type(seconds) in [int, float]:
+                self.latency.record(seconds)
+        self.caller = None
+        self.prefetch_budget = prefetch_budget
+        self.prefetcher = None
+        self.days = None
+        self.results = None
+        self.value = None
+        self.result_cache = ResultCache()
+        self.stats = CategoryStats.load()
+        self.open_browser = open_browser
+        self.export = export
+        self._listings = {}
+        self.snapshot = None
+        self.fan_out = fan_out
+        self.hedge_delay = hedge_delay
+        self.backend_client = None
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.hedge = hedge
+
+        # Only the header of the snapshot is read, its tiles are memory-mapped
+        if offline:
+            from offline import Snapshot
+            self.snapshot = Snapshot(offline)
+
+        self.country = country.upper()
+
+        # Build the category tree and import the search modules while the user types the first activity
+        self._tree = None
+        self._tree_error = None
+        self._tree_thread = threading.Thread(target=self.load_tree, args=(categories_file,), name='yelist-tree', daemon=True)
+        self._tree_thread.start()
+        threading.Thread(target=preload, name='yelist-preload', daemon=True).start()
 
         __welcome_msg = "\nWelcome to Yelist, the first ever activity list aggregate search powered by Yelp!\nTo get started, please enter your first activity."
         print(__welcome_msg)
@@ -61,6 +222,61 @@ class UI():
         # Add an activity to start the activity list
         self.add_activity()
 
+    def load_tree(self, categories_file):
+
+        '''
+        Builds the category tree and its view for the searched country (runs on a background thread started by the constructor)
+
+        Parameters
+        ----------
+        categories_file (str):
+            The JSON file name containing the categories
+
+        Returns
+        -------
+        None
+        '''
+
+        try:
+            # Read in the business categories JSON file (from Yelp Fusion API website)
+            with open(categories_file) as __file:
+                __categories = json.load(__file)
+
+            with profiling.span('tree.build'):
+                cat_tree = CategoryTree(__categories)
+
+            # Only offer the categories Yelp returns results for in the searched country
+            self._tree = (cat_tree, cat_tree.country_view(self.country))
+        except Exception as error:
+            self._tree_error = error
+
+    @property
+    def cat_tree_obj(self):
+        return self.loaded_tree()[0]
+
+    @property
+    def cat_view(self):
+        return self.loaded_tree()[1]
+
+    def loaded_tree(self):
+
+        '''
+        Waits for the background build of the category tree the first time it is needed
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A tuple of the category tree and its view for the searched country
+        '''
+
+        self._tree_thread.join()
+        if self._tree_error is not None:
+            raise self._tree_error
+        return self._tree
+
     def user_input(self):
 
         '''
@@ -93,7 +309,7 @@ class UI():
         # Display Yelp search options and check for valid user input
         while self.option < 1:
             self.option = self.display_options(search=True)
-            self.option = self.check_in_range(self.option, 3)
+            self.option = self.check_in_range(self.option, 5)
 
         # If no businesses were found, skip output and exit program
         if self.search_yelp(self.option) is None:
@@ -101,8 +317,20 @@ class UI():
 
         # Else, print output and, if requested, open a map with directions
         else:
-            self.print_yelp_output(self.option)
-            self.open_map()
+            with profiling.span('ui.print_yelp_output'):
+                self.print_yelp_output(self.option)
+
+            # Custom rankings can be re-weighted without searching again
+            if self.option == 4:
+                self.adjust_ranking()
+
+            # Or the trade-offs between the candidates explored
+            elif self.option == 5:
+                self.explore_tradeoffs()
+
+            self.plan_days()
+            self.schedule_visits()
+            self.publish_output()
 
         print('\nExiting program... Thanks for using Yelist!\n')
 
@@ -123,13 +351,15 @@ class UI():
         print('\nSelect a category for your activity. To continue to drill down into the sub-categories, enter the name of the category you want to explore further (case-sensitive). When you have decided on one of the categories displayed, enter "Select [category_name]". You can select any of the categories or sub-categories listed.\n')
 
 
-        current_cats = self.cat_tree_obj.print_output 
+        # Each level of the tree is a sorted list of categories, children are only sorted when the user browses into them
+        current_cats = self.cat_view.roots()
         search_term = ''
         selected = ''
         search_stack = []
+        page = 0
 
         # Print the initial list of categories
-        [print(cat) for cat in sorted(current_cats.keys())]
+        pages = self.print_categories(current_cats)
 
         # While the user has not yet selected a category
         while selected != "select": 
@@ -142,18 +372,25 @@ class UI():
                 selected = terms[0].lower()
                 search_term = terms[1]
 
+            # If the user wants to see the next page of a long list of categories (the last page wraps around to the first one)
+            if search_term == "MORE" and not selected:
+                page = (page + 1) % pages
+                self.print_categories(current_cats, page)
+                continue
+
             # If the user wants to go back one category, pop the last search from the search_stack
             if search_term == "BACK":
                 if search_stack:
                     current_cats = search_stack.pop() 
-                    [print(cat) for cat in sorted(current_cats.keys())]
+                    page = 0
+                    pages = self.print_categories(current_cats)
                     continue
                 else:
                     print("You cannot go back any further.\n")
 
             found_flag = False
 
-            for category in current_cats.keys():
+            for category in current_cats:
                 # Check if the searched category is in the list of currently displayed categories
                 if search_term == category.title:
                     # If the user has selected a category, turn on the found_flag and break
@@ -161,13 +398,14 @@ class UI():
                         found_flag = True
                         break
                     # There are no more sub-categories to drill down into
-                    if current_cats[category] == '':
+                    if not self.cat_view.children(category):
                         print(f"There are no more sub-categories under {search_term}")
                     # If the category was found but the user did not use the select keyword, append the current search to the search_stack and print the next set of sub-categories
                     else:
                         search_stack.append(current_cats)
-                        current_cats = current_cats[category]
-                        [print(cat) for cat in sorted(current_cats.keys())]
+                        current_cats = self.cat_view.children(category)
+                        page = 0
+                        pages = self.print_categories(current_cats)
                     found_flag = True
                     break
             
@@ -178,6 +416,32 @@ class UI():
 
         return category
 
+    def print_categories(self, categories, page=0):
+
+        '''
+        Prints one level of the category tree with a single write. The text of each page is built once for the terminal width and reused when the user comes back to the level
+
+        Parameters
+        ----------
+        categories (Category[]):
+            The sorted categories of the level
+        page (int):
+            The page of the level to print (levels too long for one screen only)
+
+        Returns
+        -------
+        The number of pages of the level
+        '''
+
+        width = shutil.get_terminal_size().columns
+        key = (id(categories), page, width)
+        if key not in self._listings:
+            # The level is kept with its text so its id cannot be reused by another list
+            self._listings[key] = (categories,) + format_level(categories, page, width)
+        _, text, pages = self._listings[key]
+        sys.stdout.write(text)
+        return pages
+
     def display_options(self, search=False):
 
         '''
@@ -205,7 +469,7 @@ class UI():
             return __list_of_options
 
         elif search == True:
-            __search_options = input("\nHow would you like to search? Select one of the following options [1-3]:\n1. Search by most reviews\n2. Search by highest rating\n3. Search by shortest distance\n")
+            __search_options = input("\nHow would you like to search? Select one of the following options [1-5]:\n1. Search by most reviews\n2. Search by highest rating\n3. Search by shortest distance\n4. Search with a custom ranking (rating, number of reviews and distance)\n5. Explore the trade-offs between rating, number of reviews and distance\n")
             return __search_options
 
     def add_activity(self):
@@ -222,14 +486,34 @@ class UI():
         None
         '''
 
-        # Max size of activity list is 10
-        if len(self.a_list) > 9:
-            print("\nYour list is full (max size of 10). Remove an activity before adding another.\n")
-            return
-
         # Ask user to input their desired activity string
         a_name = input("\nWhat activity will you be doing?\n")
-        a_category = self.show_categories()
+        with profiling.span('ui.show_categories'):
+            a_category = self.show_categories()
+        a_expand = False
+
+        # Offer a more populated related category if this one rarely returns results around the (last) search address
+        address = self.address or self.session.get('address')
+        if address:
+            suggestion, empty = self.stats.suggest(a_category, address, self.session.get('radius', 10*1609), self.cat_tree_obj, self.cat_view)
+            if suggestion is not None:
+                choice = ''
+                while choice.lower() not in ['y','n','yes','no']:
+                    choice = input(f"\nSearches for {a_category.title} around {address} are likely to return nothing ({empty:.0%} chance). Search for {suggestion.title} instead [y/n]?\n")
+                    if choice.lower() not in ['y','n','yes','no']:
+                        print("\nPlease enter a valid response.\n")
+                if choice.lower() in ['y', 'yes']:
+                    a_category = suggestion
+
+        # A broad category can also be searched through its most populated sub-categories
+        if self.cat_view.children(a_category):
+            choice = ''
+            while choice.lower() not in ['y','n','yes','no']:
+                choice = input(f"\nAlso search the most popular sub-categories of {a_category.title} [y/n]?\n")
+                if choice.lower() not in ['y','n','yes','no']:
+                    print("\nPlease enter a valid response.\n")
+            a_expand = choice.lower() in ['y', 'yes']
+
         a_prio = 0
 
         # If the search list is empty, automatically assign the activity a priority of 1
@@ -240,7 +524,13 @@ class UI():
         while a_prio < 1:
             a_prio = input(f"Assign a priority to this activity [1-{len(self.a_list)+1}]: ")
             a_prio = self.check_in_range(a_prio,len(self.a_list)+1)
-        self.a_list.add_to_list(Activity(a_name, a_prio, a_category))
+        activity = Activity(a_name, a_prio, a_category, a_expand)
+        self.a_list.add_to_list(activity)
+
+        # Start searching for the new activity from the previous session's address while the user keeps editing the list
+        if self.session:
+            self.prefetch([activity], self.session['address'], self.session['radius'], self.session['sort'])
+
         self.print_list()
 
     def remove_activity(self):
@@ -304,11 +594,11 @@ class UI():
             change_prio = self.check_in_range(change_prio, len(self.a_list))
 
         while new_prio < 1:
-            new_prio = input(f'\nWhat should be the new priority for "{self.a_list.list[change_prio-1].name}" [1-{len(self.a_list)}]?\n')
+            new_prio = input(f'\nWhat should be the new priority for "{self.a_list.activity(change_prio).name}" [1-{len(self.a_list)}]?\n')
             new_prio = self.check_in_range(new_prio, len(self.a_list))
 
         if change_prio == new_prio:
-            print(f'\n"{self.a_list.list[change_prio-1].name}" already has priority {new_prio}. No changes made.\n')
+            print(f'\n"{self.a_list.activity(change_prio).name}" already has priority {new_prio}. No changes made.\n')
             return
 
         self.a_list.change_list_priority(change_prio, new_prio)
@@ -329,25 +619,6 @@ class UI():
         A dictionary of Yelp API responses associated by business category type
         '''
 
-        self.address = input("\nEnter a location to begin your search from. This can be a city or an address:\n")
-        radius = 0
-
-        # Check valid input for search radius
-        while radius not in [5, 10, 15, 20]:
-            radius = input("\nEnter a suggested search radius in miles [5, 10, 15, 20]:\n")
-            try:
-                radius = int(radius)
-                if radius not in [5, 10, 15, 20]:
-                    raise Exception
-            except:
-                print("Please enter a suggested search radius of 5, 10, 15, or 20.\n")
-
-        # Convert miles to meters
-        radius *= 1609
-
-        # Fun message while API calls are executed...
-        print("\nConducting some Yelp magic \u2728\u2728\u2728...\n")
-
         # Search by most reviews
         if sort == 1:
             sort = 'review_count'
@@ -360,94 +631,86 @@ class UI():
         elif sort == 3:
             sort = 'distance'
 
-        # Create a YelpAPIHandler object to handle all the calls to YelpAPI
-        handler = YelpAPIHandler(config.yelp_api_key, self.address, radius)
-        handler.API_call(self.a_list.list, sort)
-
-        # If no businesses were returned, print an error and return -1
-        if len(handler.responses) < 1:
-            print("404 Error... Yelp search returned no results for your list :(.")
-            return None
-
-        return handler.responses
-
-    def print_yelp_output(self, sort):
-
-        '''
-        Print the results from the Yelp search
-
-        Parameters
-        ----------
-        sort (int):
-            The sort type when conducting the Yelp search
-
-        Returns
-        -------
-        None
-        '''
-
-        # Create lists representing each column of the output table
-        activity_names = ["Activity"]
-        business_names = ["Business Name"]
-        business_categories = ["Business Category"]
-        sort_type_values = []
-        locations = ["Address"]
+        # Search by Yelp's best match, then re-rank locally (the trade-offs are explored from the same candidates)
+        elif sort in [4, 5]:
+            sort = 'best_match'
 
-        # Create the table string to append the output
-        table = "Your search returned the following results:\n\n"
+        self.address = input("\nEnter a location to begin your search from. This can be a city or an address:\n")
 
-        for a in self.a_list.list:
+        # Suggest the smallest radius every activity is likely to find results in
+        aliases = [a.category.alias for a in self.a_list]
+        suggested = self.stats.pick_radius(aliases, self.address, [miles * 1609 for miles in [5, 10, 15, 20]]) // 1609
 
-            # If the Yelp search did not return any associated businesses, remove the activity from the output
-            if a.business is None:
-                print(f'Your search for "{a.name}" did not return any results. Removing it from your list.\n')
-                continue
+        # Search every activity in the background while the user picks a radius (guessing the previous session's radius)
+        self.prefetch(self.a_list.list, self.address, self.session.get('radius', suggested * 1609), sort)
 
-            activity_names.append(a.name)
-            business_names.append(a.business.name)
-            business_categories.append(a.category.title)
+        radius = 0
 
-            # Assign a readable column name for the sort types
-            if sort == 1:
-                sort_type_values.append(a.business.num_reviews)
-                sort_type = 'Number of Reviews'
+        # Check valid input for search radius
+        while radius not in [5, 10, 15, 20, 'auto']:
+            radius = input(f"\nEnter a suggested search radius in miles [5, 10, 15, 20], or 'auto' to widen it only where needed (press Enter for {suggested}):\n") or suggested
+            try:
+                if str(radius).lower() == 'auto':
+                    radius = 'auto'
+                    break
+                radius = int(radius)
+                if radius not in [5, 10, 15, 20]:
+                    raise Exception
+            except:
+                print("Please enter a suggested search radius of 5, 10, 15, or 20, or 'auto'.\n")
 
-            elif sort == 2:
-                sort_type_values.append(a.business.rating)
-                sort_type = 'Rating'
+        # An adaptive search starts at 1 mile and widens up to the 40 km YelpAPI limit
+        adaptive = radius == 'auto'
+        if adaptive:
+            radius = 40000
 
-            elif sort == 3:
-                sort_type_values.append(round(a.business.distance/1609,2))
-                sort_type = 'Distance Away (miles)'
+        # Convert miles to meters
+        else:
+            radius *= 1609
 
-            # Create the address string
-            locations.append(', '.join(a.business.location))
+        # Fun message while API calls are executed...
+        print("\nConducting some Yelp magic \u2728\u2728\u2728...\n")
 
-        sort_type_values.insert(0, sort_type)
-        
-        # Create rows of table
-        for i in range(0, len(activity_names)):
-            if i == 0:
-                table += '|' + activity_names[i].center(len(max(activity_names, key=len)) + 4) + '|'
-                table += business_names[i].center(len(max(business_names, key=len)) + 4) + '|'
-                table += business_categories[i].center(len(max(business_categories, key=len)) + 4) + '|'
-                table += sort_type_values[i].center(len(sort_type_values[0]) + 4) + '|'
-                table += locations[i].center(len(max(locations, key=len)) + 4) + '|' + '\n'
-                table += '-' * (len(max(activity_names, key=len)) + len(max(business_names, key=len)) + len(max(business_categories, key=len)) + len(sort_type_values[0]) + len(max(locations, key=len)) + 26) + '\n'
+        # Create a YelpAPIHandler object to handle all the calls to YelpAPI, reusing the first pages searched in the background
+        self.handler = self.new_handler(self.address, radius)
+        self.handler.prefetcher = self.prefetcher
+        self.handler.result_cache = self.result_cache
+        self.handler.stats = self.stats
+        self.handler.adaptive = adaptive
+        self.handler.request_timeout = self.request_timeout
+        self.handler.deadline = self.deadline
+        self.handler.hedge = self.hedge
+        self.handler.API_call(self.a_list.list, sort)
+        self.stats.save()
+        self.print_search_report()
+
+        # Remember the search criteria to prefetch with in the next session
+        self.session = {'address': self.address, 'radius': radius, 'sort': sort}
+        save_session(self.address, radius, sort, self.latency.samples())
+
+        # Re-rank Yelp's best match locally
+        if sort == 'best_match':
+            if self.ranker is None:
+                from ranking import Ranker
+                self.ranker = Ranker()
+            self.handler.rerank(self.a_list.list, self.ranker)
+
+        self.offer_shared_stops()
 
+        # If no businesses were returned, print an error and return -1
+        if len(self.handler.responses) < 1:
+            if self.handler.uncovered:
+                print(f"The offline snapshot does not cover {self.address}, it was not searched while recording.")
             else:
-                table += '| ' + activity_names[i].ljust(len(max(activity_names, key=len)) + 3) + '| '
-                table += business_names[i].ljust(len(max(business_names, key=len)) + 3) + '| '
-                table += business_categories[i].ljust(len(max(business_categories, key=len)) + 3) + '|'
-                table += str(sort_type_values[i]).rjust(len(sort_type_values[0]) + 3) + ' | '
-                table += locations[i].ljust(len(max(locations, key=len)) + 3) + '|' + '\n'
+                print("404 Error... Yelp search returned no results for your list :(.")
+            return None
 
-        print(table)
+        return self.handler.responses
 
-    def open_map(self):
+    def offer_shared_stops(self):
 
         '''
-        Opens a Google Maps web page with directions from the search address to the businesses in order of priority. Calls methods from the Map object
+        Offers to visit a single business for activities of different categories when one of the best results matches all of them. Calls the YelpAPIHandler plan_shared_stops() and share_stops() methods
 
         Parameters
         ----------
@@ -458,37 +721,29 @@ class UI():
         None
         '''
 
+        plan = self.handler.plan_shared_stops(self.a_list.list)
+        if not plan:
+            return
+
+        for business, activities in plan:
+            names = ', '.join(f'"{a.name}"' for a in activities)
+            print(f"{names} can be done at a single stop: {business.name}.")
+
         # Check for valid user input
+        saved = sum(len(activities) - 1 for _, activities in plan)
         choice = ''
         while choice.lower() not in ['y','n','yes','no']:
-            choice = input("\nWould you also like a map of directions to your activities [y/n]?\n")
+            choice = input(f"\nCombine them to save {saved} stop(s) [y/n]?\n")
             if choice.lower() not in ['y','n','yes','no']:
                 print("\nPlease enter a valid response.\n")
 
-        if choice in ['n', 'no']:
-            return
-
-        # Can specify the mode of travel (drive, walk, bike, transit). Currently not implemented
-        # travel_mode = ''
-
-        # Assign the search address as the origin
-        directions = Map(self.address)
-
-        # For each activity with an associated business, add them as a waypoint
-        for a in self.a_list.list:
-
-            if a.business is None:
-                continue
-
-            name_and_address = a.business.name + ', ' + ', '.join(a.business.location)
-            directions.add_waypoint(name_and_address)
-
-        directions.search_directions()
+        if choice.lower() in ['y', 'yes']:
+            self.handler.share_stops(plan, self.a_list.list)
 
-    def print_list(self):
+    def print_search_report(self):
 
         '''
-        Print the current activity list
+        Prints the number of YelpAPI requests the search made and the average rating and distance of the businesses found, with the radius each category was searched within for an adaptive search
 
         Parameters
         ----------
@@ -499,409 +754,2306 @@ class UI():
         None
         '''
 
-        print(self.a_list)
+        quality = self.handler.quality(self.a_list.list)
+        report = f"Search made {quality['requests']} request(s)"
+        if quality['rating'] is not None:
+            report += f", average rating {quality['rating']:.2f}"
+        if quality['distance'] is not None:
+            report += f", average distance {quality['distance'] / 1609:.2f} miles"
+        if self.backend_client is not None:
+            report += " (answered by " + ", ".join(f"{name} {wins}" for name, wins in self.backend_client.backend.wins.most_common()) + ")"
+        print(report + ".\n")
+
+        # The tail is reported apart from the median, it is what the deadlines and hedging cut
+        if self.request_timeout is not None or self.deadline is not None or self.hedge:
+            latency = self.handler.latency.summary()
+            if latency['calls']:
+                line = f"YelpAPI call latency: median {latency['p50'] * 1000:.0f} ms, p95 {latency['p95'] * 1000:.0f} ms, p99 {latency['p99'] * 1000:.0f} ms, slowest {latency['max'] * 1000:.0f} ms"
+                if self.handler.caller is not None and self.handler.caller.hedged:
+                    line += f" ({self.handler.caller.hedged} hedged, {self.handler.caller.hedge_wins} answered by the duplicate)"
+                print(line + ".\n")
+
+        if self.handler.adaptive:
+            for alias, searched in self.handler.report.items():
+                print(f"    {self.cat_tree_obj.nodes[alias].title}: {searched['results']} result(s) within {searched['radius'] / 1609:.1f} miles ({searched['requests']} request(s))")
+            print()
 
-    def check_in_range(self, num, max_num):
+    def prefetch(self, activities, address, radius, sort):
 
         '''
-        Check if a value is a valid integer in the given range
+        Starts speculative Yelp searches for the first page of results of the activities, within the prefetch budget
 
         Parameters
         ----------
-        num (str):
-            Value to be checked and converted to an integer
-        max_num (int):
-            The max value that the integer num can take
+        activities (Activity[]):
+            The activities to search for
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+        sort (str):
+            The sort type when searching the Yelp database
 
         Returns
         -------
-        The input value converted to an int OR 0 if the input value is not a valid integer
+        None
         '''
 
-        try:
-            num = int(num)
-            if num < 1 or num > max_num:
-                raise Exception
-            return num
-        except:
-            print(f"\nPlease enter an integer between 1 and {max_num}.\n")
-            return 0
+        if self.prefetch_budget < 1 or not address:
+            return
 
-class Activity():
+        # The background thread gets its own handler, the YelpAPI client is not shared between threads
+        if self.prefetcher is None:
+            handler = self.new_handler()
+            handler.result_cache = self.result_cache
+            handler.stats = self.stats
+            self.prefetcher = Prefetcher(handler, self.prefetch_budget, FIRST_PAGE)
 
-    '''
-    A class to store activity information.
+        for a in activities:
+            if a.category in self.cat_view:
+                self.prefetcher.prefetch(a.category, self.prefetcher.handler.search_aliases(a), address, radius, sort)
 
-    Attributes
-    ----------
-    name (str):
-        The name of the activity
-    prio (int):
-        The priority of the activity
-    category (Category):
-        A Category object representing a business category
-    business (YelpBusiness):
-        The YelpBusiness object associated with the activity
-    '''
-    
-    def __init__(self, name, prio, category):
+    def new_handler(self, address='', radius=0):
 
         '''
-        Constructs the YelpBusiness object
+        Creates a YelpAPIHandler searching the YelpAPI, the offline snapshot when one was given, or both in parallel in fan-out mode
 
         Parameters
         ----------
-        name (str):
-            The name of the activity
-        prio (int):
-            The priority of the activity
-        category (Category):
-            A Category object representing a business category
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
 
         Returns
         -------
-        None
+        handler (YelpAPIHandler):
+            The new handler
         '''
 
-        self.name = name
-        self.prio = prio
-        self.category = category
-        self.business = None    
+        if self.caller is None and (self.request_timeout is not None or self.deadline is not None or self.hedge):
+            self.caller = HedgedCaller()
 
-    def __repr__(self):
-        string = f"{self.prio}. {self.name} [{self.category}]"
-        return string
+        if self.snapshot is None:
+            return YelpAPIHandler(api_key(), address, radius, self.cat_view, self.cat_tree_obj, latency=self.latency, caller=self.caller)
 
-class ActivityList():
+        # The handlers share one fan-out, the snapshot is listed first so it wins ties
+        if self.fan_out:
+            if self.backend_client is None:
+                from backends import BackendClient, FanOutBackend, OfflineBackend, YelpBackend
+                backends = [OfflineBackend(self.snapshot, self.cat_tree_obj), YelpBackend(api_key())]
+                self.backend_client = BackendClient(FanOutBackend(backends, self.fan_out, self.hedge_delay))
+            return YelpAPIHandler(None, address, radius, self.cat_view, self.cat_tree_obj, client=self.backend_client, latency=self.latency, caller=self.caller)
 
-    '''
-     A class to store an activity list consisting of Activity objects.
+        from offline import OfflineClient
+        return YelpAPIHandler(None, address, radius, self.cat_view, self.cat_tree_obj, client=OfflineClient(self.snapshot, self.cat_tree_obj), latency=self.latency, caller=self.caller)
 
-    Attributes
-    ----------
-    list (Activity[]):
-        The list of Activity objects
-    '''
-    
-    def __init__(self):
+    def print_yelp_output(self, sort):
 
         '''
-        Constructs the ActivityList object
+        Print the results from the Yelp search
 
         Parameters
         ----------
-        None
+        sort (int):
+            The sort type when conducting the Yelp search
 
         Returns
         -------
         None
         '''
 
-        self.list = []
+        for a in self.a_list.list:
 
-    def __str__(self):
-        string = '\nCurrent list:\n'
-        for a in self.list:
-            string += str(a) + '\n'
-        return string
+            # If the Yelp search did not return any associated businesses, remove the activity from the output
+            if a.business is None and a.category.alias in self.handler.late:
+                print(f'Your search for "{a.name}" did not finish in time. Leaving it unassigned.\n')
+                continue
 
-    def __len__(self):
-        return len(self.list)
+            if a.business is None and a.category.alias in self.handler.uncovered:
+                print(f'The offline snapshot does not cover {self.address}, so "{a.name}" could not be searched. Leaving it unassigned.\n')
+                continue
 
-    def add_to_list(self, activity):
+            if a.business is None:
+                print(f'Your search for "{a.name}" did not return any results. Removing it from your list.\n')
+                suggestion, _ = self.stats.suggest(a.category, self.address, self.handler.radius, self.cat_tree_obj, self.cat_view, max_empty=0)
+                if suggestion is not None:
+                    print(f'Searches for {suggestion.title} are more likely to return results around {self.address}.\n')
+
+        # The table sink renders the results, and renders them again at the end only if planning changed them
+        self.value = self.sort_column(sort)
+        self.results = PlanOutput(self.address, self.a_list.list, value=self.value)
+        TableSink("Your search returned the following results:").write(self.results)
+
+    def sort_column(self, sort):
 
         '''
-        Adds an activity to the activity list and updates the list prioritization.
+        Returns the column of the results table showing the value the results were sorted by
 
         Parameters
         ----------
-        activity (Activity): 
-            The Activity object to be added to the list
+        sort (int):
+            The sort type when conducting the Yelp search
 
         Returns
         -------
-        None
+        A tuple of the readable column name and the function formatting the value of a YelpBusiness
         '''
 
-        for a in self.list[activity.prio - 1:]:
-            a.prio += 1
-        self.list.insert(activity.prio - 1, activity)
+        # Businesses from the offline snapshot or the cache may have no distance
+        miles = lambda b: 'unknown' if b.distance is None else round(b.distance/1609,2)
 
-    def remove_from_list(self, prio):
+        if sort == 1:
+            return 'Number of Reviews', lambda b: b.num_reviews
+        elif sort == 2:
+            return 'Rating', lambda b: b.rating
+        elif sort == 3:
+            return 'Distance Away (miles)', miles
+        elif sort == 4:
+            return 'Score', lambda b: round(b.score,3)
+        return 'Rating / Reviews / Miles', lambda b: f'{b.rating} / {b.num_reviews} / {miles(b)}'
+
+    def adjust_ranking(self):
 
         '''
-        Removes an activity from the activity list and updates the list prioritization.
+        Lets the user change the weighting of the custom ranking and reprints the results, without searching Yelp again. Calls the YelpAPIHandler rerank() method
 
         Parameters
         ----------
-        prio (int): 
-            The priority (index + 1) of the Activity object to be removed from list
+        None
 
         Returns
         -------
-        The Activity object that was removed. 
+        None
         '''
 
-        for a in self.list[prio:]:
-            a.prio -= 1
-        return self.list.pop(prio-1)
+        while True:
 
-    def change_list_priority(self, prio_to_be_changed, new_prio):
+            # Check for valid user input
+            choice = ''
+            while choice.lower() not in ['y','n','yes','no']:
+                choice = input(f"\nWould you like to change the ranking weights (currently rating {self.ranker.rating_weight}, reviews {self.ranker.reviews_weight}, distance {self.ranker.distance_weight}) [y/n]?\n")
+                if choice.lower() not in ['y','n','yes','no']:
+                    print("\nPlease enter a valid response.\n")
+
+            if choice.lower() in ['n', 'no']:
+                return
+
+            weights = None
+            while weights is None:
+                try:
+                    weights = [float(w) for w in input("\nEnter the rating, reviews and distance weights separated by spaces (e.g., 1 0.5 0.5):\n").split()]
+                    if len(weights) != 3 or min(weights) < 0:
+                        raise Exception
+                except:
+                    print("Please enter three non-negative numbers.\n")
+                    weights = None
+
+            self.ranker.rating_weight, self.ranker.reviews_weight, self.ranker.distance_weight = weights
+            self.handler.rerank(self.a_list.list, self.ranker)
+            self.print_yelp_output(4)
+
+    def explore_tradeoffs(self):
 
         '''
-        Changes the priority of an activity and updates the list prioritization. Leverages the remove_from_list and add_to_list methods.
+        Shows the Pareto front of each category's candidates (rating, number of reviews and distance) and of the whole itineraries (total distance and average rating), and lets the user pick an itinerary. No YelpAPI calls are made
 
         Parameters
         ----------
-        prio_to_be_changed (int): 
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        from pareto import business_front, itinerary_front
+
+        # The categories in the order of the activities, each visited once
+        aliases = []
+        for a in self.a_list:
+            if a.business is not None and a.category.alias not in aliases and a.category.alias in self.handler.candidates:
+                aliases.append(a.category.alias)
+        if not aliases:
+            return
+
+        fronts = {}
+        for alias in aliases:
+            candidates = [b for b in self.handler.candidates[alias] if self.handler.qualifies(b)]
+            fronts[alias] = business_front(candidates)
+
+            print(f"\n{len(fronts[alias])} of the {len(candidates)} {self.cat_tree_obj.nodes[alias].title} results are not beaten on rating, number of reviews and distance by another:")
+            for b in fronts[alias]:
+                miles = 'unknown distance' if b.distance is None else f'{b.distance/1609:.2f} miles'
+                print(f"  {b.name}: rating {b.rating}, {b.num_reviews} reviews, {miles}")
+
+        itineraries = itinerary_front(self.handler.center, [fronts[alias] for alias in aliases])
+        if len(itineraries) < 1:
+            return
+
+        print("\nVisiting them in order from your location, these itineraries trade off the total distance against the average rating:")
+        for i, itinerary in enumerate(itineraries, 1):
+            print(f"{i}. {itinerary.distance/1609:.2f} miles, average rating {itinerary.rating:.2f}: {', '.join(b.name for b in itinerary.businesses)}")
+
+        # Check for valid user input
+        choice = 0
+        while choice < 1:
+            choice = input(f"\nChoose an itinerary [1-{len(itineraries)}], or press Enter to keep the current results:\n")
+            if choice == '':
+                return
+            choice = self.check_in_range(choice, len(itineraries))
+
+        # Assign the chosen businesses to the first activity of each category, swapping with another activity of the category already holding it
+        chosen = dict(zip(aliases, itineraries[choice - 1].businesses))
+        for a in self.a_list:
+            if a.category.alias in chosen:
+                business = chosen.pop(a.category.alias)
+                for other in self.a_list:
+                    if other is not a and other.category.alias == a.category.alias and other.business is business:
+                        other.business = a.business
+                a.business = business
+                a.business.fetched_at = self.handler.fetched_at.get(a.category.alias)
+        self.print_yelp_output(5)
+
+    def plan_days(self):
+
+        '''
+        Offers to split a list with more stops than fit in a day into daily tours starting from the search address. Calls the DayPlanner plan() method
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        from day_planner import DayPlanner, STOPS_PER_DAY, located
+
+        visiting = [a for a in self.a_list if a.business is not None]
+        if len(visiting) <= STOPS_PER_DAY:
+            return
+
+        # Check for valid user input
+        choice = ''
+        while choice.lower() not in ['y','n','yes','no']:
+            choice = input(f"\nYour list has {len(visiting)} stops. Would you like to split it into daily tours [y/n]?\n")
+            if choice.lower() not in ['y','n','yes','no']:
+                print("\nPlease enter a valid response.\n")
+
+        if choice.lower() in ['n', 'no']:
+            return
+
+        # Ask for the number of days, check for valid user input
+        min_days = math.ceil(len(visiting) / STOPS_PER_DAY)
+        days = 0
+        while days < 1:
+            days = input(f"\nOver how many days [{min_days}-{len(visiting)}]?\n")
+            days = self.check_in_range(days, len(visiting))
+            if 0 < days < min_days:
+                print(f"At most {STOPS_PER_DAY} stops fit in a day. Please enter at least {min_days} days.\n")
+                days = 0
+
+        # Start every day from the search address (falls back to the first located business if Yelp did not return the address coordinates)
+        origin = self.handler.center
+        for a in visiting:
+            origin = origin or located(a.business.coordinates, None)
+        if origin is None:
+            print("\nYelp did not return the location of your search or of its results, so it cannot be split into daily tours.")
+            return
+
+        with profiling.span('ui.plan_days'):
+            self.days = DayPlanner([origin]).plan(visiting, days)
+
+        print("\nYour daily tours:\n")
+        for day in self.days:
+            print(day)
+
+        self.route = [a for day in self.days for a in day.activities]
+
+    def schedule_visits(self):
+
+        '''
+        Orders the visits to the returned businesses so that each business is open on arrival. Calls the ItineraryScheduler schedule() method
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        # Check for valid user input
+        choice = ''
+        while choice.lower() not in ['y','n','yes','no']:
+            choice = input("\nWould you like to plan your visits around business hours [y/n]?\n")
+            if choice.lower() not in ['y','n','yes','no']:
+                print("\nPlease enter a valid response.\n")
+
+        if choice.lower() in ['n', 'no']:
+            return
+
+        # Ask for the departure time, check for valid user input
+        start = None
+        while start is None:
+            leave_time = input("\nWhat time will you leave [HH:MM, 24-hour clock]?\n")
+            try:
+                hours, minutes = leave_time.split(':')
+                start = datetime.time(int(hours), int(minutes))
+            except:
+                print("Please enter a time such as 09:30.\n")
+
+        from day_planner import located
+
+        visiting = [a for a in self.a_list.list if a.business is not None]
+
+        # Route from the search address (falls back to the first business with coordinates if Yelp did not return the address coordinates)
+        origin = self.handler.center
+        for a in visiting:
+            origin = origin or located(a.business.coordinates, None)
+        if origin is None:
+            print("\nYelp did not return the location of your search or of its results, so your visits cannot be scheduled.")
+            return
+
+        # Opening hours are only fetched for the businesses that were assigned to an activity
+        hours = {a.business.business_id: a.business.load_hours(self.handler) for a in visiting}
+        today = datetime.date.today().weekday()
+        self.route = []
+
+        # Schedule each daily tour on its own day (a single tour is scheduled for today)
+        tours = [day.activities for day in self.days] if self.days is not None else [visiting]
+        for i, tour in enumerate(tours):
+            scheduler = ItineraryScheduler(origin, start.hour * 60 + start.minute, (today + i) % 7)
+            visits, unscheduled = scheduler.schedule(tour, hours)
+
+            print("\nYour schedule for today:\n" if self.days is None else f"\nYour schedule for day {i + 1}:\n")
+            for v in visits:
+                print(v)
+
+            for a in unscheduled:
+                print(f'\n"{a.name}" cannot be visited while {a.business.name} is open. Removing it from your route.')
+
+            if self.days is not None:
+                self.days[i].activities = [v.activity for v in visits]
+            self.route += [v.activity for v in visits]
+
+    def publish_output(self):
+
+        '''
+        Sends the final plan to the outputs: the plan table, the Google Maps directions (if requested) and the export file (if any). Each output runs in the background, and the program only waits a few seconds for them before exiting
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        # Check for valid user input
+        choice = ''
+        while choice.lower() not in ['y','n','yes','no']:
+            choice = input("\nWould you also like a map of directions to your activities [y/n]?\n")
+            if choice.lower() not in ['y','n','yes','no']:
+                print("\nPlease enter a valid response.\n")
+
+        # Can specify the mode of travel (drive, walk, bike, transit). Currently not implemented
+        # travel_mode = ''
+
+        # The activities are visited in schedule order if the visits were scheduled
+        plan = PlanOutput(self.address, self.route if self.route is not None else self.a_list.list, self.days, self.value)
+
+        # The results table was already printed, it is only printed again if the plan differs from it
+        sinks = []
+        if self.results is None or plan.rows != self.results.rows:
+            sinks.append(TableSink())
+        if choice.lower() in ['y', 'yes']:
+            sinks.append(MapSink(self.open_browser))
+        if self.export:
+            sinks.append(FileSink(self.export))
+
+        output = OutputPipeline(sinks)
+        output.publish(plan)
+
+        unfinished = output.close(2.0)
+        for name, error in output.errors.items():
+            print(f"\nCould not write the {name} output: {error}")
+        if unfinished:
+            print(f"\nThe {', '.join(unfinished)} output did not finish in time.")
+
+    def print_list(self):
+
+        '''
+        Print the current activity list
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        print(self.a_list)
+
+    def check_in_range(self, num, max_num):
+
+        '''
+        Check if a value is a valid integer in the given range
+
+        Parameters
+        ----------
+        num (str):
+            Value to be checked and converted to an integer
+        max_num (int):
+            The max value that the integer num can take
+
+        Returns
+        -------
+        The input value converted to an int OR 0 if the input value is not a valid integer
+        '''
+
+        try:
+            num = int(num)
+            if num < 1 or num > max_num:
+                raise Exception
+            return num
+        except:
+            print(f"\nPlease enter an integer between 1 and {max_num}.\n")
+            return 0
+
+class Activity():
+
+    '''
+    A class to store activity information.
+
+    Attributes
+    ----------
+    name (str):
+        The name of the activity
+    prio (int):
+        The priority of the activity (its position in the ActivityList holding it, otherwise the priority it will be added with)
+    category (Category):
+        A Category object representing a business category
+    expand (bool):
+        Whether the search also covers the most populated sub-categories of the category
+    business (YelpBusiness):
+        The YelpBusiness object associated with the activity
+    node (ActivityNode):
+        The node holding the activity in an ActivityList (None if the activity is not in a list)
+    '''
+    
+    def __init__(self, name, prio, category, expand=False):
+
+        '''
+        Constructs the YelpBusiness object
+
+        Parameters
+        ----------
+        name (str):
+            The name of the activity
+        prio (int):
+            The priority of the activity
+        category (Category):
+            A Category object representing a business category
+        expand (bool):
+            Whether the search also covers the most populated sub-categories of the category
+
+        Returns
+        -------
+        None
+        '''
+
+        self.name = name
+        self.prio = prio
+        self.category = category
+        self.expand = expand
+        self.business = None    
+        self.node = None
+
+    @property
+    def prio(self):
+
+        # Priorities are derived from the position in the list, so they never need renumbering
+        if self.node is not None:
+            return ActivityList.rank(self.node)
+        return self._prio
+
+    @prio.setter
+    def prio(self, prio):
+        self._prio = prio
+
+    def __repr__(self):
+        string = f"{self.prio}. {self.name} [{self.category}]"
+        return string
+
+class ActivityNode():
+
+    '''
+    A class to store a node of the ActivityList tree.
+
+    Attributes
+    ----------
+    activity (Activity):
+        The activity stored in the node
+    weight (float):
+        The random heap weight keeping the tree balanced (a parent always weighs more than its children)
+    left (ActivityNode):
+        The subtree of the activities with a higher priority
+    right (ActivityNode):
+        The subtree of the activities with a lower priority
+    parent (ActivityNode):
+        The parent node (None for the root)
+    size (int):
+        The number of nodes in the subtree
+    '''
+
+    def __init__(self, activity):
+
+        '''
+        Constructs the ActivityNode object
+
+        Parameters
+        ----------
+        activity (Activity):
+            The activity stored in the node
+
+        Returns
+        -------
+        None
+        '''
+
+        self.activity = activity
+        self.weight = random.random()
+        self.left = None
+        self.right = None
+        self.parent = None
+        self.size = 1
+
+class ActivityList():
+
+    '''
+     A class to store an activity list consisting of Activity objects.
+
+    The activities are kept in a treap (a randomly balanced binary tree) ordered by priority, where each node knows the size of its subtree. An activity's priority is its rank in the tree, so adding, removing, reprioritizing and finding an activity by priority take O(log n) time and no priority is ever renumbered.
+
+    Attributes
+    ----------
+    root (ActivityNode):
+        The root of the tree (None if the list is empty)
+    list (Activity[]):
+        The list of Activity objects in order of priority (built on each access)
+    '''
+    
+    def __init__(self):
+
+        '''
+        Constructs the ActivityList object
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        self.root = None
+
+    def __str__(self):
+        string = '\nCurrent list:\n'
+        for a in self:
+            string += str(a) + '\n'
+        return string
+
+    def __len__(self):
+        return ActivityList.size(self.root)
+
+    def __iter__(self):
+
+        # In-order traversal, without recursion
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.activity
+            node = node.right
+
+    @property
+    def list(self):
+        return list(self)
+
+    @staticmethod
+    def size(node):
+        return node.size if node is not None else 0
+
+    @staticmethod
+    def rank(node):
+
+        '''
+        Returns the priority of the activity stored in a node, counting the nodes before it on the way up to the root
+
+        Parameters
+        ----------
+        node (ActivityNode):
+            A node of the tree
+
+        Returns
+        -------
+        The priority (index + 1) of the node's activity
+        '''
+
+        rank = ActivityList.size(node.left) + 1
+        while node.parent is not None:
+            if node is node.parent.right:
+                rank += ActivityList.size(node.parent.left) + 1
+            node = node.parent
+        return rank
+
+    def update(self, node):
+
+        '''
+        Recomputes the subtree size of a node whose children changed, and links the children back to it
+
+        Parameters
+        ----------
+        node (ActivityNode):
+            The node whose children changed
+
+        Returns
+        -------
+        None
+        '''
+
+        node.size = 1 + ActivityList.size(node.left) + ActivityList.size(node.right)
+        if node.left is not None:
+            node.left.parent = node
+        if node.right is not None:
+            node.right.parent = node
+
+    def split(self, node, count):
+
+        '''
+        Splits a subtree into its first count nodes and the rest
+
+        Parameters
+        ----------
+        node (ActivityNode):
+            The root of the subtree
+        count (int):
+            The number of nodes in the first part
+
+        Returns
+        -------
+        The roots of the two parts (None for an empty part)
+        '''
+
+        if node is None:
+            return None, None
+
+        if ActivityList.size(node.left) >= count:
+            first, node.left = self.split(node.left, count)
+            self.update(node)
+            return first, node
+
+        node.right, rest = self.split(node.right, count - ActivityList.size(node.left) - 1)
+        self.update(node)
+        return node, rest
+
+    def merge(self, first, rest):
+
+        '''
+        Joins two subtrees, with every node of the first one coming before the nodes of the second one
+
+        Parameters
+        ----------
+        first (ActivityNode):
+            The root of the first subtree
+        rest (ActivityNode):
+            The root of the second subtree
+
+        Returns
+        -------
+        The root of the joined subtree
+        '''
+
+        if first is None:
+            return rest
+        if rest is None:
+            return first
+
+        if first.weight > rest.weight:
+            first.right = self.merge(first.right, rest)
+            self.update(first)
+            return first
+
+        rest.left = self.merge(first, rest.left)
+        self.update(rest)
+        return rest
+
+    def activity(self, prio):
+
+        '''
+        Returns the activity with a given priority
+
+        Parameters
+        ----------
+        prio (int): 
+            The priority (index + 1) of the Activity object
+
+        Returns
+        -------
+        The Activity object with the priority
+        '''
+
+        node = self.root
+        while node is not None:
+            left = ActivityList.size(node.left)
+            if prio <= left:
+                node = node.left
+            elif prio == left + 1:
+                return node.activity
+            else:
+                prio -= left + 1
+                node = node.right
+        raise IndexError(f"No activity with priority {prio}")
+
+    def add_to_list(self, activity):
+
+        '''
+        Adds an activity to the activity list and updates the list prioritization.
+
+        Parameters
+        ----------
+        activity (Activity): 
+            The Activity object to be added to the list
+
+        Returns
+        -------
+        None
+        '''
+
+        # Insert the activity after the activities with a higher priority, the ones after it move down by one
+        count = min(max(activity.prio, 1), len(self) + 1) - 1
+        first, rest = self.split(self.root, count)
+        activity.node = ActivityNode(activity)
+        self.root = self.merge(self.merge(first, activity.node), rest)
+        self.root.parent = None
+
+    def remove_from_list(self, prio):
+
+        '''
+        Removes an activity from the activity list and updates the list prioritization.
+
+        Parameters
+        ----------
+        prio (int): 
+            The priority (index + 1) of the Activity object to be removed from list
+
+        Returns
+        -------
+        The Activity object that was removed. 
+        '''
+
+        first, rest = self.split(self.root, prio - 1)
+        node, rest = self.split(rest, 1)
+        self.root = self.merge(first, rest)
+        if self.root is not None:
+            self.root.parent = None
+
+        activity = node.activity
+        activity.node = None
+        activity.prio = prio
+        return activity
+
+    def change_list_priority(self, prio_to_be_changed, new_prio):
+
+        '''
+        Changes the priority of an activity and updates the list prioritization. Leverages the remove_from_list and add_to_list methods.
+
+        Parameters
+        ----------
+        prio_to_be_changed (int): 
             The priority (index + 1) of the Activity object to be updated
         new_prio (int):
             The new priority (index + 1) of the Activity object
 
         Returns
         -------
-        None
+        None
+        '''
+
+        change_activity = self.remove_from_list(prio_to_be_changed)
+        change_activity.prio = new_prio
+        self.add_to_list(change_activity)
+
+class YelpBusiness():
+
+    '''
+    A class to store Yelp business information.
+
+    Attributes
+    ----------
+    name (str):
+        The name of the business
+    category (Category):
+        A Category object representing a business category
+    rating (float):
+        The average rating of the business
+    num_reviews (int):
+        The number of Yelp reviews of the business
+    url (str):
+        The Yelp URL of the business
+    coordinates (str:float{}):
+        The latitude and longitude coordinates
+    location (str[]):
+        A list containing each line of the address
+    distance (int):
+        The distance from the original search location in meters
+    business_id (str):
+        The Yelp id of the business
+    hours (int:(int, int)[]{}):
+        The opening windows of the business for each weekday (None until loaded, see load_hours())
+    aliases (str[]):
+        The aliases of all the categories Yelp lists for the business
+    score (float):
+        The custom ranking score of the business (None until ranked by a Ranker)
+    is_closed (bool):
+        Whether the business has permanently closed
+    fetched_at (float):
+        The time the business was fetched from the YelpAPI (seconds since the epoch, None if unknown)
+    '''
+
+    def __init__(self, name, category, rating, num_reviews, url, coordinates, location, distance, business_id=None, hours=None, aliases=None, is_closed=False):
+
+        '''
+        Constructs the YelpBusiness object
+
+        Parameters
+        ----------
+        name (str):
+            The name of the business
+        category (Category):
+            A Category object representing a business category
+        rating (float):
+            The average rating of the business
+        num_reviews (int):
+            The number of Yelp reviews of the business
+        url (str):
+            The Yelp URL of the business
+        coordinates (str:float{}):
+            The latitude and longitude coordinates
+        location (str[]):
+            A list containing each line of the address
+        distance (int):
+            The distance from the original search location in meters
+        business_id (str):
+            The Yelp id of the business
+        hours (int:(int, int)[]{}):
+            The opening windows of the business for each weekday, if already known
+        aliases (str[]):
+            The aliases of all the categories Yelp lists for the business
+        is_closed (bool):
+            Whether the business has permanently closed
+
+        Returns
+        -------
+        None
+        '''
+
+        self.name = name
+        self.category = category
+        self.rating = rating
+        self.num_reviews = num_reviews
+        self.url = url
+        self.coordinates = coordinates 
+        self.location = location 
+        self.distance = distance 
+        self.business_id = business_id
+        self.hours = hours
+        self.aliases = aliases if aliases is not None else []
+        self.score = None
+        self.is_closed = is_closed
+        self.fetched_at = None
+
+    def __repr__(self):
+        return self.name
+
+    def copy(self):
+
+        '''
+        Creates a copy of the business that can be changed without changing the original (its categories and fetch time are its own)
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        The new YelpBusiness object
+        '''
+
+        business = YelpBusiness(self.name, self.category, self.rating, self.num_reviews, self.url, self.coordinates, self.location, self.distance, self.business_id, self.hours, list(self.aliases), self.is_closed)
+        business.score = self.score
+        business.fetched_at = self.fetched_at
+        return business
+
+    def load_hours(self, handler):
+
+        '''
+        Loads the opening hours of the business the first time they are needed. Calls the YelpAPIHandler get_business_hours() method
+
+        Parameters
+        ----------
+        handler (YelpAPIHandler):
+            The handler used to request the business details
+
+        Returns
+        -------
+        The opening windows of the business for each weekday OR None if the business has no listed hours
+        '''
+
+        if self.hours is None and self.business_id is not None:
+            self.hours = handler.get_business_hours(self.business_id)
+        return self.hours
+
+class BusinessIndex():
+
+    '''
+    A class to intern YelpBusiness objects by Yelp id, so that a business returned under several categories or by several searches is a single object.
+
+    Attributes
+    ----------
+    businesses (str:YelpBusiness{}):
+        A dictionary containing business id, YelpBusiness object pairs
+    '''
+
+    def __init__(self):
+
+        '''
+        Constructs the BusinessIndex object
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        self.businesses = {}
+
+    def __len__(self):
+        return len(self.businesses)
+
+    def __contains__(self, business_id):
+        return business_id in self.businesses
+
+    def get(self, business_id):
+        return self.businesses.get(business_id)
+
+    def intern(self, business):
+
+        '''
+        Returns the indexed object of a business, indexing the business if it is new
+
+        Parameters
+        ----------
+        business (YelpBusiness):
+            The business to intern
+
+        Returns
+        -------
+        The YelpBusiness object shared by every list containing the business
+        '''
+
+        if business.business_id is None:
+            return business
+
+        existing = self.businesses.get(business.business_id)
+        if existing is None:
+            self.businesses[business.business_id] = business
+            return business
+
+        # Keep every category the business was listed under
+        profiling.count('index.duplicates')
+        for alias in business.aliases:
+            if alias not in existing.aliases:
+                existing.aliases.append(alias)
+        return existing
+
+class YelpBusinessList():
+
+    '''
+    A class to store all YelpBusiness objects of a certain business category.
+
+    Attributes
+    ----------
+    business_list (YelpBusiness[]):
+        The list of YelpBusiness objects
+    category (Category):
+        A Category object representing a business category
+    sort_type (str):
+        The sort type that was used to search the Yelp database
+    business_index (BusinessIndex):
+        The index the businesses of the list are interned in (None to not intern them)
+    '''
+    
+    def __init__(self, category, sort_type, business_index=None):
+
+        '''
+        Constructs the YelpBusinessList object
+
+        Parameters
+        ----------
+        category (Category):
+            A Category object representing a business category
+        sort_type (str):
+            The sort type that was used to search the Yelp database
+        business_index (BusinessIndex):
+            The index the businesses of the list are interned in (None to not intern them)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.business_list = []
+        self.category = category
+        self.sort_type = sort_type
+        self.business_index = business_index
+        
+        # Change 'review_count' to 'number of reviews' for printing purposes
+        if self.sort_type == 'review_count':
+            self.sort_type = 'number of reviews'
+
+    def __repr__(self):
+        string = f'\nCurrent {self.category.title} List (sorted by {self.sort_type}):\n'
+        for b in self.business_list:
+            string += str(b) + '\n'
+        return string
+
+    def __len__(self):
+        return len(self.business_list)
+
+    def __iter__(self):
+        return iter(self.business_list)
+
+    def copy(self):
+
+        '''
+        Creates a shallow copy of the list
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        The new YelpBusinessList object
+        '''
+
+        b_list = YelpBusinessList(self.category, self.sort_type, self.business_index)
+        b_list.business_list = list(self.business_list)
+        return b_list
+
+    def extend(self, other):
+
+        '''
+        Appends the businesses of another list
+
+        Parameters
+        ----------
+        other (YelpBusinessList):
+            The list of businesses to append
+
+        Returns
+        -------
+        None
+        '''
+
+        self.business_list.extend(other.business_list)
+
+    def ids(self):
+
+        '''
+        Returns the Yelp ids of the businesses in the list
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A list of business ids, in list order
+        '''
+
+        return [b.business_id for b in self.business_list]
+
+    def exclude(self, ids):
+
+        '''
+        Creates a list without the businesses whose id is in a set
+
+        Parameters
+        ----------
+        ids (set):
+            The Yelp ids of the businesses to leave out
+
+        Returns
+        -------
+        The new YelpBusinessList object
+        '''
+
+        b_list = YelpBusinessList(self.category, self.sort_type, self.business_index)
+        b_list.business_list = [b for b in self.business_list if b.business_id not in ids]
+        return b_list
+
+    def business(self, business_id):
+
+        '''
+        Finds a business of the list by its Yelp id
+
+        Parameters
+        ----------
+        business_id (str):
+            The Yelp id of the business
+
+        Returns
+        -------
+        The YelpBusiness object OR None if the business is not in the list
+        '''
+
+        for b in self.business_list:
+            if b.business_id == business_id:
+                return b
+        return None
+
+    def add_business(self, business):
+
+        '''
+        Adds a business to the business list.
+
+        Parameters
+        ----------
+        business (YelpBusiness): 
+            The YelpBusiness object to be added to business_list
+
+        Returns
+        -------
+        None
+        '''
+
+        if self.business_index is not None:
+            business = self.business_index.intern(business)
+        self.business_list.append(business)
+
+    def remove_business(self, index):
+
+        '''
+        Removes a business from the business list.
+
+        Parameters
+        ----------
+        index (int): 
+            The index of the YelpBusiness object to be removed from business_list
+
+        Returns
+        -------
+        The YelpBusiness object that was removed OR if list is empty, None
+        '''
+
+        if len(self.business_list) < 1:
+            return None
+        else:
+            return self.business_list.pop(index)
+
+# Number of results requested by the first search call of a category
+FIRST_PAGE = 10
+
+# Most results the YelpAPI returns per call, and the deepest offset + limit it allows
+PAGE_LIMIT = 50
+MAX_DEPTH = 1000
+
+class YelpAPIHandler():
+
+    '''
+    A class to create an object to handle YelpAPI calls.
+
+    Attributes
+    ----------
+    key (str):
+        YelpAPI key
+    address (str):
+        The search address
+    radius (int):
+        The search radius in meters
+    responses (str:YelpBusinessList{})
+        A dictionary containing the alias of categories and the associated list of businesses
+    country_view (CountryView):
+        The categories available in the searched country (None to search every category)
+    cat_tree (CategoryTree):
+        The category tree used to expand broad categories and match businesses to sub-categories (None to disable)
+    expand_limit (int):
+        The number of sub-categories searched when an activity is expanded
+    broad_responses (str:YelpBusinessList{}):
+        A dictionary containing the alias of expanded categories and all the businesses their search returned
+    candidates (str:YelpBusinessList{}):
+        A dictionary containing the alias of categories and all the businesses found for them, before any were assigned to activities
+    center (str:float{}):
+        The latitude and longitude coordinates Yelp resolved the search address to
+    hours_cache (str:dict{}):
+        A dictionary containing business id, opening windows pairs for businesses whose details were requested
+    prefetcher (Prefetcher):
+        The background searcher whose matching first pages are used instead of new YelpAPI calls (None to disable)
+    result_cache (ResultCache):
+        The search results kept between handlers, served according to their age (None to always call the YelpAPI)
+    fetched_at (str:float{}):
+        A dictionary containing the alias of categories and the time their oldest results were fetched
+    stats (CategoryStats):
+        The statistics the number of results of each category search is recorded in, also used to rank sub-categories when expanding (None to disable)
+    adaptive (bool):
+        Whether categories are first searched within min_radius, widening the radius geometrically up to radius only for the categories that come back short
+    min_radius (int):
+        The starting radius of an adaptive search in meters
+    growth (float):
+        The factor the radius of an adaptive search is widened by
+    requests (int):
+        The number of YelpAPI search calls made (results served from the cache or the prefetcher are not counted)
+    report (str:dict{}):
+        A dictionary containing the alias of categories searched and the radius, number of requests and number of results of their search
+    business_index (BusinessIndex):
+        The index all the businesses found by the handler are interned in, so a business listed under several categories is a single object
+    request_timeout (float):
+        The seconds each YelpAPI call may take (None for no limit)
+    deadline (float):
+        The seconds a whole API_call() may take, the categories not searched in time are left unassigned (None for no limit)
+    hedge (bool):
+        Whether a duplicate of a YelpAPI call is sent once it has taken longer than the p95 latency observed so far
+    latency (LatencyTracker):
+        The latencies of the recent YelpAPI calls (shared with the other handlers of the program, so the p95 is known from the first calls of a search)
+    late (str{}):
+        The aliases of the categories whose search missed a deadline in the last API_call()
+    uncovered (str{}):
+        The aliases of the categories the offline snapshot could not search in the last API_call(), because the address was not recorded
+    '''
+
+    def __init__(self, key, address='', radius=0, country_view=None, cat_tree=None, expand_limit=5, client=None, latency=None, caller=None):
+
+        '''
+        Constructs the YelpAPIHandler object
+
+        Parameters
+        ----------
+        key (str):
+            YelpAPI key
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+        country_view (CountryView):
+            The categories available in the searched country (None to search every category)
+        cat_tree (CategoryTree):
+            The category tree used to expand broad categories and match businesses to sub-categories (None to disable)
+        expand_limit (int):
+            The number of sub-categories searched when an activity is expanded
+        client (object):
+            An object with the YelpAPI search_query()/business_query() methods to use instead of a new YelpAPI client (e.g., a StubYelpAPI)
+        latency (LatencyTracker):
+            The tracker of the YelpAPI call latencies (None for a new one). A search makes too few calls to know its own p95, so it is shared between searches
+        caller (HedgedCaller):
+            The caller running calls with deadlines and hedging (None to create one on the first such call)
+
+        Returns
+        -------
+        None
+        '''
+
+        # A client created here can be created again for hedged calls, a given client is shared by both copies
+        self._key = key if client is None else None
+        if client is None:
+            from yelpapi import YelpAPI
+            client = YelpAPI(key)
+        self.yelp_api = client
+        self.address = address
+        self.radius = radius
+        self.country_view = country_view
+        self.cat_tree = cat_tree
+        self.expand_limit = expand_limit
+        self.broad_responses = {}
+        self.candidates = {}
+        self.responses = {}
+        self.center = None
+        self.hours_cache = {}
+        self.business_index = BusinessIndex()
+        self.prefetcher = None
+        self.result_cache = None
+        self.fetched_at = {}
+        self.stats = None
+        self.adaptive = False
+        self.min_radius = 1609
+        self.growth = 2
+        self.requests = 0
+        self.report = {}
+        self.request_timeout = None
+        self.deadline = None
+        self.hedge = False
+        self.latency = latency if latency is not None else LatencyTracker()
+        self.late = set()
+        self.uncovered = set()
+        self.caller = caller
+        self._hedge_api = None
+        self._deadline_at = None
+        # The YelpAPI clients created here are not shared between threads, a background refresh waits for the client
+        self._client_locks = {}
+
+    def API_call(self, activity_list, sort):
+
+        '''
+        Makes calls to the YelpAPI for each activity in the activity_list
+
+        Parameters
+        ----------
+        activity_list (Activity[]): 
+            A list of activities
+        sort (str): 
+            The sort type when searching the Yelp database
+
+        Returns
+        -------
+        None
+        '''
+
+        # A set that ensures duplicate categories aren't searched 
+        check_dup_cats = set() 
+
+        self.late = set()
+        self.uncovered = set()
+        self._deadline_at = None if self.deadline is None else time.monotonic() + self.deadline
+
+        try:
+            self.search_activities(activity_list, sort, check_dup_cats)
+        finally:
+            self._deadline_at = None
+
+    def search_activities(self, activity_list, sort, check_dup_cats):
+
+        '''
+        Searches the businesses of each activity and assigns them (the body of API_call()). A category whose search misses a deadline is left unassigned and the search moves on to the next one
+
+        Parameters
+        ----------
+        activity_list (Activity[]):
+            A list of activities
+        sort (str):
+            The sort type when searching the Yelp database
+        check_dup_cats (str{}):
+            The aliases of the categories already searched
+
+        Returns
+        -------
+        None
+        '''
+
+        for a in activity_list:
+
+            # Skip categories Yelp does not support in the searched country, the call would return no results
+            if self.country_view is not None and a.category not in self.country_view:
+                continue
+
+            # Skip the YelpAPI call if the category was already search (for duplicate categories in the activity list)
+            if a.category.alias not in check_dup_cats:
+                check_dup_cats.add(a.category.alias)
+
+                # Reuse the results of an expanded search if some of its businesses fall under this category, leaving out the businesses already assigned
+                assigned = {other.business.business_id for other in activity_list if other.business is not None and other.business.business_id is not None}
+                shared = self.from_broad_responses(a.category, sort, assigned)
+                if shared is not None:
+                    profiling.count('cache.hits')
+                    self.responses[a.category.alias] = shared
+                    self.candidates[a.category.alias] = shared.copy()
+                    a.business = self.next_business(a.category.alias)
+                    continue
+
+                aliases = self.search_aliases(a)
+
+                # Each activity with this category needs its own usable business, page deeper only if the first page does not have enough
+                needed = sum(1 for other in activity_list if other.category.alias == a.category.alias)
+
+                # Past the search deadline, the categories left are not searched
+                if self._deadline_at is not None and time.monotonic() >= self._deadline_at:
+                    self.late.add(a.category.alias)
+                    continue
+
+                # Use YelpAPI calls to return list of businesses and create a YelpBusinessList object
+                try:
+                    b_list = self.search_category(a.category, sort, needed, aliases)
+                except DeadlineExceeded:
+                    profiling.count('api.deadline_misses')
+                    self.late.add(a.category.alias)
+                    continue
+                except OfflineError:
+                    self.uncovered.add(a.category.alias)
+                    continue
+
+                if a.expand and self.cat_tree is not None:
+                    self.broad_responses[a.category.alias] = b_list.copy()
+
+                # If the response returned businesses, add it to the responses list. Else, do nothing. 
+                if len(b_list) == 0:
+                    pass
+                else:
+                    self.responses[a.category.alias] = b_list
+                    self.candidates[a.category.alias] = b_list.copy()
+            
+            # Assign the first business in the category to the activity
+            if a.category.alias in self.responses.keys():
+                a.business = self.next_business(a.category.alias)
+
+    def search_category(self, category, sort, needed=1, aliases=None):
+
+        '''
+        Searches the usable businesses of a category. An adaptive search starts within min_radius and widens the radius by the growth factor (up to radius) while fewer than needed usable businesses were found, merging the results of every radius
+
+        Parameters
+        ----------
+        category (Category):
+            The category being searched
+        sort (str):
+            The sort type when searching the Yelp database
+        needed (int):
+            The number of usable businesses wanted
+        aliases (str):
+            The comma-separated category aliases to search (defaults to the category alias)
+
+        Returns
+        -------
+        A YelpBusinessList of the usable businesses found, closer radii first
+        '''
+
+        start = self.requests
+        max_radius = self.radius
+
+        if not self.adaptive:
+            b_list = self.fetch_until(category, sort, self.qualifies, needed, aliases)
+            radius = max_radius
+
+        else:
+            b_list = YelpBusinessList(category, sort, self.business_index)
+            seen = set()
+            radius = min(self.min_radius, max_radius)
+            try:
+                while True:
+                    self.radius = radius
+                    found = self.fetch_until(category, sort, self.qualifies, needed, aliases)
+
+                    # A wider search returns the businesses of the narrower ones again
+                    found = found.exclude(seen)
+                    seen.update(found.ids())
+                    b_list.extend(found)
+
+                    if len(b_list) >= needed or radius >= max_radius:
+                        break
+                    radius = min(math.ceil(radius * self.growth), max_radius)
+            finally:
+                self.radius = max_radius
+
+        self.report[category.alias] = {'radius': radius, 'requests': self.requests - start, 'results': len(b_list)}
+        return b_list
+
+    def plan_shared_stops(self, activity_list, max_rank=5):
+
+        '''
+        Finds businesses that can serve activities of different categories at a single stop: the business has to be among the max_rank best results of each category. The business covering the most activities is picked first (ties go to the best ranked one), and each activity is covered at most once
+
+        Parameters
+        ----------
+        activity_list (Activity[]):
+            A list of searched activities
+        max_rank (int):
+            How far down the results of a category a shared business can be
+
+        Returns
+        -------
+        A list of (YelpBusiness, Activity[]) pairs, one for each shared stop
+        '''
+
+        # The activities of each category that can still share a stop, highest priority first
+        pending = defaultdict(list)
+        for a in activity_list:
+            if a.business is not None:
+                pending[a.category.alias].append(a)
+
+        # The rank of every top business in the results of each category
+        ranks = defaultdict(dict)
+        for alias, candidates in self.candidates.items():
+            if alias in pending:
+                for rank, business_id in enumerate(candidates.ids()[:max_rank]):
+                    ranks[business_id][alias] = rank
+
+        plan = []
+        while ranks:
+            def coverage(business_id):
+                aliases = [alias for alias in ranks[business_id] if pending[alias]]
+                return len(aliases), -sum(ranks[business_id][alias] for alias in aliases)
+
+            best = max(ranks, key=coverage)
+            aliases = [alias for alias in ranks.pop(best) if pending[alias]]
+            if len(aliases) < 2:
+                break
+
+            plan.append((self.candidates[aliases[0]].business(best), [pending[alias].pop(0) for alias in aliases]))
+
+        return plan
+
+    def share_stops(self, plan, activity_list):
+
+        '''
+        Assigns the shared businesses of a plan to their activities. An activity of the same category that was already assigned the shared business gets the replaced business instead
+
+        Parameters
+        ----------
+        plan ((YelpBusiness, Activity[])[]):
+            The shared stops (see plan_shared_stops())
+        activity_list (Activity[]):
+            A list of searched activities
+
+        Returns
+        -------
+        None
+        '''
+
+        for business, activities in plan:
+            for a in activities:
+                for other in activity_list:
+                    if other is not a and other.category.alias == a.category.alias and other.business is business:
+                        other.business = a.business
+                a.business = business
+                business.fetched_at = self.fetched_at.get(a.category.alias)
+
+    def quality(self, activity_list):
+
+        '''
+        Summarizes the cost and the quality of a search: the number of requests made, and the average rating and distance of the businesses assigned to the activities
+
+        Parameters
+        ----------
+        activity_list (Activity[]):
+            A list of searched activities
+
+        Returns
+        -------
+        A dictionary with the "requests", "assigned", "rating" and "distance" (meters, None if unknown) of the search
+        '''
+
+        assigned = [a.business for a in activity_list if a.business is not None]
+        distances = [b.distance for b in assigned if b.distance is not None]
+        return {'requests': self.requests, 'assigned': len(assigned), 'rating': sum(b.rating for b in assigned) / len(assigned) if assigned else None, 'distance': sum(distances) / len(distances) if distances else None}
+
+    def next_business(self, alias):
+
+        '''
+        Removes the first business of a category's results, marking it with the time it was fetched
+
+        Parameters
+        ----------
+        alias (str):
+            The alias of the category
+
+        Returns
+        -------
+        The YelpBusiness object OR None if no business is left
+        '''
+
+        business = self.responses[alias].remove_business(0)
+        if business is not None:
+            business.fetched_at = self.fetched_at.get(alias)
+        return business
+
+    def search_aliases(self, activity):
+
+        '''
+        Returns the category aliases searched for an activity. An expanded activity also searches the most populated sub-categories of its category
+
+        Parameters
+        ----------
+        activity (Activity):
+            The activity being searched
+
+        Returns
+        -------
+        The comma-separated category aliases to search
+        '''
+
+        if activity.expand and self.cat_tree is not None:
+            weights = self.stats.weights(self.address) if self.stats is not None else None
+            return ','.join([activity.category.alias] + [leaf.alias for leaf in self.cat_tree.expand(activity.category, self.expand_limit, self.country_view, weights)])
+        return activity.category.alias
+
+    def search_page(self, category, sort, offset, limit, aliases=None):
+
+        '''
+        Returns a page of search results, from the result cache if it has a recent enough copy. Calls the query_page() or fetch_page() method otherwise
+
+        Parameters
+        ----------
+        category (Category):
+            The category being searched
+        sort (str):
+            The sort type when searching the Yelp database
+        offset (int):
+            The number of results to skip
+        limit (int):
+            The number of results to return (at most PAGE_LIMIT)
+        aliases (str):
+            The comma-separated category aliases to search (defaults to the category alias)
+
+        Returns
+        -------
+        page (YelpBusinessList):
+            The businesses of the page
+        total (int):
+            The total number of businesses Yelp found for the search
+        '''
+
+        if self.result_cache is None:
+            page, total = self.query_page(category, sort, offset, limit, aliases)
+            self.note_fetched(category.alias, time.time())
+            return page, total
+
+        # The key and a background refresh both use the search criteria of this call, even if the handler's address or radius change before the refresh runs
+        params = self.search_params(category, sort, offset, limit, aliases)
+
+        # Only a search this call made is recorded in the statistics: a cached result was recorded when it was fetched, and refreshing it is not a new search
+        def fetch():
+            page, total, center = self.fetch_page(category, params, BusinessIndex())
+            self.observe(category, params, total)
+            return page, total, center
+
+        def refresh():
+            return self.refresh_page(category, params, BusinessIndex())
+
+        key = (params['location'], params['radius'], sort, params['categories'], offset, limit)
+        (page, total, center), fetched_at = self.result_cache.get(key, fetch, refresh)
+
+        if self.center is None:
+            self.center = center
+        self.note_fetched(category.alias, fetched_at)
+
+        # The cached page is shared, callers get their own copy
+        return self.adopt(page.copy()), total
+
+    def adopt(self, page):
+
+        '''
+        Interns copies of the businesses of a page fetched by another handler (cached or prefetched) in the business index of this handler. The cached businesses are shared with other handlers, possibly running in other threads, so they are never changed
+
+        Parameters
+        ----------
+        page (YelpBusinessList):
+            The page
+
+        Returns
+        -------
+        The page
+        '''
+
+        page.business_index = self.business_index
+        page.business_list = [self.business_index.intern(b.copy()) for b in page.business_list]
+        return page
+
+    def note_fetched(self, alias, fetched_at):
+
+        '''
+        Records the time results of a category were fetched, keeping the oldest one
+
+        Parameters
+        ----------
+        alias (str):
+            The alias of the category
+        fetched_at (float):
+            The time the results were fetched (seconds since the epoch)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.fetched_at[alias] = min(self.fetched_at.get(alias, fetched_at), fetched_at)
+
+    def search_params(self, category, sort, offset, limit, aliases=None):
+
+        '''
+        Builds the parameters of a YelpAPI search call from the current search address and radius
+
+        Parameters
+        ----------
+        category (Category):
+            The category being searched
+        sort (str):
+            The sort type when searching the Yelp database
+        offset (int):
+            The number of results to skip
+        limit (int):
+            The number of results to return (at most PAGE_LIMIT)
+        aliases (str):
+            The comma-separated category aliases to search (defaults to the category alias)
+
+        Returns
+        -------
+        A dictionary of the search parameters
+        '''
+
+        return dict(location=self.address, categories=aliases or category.alias, radius=self.radius, sort_by=sort, limit=limit, offset=offset)
+
+    def query_page(self, category, sort, offset, limit, aliases=None):
+
+        '''
+        Makes a single YelpAPI search call around the handler's address and within its radius. Calls the fetch_page() method
+
+        Parameters
+        ----------
+        category (Category):
+            The category being searched
+        sort (str):
+            The sort type when searching the Yelp database
+        offset (int):
+            The number of results to skip
+        limit (int):
+            The number of results to return (at most PAGE_LIMIT)
+        aliases (str):
+            The comma-separated category aliases to search (defaults to the category alias)
+
+        Returns
+        -------
+        page (YelpBusinessList):
+            The businesses of the page
+        total (int):
+            The total number of businesses Yelp found for the search
+        '''
+
+        params = self.search_params(category, sort, offset, limit, aliases)
+        page, total, center = self.fetch_page(category, params, self.business_index)
+        self.observe(category, params, total)
+        if self.center is None and center is not None:
+            self.center = center
+        return page, total
+
+    def fetch_page(self, category, params, business_index):
+
+        '''
+        Makes a single YelpAPI search call with the given parameters, within the deadlines, and stores the businesses returned in a YelpBusinessList. The call is counted in the handler's requests, so it only runs on the thread searching with the handler. The search is not recorded in the statistics (see observe())
+
+        Parameters
+        ----------
+        category (Category):
+            The category being searched
+        params (dict):
+            The parameters of the search call (see search_params())
+        business_index (BusinessIndex):
+            The index the businesses are interned in
+
+        Returns
+        -------
+        page (YelpBusinessList):
+            The businesses of the page
+        total (int):
+            The total number of businesses Yelp found for the search
+        center (str:float{}):
+            The coordinates of the search address (None if Yelp did not return them)
         '''
 
-        change_activity = self.remove_from_list(prio_to_be_changed)
-        change_activity.prio = new_prio
-        self.add_to_list(change_activity)
+        self.requests += 1
+        with profiling.span('api.search_query'):
+            response = self.call_client('search_query', params)
+        return self.parse_page(category, params, response, business_index)
 
-class YelpBusiness():
+    def refresh_page(self, category, params, business_index):
 
-    '''
-    A class to store Yelp business information.
+        '''
+        Makes the YelpAPI search call refreshing a cached page (runs on a background thread of the result cache). It leaves the handler alone: the call waits for the client lock but is not counted in the requests, its latency is not recorded, and it is neither hedged nor bound by the search deadline
 
-    Attributes
-    ----------
-    name (str):
-        The name of the business
-    category (Category):
-        A Category object representing a business category
-    rating (float):
-        The average rating of the business
-    num_reviews (int):
-        The number of Yelp reviews of the business
-    url (str):
-        The Yelp URL of the business
-    coordinates (str:float{}):
-        The latitude and longitude coordinates
-    location (str[]):
-        A list containing each line of the address
-    distance (int):
-        The distance from the original search location in meters
-    '''
+        Parameters
+        ----------
+        category (Category):
+            The category being searched
+        params (dict):
+            The parameters of the search call (see search_params())
+        business_index (BusinessIndex):
+            The index the businesses are interned in
+
+        Returns
+        -------
+        page (YelpBusinessList):
+            The businesses of the page
+        total (int):
+            The total number of businesses Yelp found for the search
+        center (str:float{}):
+            The coordinates of the search address (None if Yelp did not return them)
+        '''
 
-    def __init__(self, name, category, rating, num_reviews, url, coordinates, location, distance):
+        response = self.locked(self.yelp_api, 'search_query')(**params)
+        return self.parse_page(category, params, response, business_index)
+
+    def parse_page(self, category, params, response, business_index):
 
         '''
-        Constructs the YelpBusiness object
+        Stores the businesses of a YelpAPI search response in a YelpBusinessList
 
         Parameters
         ----------
-        name (str):
-            The name of the business
         category (Category):
-            A Category object representing a business category
-        rating (float):
-            The average rating of the business
-        num_reviews (int):
-            The number of Yelp reviews of the business
-        url (str):
-            The Yelp URL of the business
-        coordinates (str:float{}):
-            The latitude and longitude coordinates
-        location (str[]):
-            A list containing each line of the address
-        distance (int):
-            The distance from the original search location in meters
+            The category being searched
+        params (dict):
+            The parameters of the search call (see search_params())
+        response (dict):
+            The decoded response of the search call
+        business_index (BusinessIndex):
+            The index the businesses are interned in
 
         Returns
         -------
+        page (YelpBusinessList):
+            The businesses of the page
+        total (int):
+            The total number of businesses Yelp found for the search
+        center (str:float{}):
+            The coordinates of the search address (None if Yelp did not return them)
+        '''
+
+        sort = params['sort_by']
+        profiling.count('api.calls')
+
+        # The client only exposes the decoded response, so the size of its compact JSON is counted, not the bytes received (only computed while profiling)
+        if profiling.profiler.enabled:
+            profiling.count('api.json_bytes', len(json.dumps(response, separators=(',', ':'))))
+
+        # Keep the coordinates of the search address for routing
+        center = response['region']['center'] if 'region' in response else None
+
+        # For each business in the business list, create a YelpBusiness object
+        page = YelpBusinessList(category, sort, business_index)
+        with profiling.span('api.parse'):
+            page.business_list = [business_index.intern(YelpBusiness(name=b['name'], category=category, rating=b['rating'], num_reviews=b['review_count'], url=b['url'], coordinates=b['coordinates'], location=b['location']['display_address'], distance=b.get('distance'), business_id=b['id'], aliases=[c['alias'] for c in b.get('categories', [])], is_closed=b.get('is_closed', False))) for b in response['businesses']]
+
+        total = response.get('total', len(page))
+        return page, total, center
+
+    def time_left(self):
+
+        '''
+        Computes how long the next YelpAPI call may take, given the per-request timeout and the search deadline
+
+        Parameters
+        ----------
         None
+
+        Returns
+        -------
+        The seconds left OR None if there is no limit
         '''
 
-        self.name = name
-        self.category = category
-        self.rating = rating
-        self.num_reviews = num_reviews
-        self.url = url
-        self.coordinates = coordinates 
-        self.location = location 
-        self.distance = distance 
+        limits = []
+        if self.request_timeout is not None:
+            limits.append(self.request_timeout)
+        if self._deadline_at is not None:
+            limits.append(self._deadline_at - time.monotonic())
+        if not limits:
+            return None
 
-    def __repr__(self):
-        return self.name
+        left = min(limits)
+        if left <= 0:
+            raise DeadlineExceeded("The search deadline has passed")
+        return left
 
-class YelpBusinessList():
+    def call_client(self, method, params):
 
-    '''
-    A class to store all YelpBusiness objects of a certain business category.
+        '''
+        Calls a YelpAPI client method within the deadlines, sending a hedged duplicate once the call has taken longer than the p95 latency observed so far. Without deadlines or hedging the call runs directly on the calling thread
 
-    Attributes
-    ----------
-    business_list (YelpBusiness[]):
-        The list of YelpBusiness objects
-    category (Category):
-        A Category object representing a business category
-    sort_type (str):
-        The sort type that was used to search the Yelp database
-    '''
-    
-    def __init__(self, category, sort_type):
+        Parameters
+        ----------
+        method (str):
+            The client method to call (search_query or business_query)
+        params (dict):
+            The parameters of the call
 
+        Returns
+        -------
+        The response of the client
         '''
-        Constructs the YelpBusinessList object
+
+        timeout = self.time_left()
+        hedge_after = self.latency.percentile(95) if self.hedge else None
+
+        if timeout is None and hedge_after is None:
+            with self.client_lock(self.yelp_api):
+                start = time.perf_counter()
+                response = getattr(self.yelp_api, method)(**params)
+            self.latency.record(time.perf_counter() - start)
+            return response
+
+        if self.caller is None:
+            self.caller = HedgedCaller()
+        hedged = self.caller.hedged
+        response = self.caller.call(self.locked(self.yelp_api, method), params, timeout, hedge_after, self.locked(self.hedge_api(), method), self.latency)
+        if self.caller.hedged > hedged:
+            profiling.count('api.hedged')
+        return response
+
+    def client_lock(self, client):
+
+        # Only the YelpAPI clients created by the handler need a lock, a given client is shared (e.g., by the service) and must be thread-safe
+        if self._key is None:
+            return contextlib.nullcontext()
+        return self._client_locks.setdefault(id(client), threading.Lock())
+
+    def locked(self, client, method):
+
+        '''
+        Wraps a client method so that calls on other threads (hedged copies, background refreshes) wait for the client instead of sharing it
+
+        Parameters
+        ----------
+        client (object):
+            The YelpAPI client
+        method (str):
+            The client method to call
+
+        Returns
+        -------
+        A function taking the parameters of the call
+        '''
+
+        def call(**params):
+            with self.client_lock(client):
+                return getattr(client, method)(**params)
+        return call
+
+    def hedge_api(self):
+
+        '''
+        Returns the client hedged duplicates are sent with: a second YelpAPI client when the handler created its own, so the two copies do not share a connection, otherwise the given client
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        The client
+        '''
+
+        if self._key is None:
+            return self.yelp_api
+        if self._hedge_api is None:
+            from yelpapi import YelpAPI
+            self._hedge_api = YelpAPI(self._key)
+        return self._hedge_api
+
+    def observe(self, category, params, total):
+
+        '''
+        Records the number of results of a single category search in the statistics. Only called for searches the handler made itself, not for results taken from the prefetcher or the result cache, so a search is recorded once
 
         Parameters
         ----------
         category (Category):
-            A Category object representing a business category
-        sort_type (str):
-            The sort type that was used to search the Yelp database
+            The category searched
+        params (dict):
+            The parameters of the search call (only first pages of single category searches are recorded, not expanded ones)
+        total (int):
+            The total number of businesses Yelp found
 
         Returns
         -------
         None
         '''
 
-        self.business_list = []
-        self.category = category
-        self.sort_type = sort_type
-        
-        # Change 'review_count' to 'number of reviews' for printing purposes
-        if self.sort_type == 'review_count':
-            self.sort_type = 'number of reviews'
+        if self.stats is not None and params['offset'] == 0 and params['categories'] == category.alias:
+            self.stats.observe(category.alias, params['location'], params['radius'], total)
 
-    def __repr__(self):
-        string = f'\nCurrent {self.category.title} List (sorted by {self.sort_type}):\n'
-        for b in self.business_list:
-            string += str(b) + '\n'
-        return string
+    def iter_pages(self, category, sort, aliases=None, page_size=None):
 
-    def add_business(self, business):
+        '''
+        Lazily pages through the search results of a category. The next page is only requested when the caller asks for it
 
+        Parameters
+        ----------
+        category (Category):
+            The category being searched
+        sort (str):
+            The sort type when searching the Yelp database
+        aliases (str):
+            The comma-separated category aliases to search (defaults to the category alias)
+        page_size (callable):
+            A function taking the number of results fetched so far and returning the size of the next page (defaults to FIRST_PAGE for every page)
+
+        Returns
+        -------
+        A generator of YelpBusinessList pages, without businesses already returned on an earlier page
         '''
-        Adds a business to the business list.
+
+        offset = 0
+        total = None
+        seen = set()
+
+        while total is None or offset < min(total, MAX_DEPTH):
+            limit = FIRST_PAGE if page_size is None or offset == 0 else page_size(offset)
+            limit = max(1, min(limit, PAGE_LIMIT, MAX_DEPTH - offset))
+
+            # The first page may already have been searched in the background
+            prefetched = None
+            if offset == 0 and self.prefetcher is not None and limit == self.prefetcher.limit:
+                prefetched = self.prefetcher.take(self.address, self.radius, sort, aliases or category.alias, self.time_left())
+
+            if prefetched is not None:
+                page, total, center, fetched_at = prefetched
+                page = self.adopt(page)
+                if self.center is None:
+                    self.center = center
+                self.note_fetched(category.alias, fetched_at)
+            else:
+                page, total = self.search_page(category, sort, offset, limit, aliases)
+            offset += limit
+            returned = len(page)
+
+            # Results can shift between pages, so drop businesses seen on an earlier page
+            if seen:
+                page = page.exclude(seen)
+            seen.update(page.ids())
+            yield page
+
+            # A short page means there are no more results
+            if returned < limit:
+                return
+
+    def iter_businesses(self, category, sort, aliases=None):
+
+        '''
+        Lazily yields the businesses of a category, requesting pages of FIRST_PAGE results only as they are consumed
 
         Parameters
         ----------
-        business (YelpBusiness): 
-            The YelpBusiness object to be added to business_list
+        category (Category):
+            The category being searched
+        sort (str):
+            The sort type when searching the Yelp database
+        aliases (str):
+            The comma-separated category aliases to search (defaults to the category alias)
 
         Returns
         -------
-        None
+        A generator of YelpBusiness objects
         '''
 
-        self.business_list.append(business)
+        for page in self.iter_pages(category, sort, aliases):
+            yield from page
 
-    def remove_business(self, index):
+    def fetch_until(self, category, sort, predicate, needed=1, aliases=None):
 
         '''
-        Removes a business from the business list.
+        Pages through the results of a category until enough of them satisfy a predicate. After the first page, each page is sized from the share of qualifying businesses seen so far, so few requests are made
 
         Parameters
         ----------
-        index (int): 
-            The index of the YelpBusiness object to be removed from business_list
+        category (Category):
+            The category being searched
+        sort (str):
+            The sort type when searching the Yelp database
+        predicate (callable):
+            A function taking a YelpBusiness and returning whether it is usable
+        needed (int):
+            The number of usable businesses wanted
+        aliases (str):
+            The comma-separated category aliases to search (defaults to the category alias)
 
         Returns
         -------
-        The YelpBusiness object that was removed OR if list is empty, None
+        A YelpBusinessList of the usable businesses found, in the order of the search results
         '''
 
-        if len(self.business_list) < 1:
-            return None
-        else:
-            return self.business_list.pop(index)
+        found = YelpBusinessList(category, sort, self.business_index)
 
-class YelpAPIHandler():
+        def page_size(fetched):
+            # Estimate how many more results are needed from the share of usable results so far
+            rate = max(len(found), 1) / max(fetched, 1)
+            return math.ceil((needed - len(found)) / rate)
 
-    '''
-    A class to create an object to handle YelpAPI calls.
+        for page in self.iter_pages(category, sort, aliases, page_size):
+            page.business_list = [b for b in page.business_list if predicate(b)]
+            found.extend(page)
+            if len(found) >= needed:
+                break
 
-    Attributes
-    ----------
-    key (str):
-        YelpAPI key
-    address (str):
-        The search address
-    radius (int):
-        The search radius in meters
-    responses (str:YelpBusinessList{})
-        A dictionary containing the alias of categories and the associated list of businesses
-    '''
+        return found
 
-    def __init__(self, key, address='', radius=0):
+    def qualifies(self, business):
 
         '''
-        Constructs the YelpAPIHandler object
+        The default check that a business is usable for an activity: not permanently closed and within the search radius
 
         Parameters
         ----------
-        key (str):
-            YelpAPI key
-        address (str):
-            The search address
-        radius (int):
-            The search radius in meters
+        business (YelpBusiness):
+            The business to check
 
         Returns
         -------
-        None
+        Boolean value
         '''
 
-        self.yelp_api = YelpAPI(key)
-        self.address = address
-        self.radius = radius
-        self.responses = {}
+        if business.is_closed:
+            return False
+        if business.distance is not None and self.radius and business.distance > self.radius:
+            return False
+        return True
 
-    def API_call(self, activity_list, sort):
+    def rerank(self, activity_list, ranker):
 
         '''
-        Makes calls to the YelpAPI for each activity in the activity_list
+        Re-orders the businesses found for each category with a Ranker and assigns the best ones to the activities again. No YelpAPI calls are made
 
         Parameters
         ----------
         activity_list (Activity[]): 
             A list of activities
-        sort (str): 
-            The sort type when searching the Yelp database
+        ranker (Ranker):
+            The weighting used to score the businesses
 
         Returns
         -------
         None
         '''
 
-        # A set that ensures duplicate categories aren't searched 
-        check_dup_cats = set() 
+        self.responses = {}
+        for alias, candidates in self.candidates.items():
+            b_list = candidates.copy()
+            b_list.sort_type = 'score'
+            self.responses[alias] = b_list
+
+        # Every candidate of every category is scored in one pass
+        ranker.rerank(self.responses.values(), self.radius)
 
         for a in activity_list:
+            a.business = None
+            if a.category.alias in self.responses.keys():
+                a.business = self.next_business(a.category.alias)
 
-            # Skip the YelpAPI call if the category was already search (for duplicate categories in the activity list)
-            if a.category.alias not in check_dup_cats:
-                check_dup_cats.add(a.category.alias)
+    def from_broad_responses(self, category, sort, assigned=()):
+
+        '''
+        Finds the businesses of an earlier expanded search that fall under a narrower category, so the narrower category does not need its own YelpAPI call
+
+        Parameters
+        ----------
+        category (Category):
+            The category being searched
+        sort (str):
+            The sort type when searching the Yelp database
+        assigned (set):
+            The Yelp ids of the businesses already assigned to an activity, left out of the matches
 
-                # Use YelpAPI call to return list of businesses and create a YelpBusinessList object
-                response = self.yelp_api.search_query(location=self.address, categories=a.category.alias, radius=self.radius, sort_by=sort, limit=10)
+        Returns
+        -------
+        A YelpBusinessList of the matching businesses (in the original sort order) OR None if no earlier search covers the category
+        '''
 
-                b_list = YelpBusinessList(a.category, sort)
+        if self.cat_tree is None:
+            return None
 
-                # For each business in the business list, create a YelpBusiness object
-                for b in response['businesses']:
-                    b_list.add_business(YelpBusiness(name=b['name'], category=a.category, rating=b['rating'], num_reviews=b['review_count'], url=b['url'], coordinates=b['coordinates'], location=b['location']['display_address'], distance=b['distance']))
+        for alias, businesses in self.broad_responses.items():
+            if not self.cat_tree.is_descendant(category, alias):
+                continue
 
-                # If the response returned businesses, add it to the responses list. Else, do nothing. 
-                if len(b_list.business_list) == 0:
-                    pass
-                else:
-                    self.responses[a.category.alias] = b_list
-            
-            # Assign the first business in the category to the activity
-            if a.category.alias in self.responses.keys():
-                a.business = self.responses[a.category.alias].remove_business(0)
+            b_list = YelpBusinessList(category, sort, self.business_index)
+            for b in businesses:
+                if b.business_id not in assigned and self.cat_tree.matches(b.aliases, category):
+                    b_list.add_business(b)
+
+            if b_list.business_list:
+                if alias in self.fetched_at:
+                    self.fetched_at[category.alias] = self.fetched_at[alias]
+                return b_list
+
+        return None
+
+    def get_business_hours(self, business_id):
+
+        '''
+        Requests the opening hours of a business from the YelpAPI business details endpoint. Responses are cached so each business is only requested once
+
+        Parameters
+        ----------
+        business_id (str):
+            The Yelp id of the business
+
+        Returns
+        -------
+        The opening windows of the business for each weekday OR None if the business has no listed hours
+        '''
+
+        if business_id not in self.hours_cache:
+            # Hours that could not be fetched in time are unknown, they are requested again next time
+            try:
+                with profiling.span('api.business_query'):
+                    details = self.call_client('business_query', {'id': business_id})
+            except DeadlineExceeded:
+                profiling.count('api.deadline_misses')
+                return None
+            profiling.count('api.calls')
+            self.hours_cache[business_id] = parse_hours(details.get('hours'))
+        else:
+            profiling.count('cache.hits')
+
+        return self.hours_cache[business_id]
 
 if __name__ == "__main__":
-    start = UI("categories.json")
-    start.user_input()
+    parser = argparse.ArgumentParser(description="Yelist, the activity list aggregate search powered by Yelp")
+    parser.add_argument('--country', default='US', help="two-letter code of the country being searched (default: US)")
+    parser.add_argument('--profile', action='store_true', help=f"print a timing summary on exit (same as setting {profiling.ENV_VAR})")
+    parser.add_argument('--prefetch-budget', type=int, default=10, metavar='N', help="most YelpAPI calls made in the background while the activity list is built (default: 10, 0 to disable)")
+    parser.add_argument('--no-browser', action='store_true', help="print the directions link instead of opening a web browser (e.g. on a server)")
+    parser.add_argument('--export', metavar='FILE', help="also export the final plan to a JSON file")
+    parser.add_argument('--trace', metavar='FILE', help="also write a Chrome trace-event JSON file on exit (implies --profile)")
+    parser.add_argument('--offline', metavar='SNAPSHOT', help="search an offline snapshot built with offline.py instead of the YelpAPI")
+    parser.add_argument('--fan-out', choices=['first', 'merge'], help="search the --offline snapshot and the YelpAPI in parallel, taking the first full answer or merging both")
+    parser.add_argument('--hedge-delay', type=float, default=0.0, metavar='SECONDS', help="with --fan-out first, only search the YelpAPI if the snapshot has not answered within this delay (default: 0, search both at once)")
+    parser.add_argument('--request-timeout', type=float, metavar='SECONDS', help="longest wait for a single YelpAPI call")
+    parser.add_argument('--deadline', type=float, metavar='SECONDS', help="longest wait for the whole search, activities not searched in time are left unassigned")
+    parser.add_argument('--hedge', action='store_true', help="send a duplicate of YelpAPI calls slower than the p95 latency observed so far, the first answer wins")
+    args = parser.parse_args()
+
+    if args.fan_out and not args.offline:
+        parser.error("--fan-out needs an --offline snapshot to search alongside the YelpAPI")
+
+    if args.profile or args.trace:
+        profiling.enable()
+
+    start = None
+    try:
+        start = UI("categories.json", args.country, args.prefetch_budget, not args.no_browser, args.export, args.offline, args.fan_out, args.hedge_delay, args.request_timeout, args.deadline, args.hedge)
+        start.user_input()
+    finally:
+        if start is not None and start.prefetcher is not None:
+            start.prefetcher.shutdown()
+        if start is not None:
+            start.result_cache.shutdown()
+        if start is not None and start.backend_client is not None:
+            start.backend_client.close()
+        if start is not None and start.caller is not None:
+            start.caller.shutdown()
+        if profiling.profiler.enabled:
+            print(profiling.profiler.summary())
+            if args.trace:
+                profiling.profiler.export_chrome_trace(args.trace)
@@ -0,0 +1,507 @@
+'''
+This program contains the search backends: interchangeable sources of Yelp search results behind a single async search() method, and the fan-out that queries several of them at once.
+
+A backend's search() takes the YelpAPI search_query() parameters and returns a normalized response, {"businesses": [...], "total": n, "region": {"center": {...}}}. Each business keeps only the fields Yelist uses. The YelpAPI, the offline snapshot and the local stand-in are client backends, whose blocking calls run on the default thread pool. The cache backend answers from responses seen recently.
+
+The FanOutBackend queries several backends in parallel. It either returns the first adequate answer and cancels the others (optionally hedging: the next backend only starts if the previous ones have not answered within a delay), or waits for all of them and merges their businesses. The BackendClient turns any backend back into a client with a blocking search_query() method, so a YelpAPIHandler can search through it.
+'''
+
+import asyncio
+import json
+import threading
+from collections import Counter
+
+from result_cache import ResultCache
+
+# The fields of a normalized business, with the value used when a backend leaves one out
+BUSINESS_FIELDS = {'id': None, 'name': '', 'url': '', 'rating': 0, 'review_count': 0, 'is_closed': False, 'categories': [], 'coordinates': None, 'location': None, 'distance': None}
+
+class BackendMiss(Exception):
+
+    '''
+    Raised by a backend that has no answer for a search (e.g., the cache backend for a search it has not seen)
+    '''
+
+def normalize(response):
+
+    '''
+    Normalizes a Yelp-shaped search response: every business gets exactly the fields of BUSINESS_FIELDS
+
+    Parameters
+    ----------
+    response (dict):
+        The decoded search response
+
+    Returns
+    -------
+    The normalized search response dictionary
+    '''
+
+    businesses = []
+    for b in response.get('businesses', []):
+        business = {field: b.get(field, default) for field, default in BUSINESS_FIELDS.items()}
+        business['categories'] = list(b.get('categories') or [])
+        business['location'] = {'display_address': (b.get('location') or {}).get('display_address', [])}
+        businesses.append(business)
+
+    return {'businesses': businesses, 'total': response.get('total', len(businesses)), 'region': response.get('region', {})}
+
+def search_key(params):
+    return json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+def sort_businesses(businesses, sort_by):
+
+    '''
+    Sorts businesses in the order of a YelpAPI sort type (best_match keeps the given order)
+
+    Parameters
+    ----------
+    businesses (dict[]):
+        The normalized businesses
+    sort_by (str):
+        The sort type (review_count, rating, distance or best_match)
+
+    Returns
+    -------
+    The sorted list of businesses
+    '''
+
+    far = float('inf')
+    if sort_by == 'distance':
+        return sorted(businesses, key=lambda b: b['distance'] if b['distance'] is not None else far)
+    if sort_by in ('rating', 'review_count'):
+        return sorted(businesses, key=lambda b: (-b[sort_by], b['distance'] if b['distance'] is not None else far))
+    return list(businesses)
+
+def adequate(response, params):
+
+    '''
+    Checks if a response fully answers a search: it has results and fills the requested page. An empty answer is not adequate, since a backend such as the offline snapshot may only lack the data
+
+    Parameters
+    ----------
+    response (dict):
+        The normalized search response
+    params (dict):
+        The parameters of the search
+
+    Returns
+    -------
+    Boolean value
+    '''
+
+    wanted = min(params.get('limit', 20), response['total'] - params.get('offset', 0))
+    return response['total'] > 0 and len(response['businesses']) >= wanted
+
+class SearchBackend():
+
+    '''
+    The interface of the search backends.
+
+    Attributes
+    ----------
+    name (str):
+        The name of the backend, used in reports
+    '''
+
+    name = 'backend'
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name})"
+
+    async def search(self, **params):
+
+        '''
+        Searches for businesses
+
+        Parameters
+        ----------
+        **params:
+            The YelpAPI search_query() parameters (location, categories, radius, sort_by, limit, offset)
+
+        Returns
+        -------
+        The normalized search response dictionary
+        '''
+
+        raise NotImplementedError
+
+class ClientBackend(SearchBackend):
+
+    '''
+    A backend wrapping a client with the YelpAPI search_query()/business_query() methods. The blocking calls run on the default thread pool of the event loop, so a cancelled search stops waiting but the call itself finishes in the background.
+
+    Attributes
+    ----------
+    client (object):
+        The wrapped client
+    name (str):
+        The name of the backend, used in reports
+    '''
+
+    def __init__(self, client, name='client'):
+
+        '''
+        Constructs the ClientBackend object
+
+        Parameters
+        ----------
+        client (object):
+            The client to wrap
+        name (str):
+            The name of the backend, used in reports
+
+        Returns
+        -------
+        None
+        '''
+
+        self.client = client
+        self.name = name
+
+    async def search(self, **params):
+        return normalize(await asyncio.to_thread(self.client.search_query, **params))
+
+    def details(self, business_id):
+        return self.client.business_query(id=business_id)
+
+class YelpBackend(ClientBackend):
+
+    '''
+    A backend searching the Yelp Fusion API.
+    '''
+
+    def __init__(self, key, name='yelp'):
+        from yelpapi import YelpAPI
+        super().__init__(YelpAPI(key), name)
+
+class OfflineBackend(ClientBackend):
+
+    '''
+    A backend searching an offline snapshot (see offline.py).
+    '''
+
+    def __init__(self, snapshot, cat_tree=None, name='offline'):
+        from offline import OfflineClient
+        super().__init__(OfflineClient(snapshot, cat_tree), name)
+
+class StubBackend(ClientBackend):
+
+    '''
+    A backend searching the local stand-in for the YelpAPI (see stub_yelp.py), for tests and benchmarks.
+    '''
+
+    def __init__(self, latency=0.0, name='stub'):
+        from stub_yelp import StubYelpAPI
+        super().__init__(StubYelpAPI(latency), name)
+
+class CacheBackend(SearchBackend):
+
+    '''
+    A backend answering from the responses stored by a fan-out, until they are past the hard TTL of the cache. Searches it has no answer for raise BackendMiss.
+
+    Attributes
+    ----------
+    cache (ResultCache):
+        The stored responses
+    name (str):
+        The name of the backend, used in reports
+    '''
+
+    def __init__(self, cache=None, name='cache'):
+
+        '''
+        Constructs the CacheBackend object
+
+        Parameters
+        ----------
+        cache (ResultCache):
+            The cache to store the responses in (a new one if not given)
+        name (str):
+            The name of the backend, used in reports
+
+        Returns
+        -------
+        None
+        '''
+
+        self.cache = cache if cache is not None else ResultCache()
+        self.name = name
+
+    async def search(self, **params):
+        cached = self.cache.peek(('search', search_key(params)))
+        if cached is None:
+            raise BackendMiss(f"No cached response for {search_key(params)}")
+        return cached[0]
+
+    def store(self, params, response):
+        self.cache.put(('search', search_key(params)), response)
+
+# The deepest page end merged (one YelpAPI call per backend)
+MERGE_DEPTH = 50
+
+class FanOutBackend(SearchBackend):
+
+    '''
+    A backend querying several backends in parallel.
+
+    In "first" mode the backends are started in order, each one hedge_delay seconds after the previous one unless an adequate answer came back first. The first adequate answer is returned and the other searches are cancelled. If no backend answers adequately, the largest answer is returned (or the first error raised). In "merge" mode every backend is awaited and the businesses of all answers are merged by id and sorted again. Best-match answers have no common score, so they are interleaved by rank (each backend's first result, then each backend's second result, and so on). To page through the merged results consistently, every backend is asked for all the results up to the end of the requested page (at most MERGE_DEPTH), and the page is cut from the merge. Pages beyond MERGE_DEPTH are answered in "first" mode.
+
+    Attributes
+    ----------
+    backends (SearchBackend[]):
+        The backends, cheapest or most trusted first
+    mode (str):
+        "first" or "merge"
+    hedge_delay (float):
+        The seconds to wait for an answer before starting the next backend ("first" mode, 0 to start them all at once)
+    timeout (float):
+        The seconds to wait for the backends in "merge" mode (None to wait for all of them)
+    wins (Counter):
+        The number of searches answered by each backend
+    errors (Counter):
+        The number of failed searches of each backend (misses excluded)
+    '''
+
+    name = 'fan-out'
+
+    def __init__(self, backends, mode='first', hedge_delay=0.0, timeout=None):
+
+        '''
+        Constructs the FanOutBackend object
+
+        Parameters
+        ----------
+        backends (SearchBackend[]):
+            The backends, cheapest or most trusted first
+        mode (str):
+            "first" or "merge"
+        hedge_delay (float):
+            The seconds to wait for an answer before starting the next backend ("first" mode, 0 to start them all at once)
+        timeout (float):
+            The seconds to wait for the backends in "merge" mode (None to wait for all of them)
+
+        Returns
+        -------
+        None
+        '''
+
+        if mode not in ('first', 'merge'):
+            raise ValueError(f"Unknown fan-out mode {mode!r}")
+        self.backends = backends
+        self.mode = mode
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.wins = Counter()
+        self.errors = Counter()
+
+    async def search(self, **params):
+        if self.mode == 'merge':
+            response = await self.search_all(params)
+        else:
+            response = await self.search_first(params)
+
+        # Keep the answer for the cache backends, so repeated searches are answered locally
+        for backend in self.backends:
+            if hasattr(backend, 'store') and response['total'] > 0:
+                backend.store(params, response)
+        return response
+
+    async def search_first(self, params):
+
+        '''
+        Returns the first adequate answer of the backends, cancelling the searches still running
+
+        Parameters
+        ----------
+        params (dict):
+            The YelpAPI search_query() parameters
+
+        Returns
+        -------
+        The normalized search response dictionary
+        '''
+
+        tasks = {}
+        waiting = list(self.backends)
+        fallback = None
+        error = None
+
+        try:
+            while waiting or tasks:
+                # Start the next backend now, or all of them when not hedging
+                while waiting and (not tasks or not self.hedge_delay):
+                    backend = waiting.pop(0)
+                    tasks[asyncio.create_task(backend.search(**params))] = backend
+
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay if waiting else None, return_when=asyncio.FIRST_COMPLETED)
+
+                # No answer within the hedge delay: start the next backend alongside
+                if not done:
+                    backend = waiting.pop(0)
+                    tasks[asyncio.create_task(backend.search(**params))] = backend
+                    continue
+
+                for task in done:
+                    backend = tasks.pop(task)
+                    try:
+                        response = task.result()
+                    except BackendMiss:
+                        continue
+                    except Exception as e:
+                        self.errors[backend.name] += 1
+                        error = error or e
+                        continue
+
+                    if adequate(response, params):
+                        self.wins[backend.name] += 1
+                        return response
+                    if fallback is None or len(response['businesses']) > len(fallback[1]['businesses']):
+                        fallback = (backend, response)
+        finally:
+            # Cancel the stragglers
+            for task in tasks:
+                task.cancel()
+
+        if fallback is not None:
+            self.wins[fallback[0].name] += 1
+            return fallback[1]
+        if error is not None:
+            raise error
+        raise BackendMiss("No backend answered the search")
+
+    async def search_all(self, params):
+
+        '''
+        Merges the answers of all the backends, keeping the first copy of each business (in backend order). Each backend is searched from the first result to the end of the requested page, so consecutive pages are cut from the same merged ranking and no business falls between two pages
+
+        Parameters
+        ----------
+        params (dict):
+            The YelpAPI search_query() parameters
+
+        Returns
+        -------
+        The normalized search response dictionary
+        '''
+
+        offset = params.get('offset', 0)
+        limit = params.get('limit', 20)
+        if offset + limit > MERGE_DEPTH:
+            return await self.search_first(params)
+
+        deep = dict(params, offset=0, limit=offset + limit)
+        tasks = {asyncio.create_task(backend.search(**deep)): backend for backend in self.backends}
+        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+
+        merged = {}
+        ranks = {}
+        total = 0
+        region = {}
+        error = None
+        answered = False
+
+        # Merge in backend order, so the more trusted copy of a business wins
+        for index, (task, backend) in enumerate(tasks.items()):
+            if task not in done:
+                continue
+            try:
+                response = task.result()
+            except BackendMiss:
+                continue
+            except Exception as e:
+                self.errors[backend.name] += 1
+                error = error or e
+                continue
+
+            answered = True
+            self.wins[backend.name] += 1
+            total = max(total, response['total'])
+            region = region or response['region']
+            for rank, b in enumerate(response['businesses']):
+                merged.setdefault(b['id'], b)
+                ranks[b['id']] = min(ranks.get(b['id'], (rank, index)), (rank, index))
+
+        if not answered:
+            if error is not None:
+                raise error
+            raise BackendMiss("No backend answered the search")
+
+        sort_by = params.get('sort_by', 'best_match')
+        if sort_by in ('distance', 'rating', 'review_count'):
+            businesses = sort_businesses(merged.values(), sort_by)
+        else:
+            businesses = sorted(merged.values(), key=lambda b: ranks[b['id']])
+        return {'businesses': businesses[offset:offset + limit], 'total': max(total, len(merged)), 'region': region}
+
+class BackendClient():
+
+    '''
+    A class with the blocking YelpAPI search_query()/business_query() methods, running the searches of a backend on an event loop in a background thread. It is safe to share between threads.
+
+    Attributes
+    ----------
+    backend (SearchBackend):
+        The backend searched
+    calls (int):
+        The number of searches made
+    '''
+
+    def __init__(self, backend):
+
+        '''
+        Constructs the BackendClient object
+
+        Parameters
+        ----------
+        backend (SearchBackend):
+            The backend to search
+
+        Returns
+        -------
+        None
+        '''
+
+        self.backend = backend
+        self.calls = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='yelist-backends', daemon=True)
+        self._thread.start()
+        self._lock = threading.Lock()
+
+    def search_query(self, **params):
+        with self._lock:
+            self.calls += 1
+        return asyncio.run_coroutine_threadsafe(self.backend.search(**params), self._loop).result()
+
+    def business_query(self, id, **kwargs):
+
+        '''
+        Returns the details of a business from the first backend offering details that knows it
+
+        Parameters
+        ----------
+        id (str):
+            The business id
+
+        Returns
+        -------
+        A Yelp-shaped business details dictionary
+        '''
+
+        error = None
+        for backend in getattr(self.backend, 'backends', [self.backend]):
+            if not hasattr(backend, 'details'):
+                continue
+            try:
+                return backend.details(id)
+            except Exception as e:
+                error = error or e
+        raise error if error is not None else BackendMiss(f"No backend has details of business {id}")
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,333 @@
+'''
+This program contains the CategoryStats object that learns how many businesses Yelp returns for each category around each search area, and uses it to predict the chance that a search comes back empty before making the call.
+
+The businesses of a category are modeled as a Poisson process with an unknown density (businesses per square kilometer) drawn from a gamma prior. The prior of a category in an area is the density of the category over every other area searched so far, so a few observations anywhere already inform new areas. The statistics are kept between sessions in a small JSON file in the home directory.
+'''
+
+import json
+import math
+import os
+import threading
+
+STATS_FILE = os.path.join(os.path.expanduser('~'), '.yelist_stats.json')
+
+# Density assumed for a category never searched before (businesses per square kilometer), and how many observations its prior is worth
+DEFAULT_DENSITY = 0.05
+PRIOR_WEIGHT = 1.0
+
+def area_key(address):
+
+    '''
+    Normalizes a search address so that different spellings of the same area share statistics
+
+    Parameters
+    ----------
+    address (str):
+        The search address
+
+    Returns
+    -------
+    The area key
+    '''
+
+    return ' '.join(address.lower().replace(',', ' ').split())
+
+def search_area(radius):
+
+    '''
+    Computes the area covered by a search radius
+
+    Parameters
+    ----------
+    radius (int):
+        The search radius in meters
+
+    Returns
+    -------
+    The area in square kilometers
+    '''
+
+    return math.pi * (radius / 1000) ** 2
+
+class CategoryStats():
+
+    '''
+    A class to store the number of results seen for each category and area.
+
+    Attributes
+    ----------
+    counts (str:str:float[]{}{}):
+        A dictionary containing category alias, (area key, [total results, total square kilometers searched]) pairs. The "*" area sums every area
+    path (str):
+        The file the statistics are saved to (None to keep them in memory)
+    lock (threading.Lock):
+        Guards the counts, observed by the prefetcher's thread while the main thread reads and saves them
+    '''
+
+    def __init__(self, counts=None, path=None):
+
+        '''
+        Constructs the CategoryStats object
+
+        Parameters
+        ----------
+        counts (str:str:float[]{}{}):
+            The statistics to start from
+        path (str):
+            The file the statistics are saved to (None to keep them in memory)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.counts = counts if counts is not None else {}
+        self.path = path
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=STATS_FILE):
+
+        '''
+        Loads the statistics saved by earlier sessions
+
+        Parameters
+        ----------
+        path (str):
+            The statistics file
+
+        Returns
+        -------
+        The CategoryStats object (empty if the file does not exist or cannot be read)
+        '''
+
+        try:
+            with open(path) as stats_file:
+                counts = json.load(stats_file)
+        except (OSError, ValueError):
+            counts = {}
+
+        return cls(counts if type(counts) is dict else {}, path)
+
+    def save(self):
+
+        '''
+        Saves the statistics for the next sessions
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        if self.path is None:
+            return
+
+        # Serialized under the lock, so a search recorded meanwhile cannot change the counts being written
+        with self.lock:
+            text = json.dumps(self.counts, separators=(',', ':'))
+        try:
+            with open(self.path, 'w') as stats_file:
+                stats_file.write(text)
+        except OSError:
+            pass
+
+    def observe(self, alias, address, radius, total):
+
+        '''
+        Records the number of results a search returned
+
+        Parameters
+        ----------
+        alias (str):
+            The alias of the category searched
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+        total (int):
+            The total number of businesses Yelp found
+
+        Returns
+        -------
+        None
+        '''
+
+        area = search_area(radius)
+        with self.lock:
+            by_area = self.counts.setdefault(alias, {})
+            for key in (area_key(address), '*'):
+                seen = by_area.setdefault(key, [0, 0.0])
+                seen[0] += total
+                seen[1] += area
+
+    def posterior(self, alias, address):
+
+        '''
+        Computes the gamma distribution of the density of a category in an area
+
+        Parameters
+        ----------
+        alias (str):
+            The alias of the category
+        address (str):
+            The search address (None for every area)
+
+        Returns
+        -------
+        shape (float):
+            The shape of the gamma distribution
+        rate (float):
+            The rate of the gamma distribution (in square kilometers)
+        '''
+
+        with self.lock:
+            by_area = self.counts.get(alias, {})
+            total, area = by_area.get('*', [0, 0.0])
+            local_total, local_area = by_area.get(area_key(address), [0, 0.0]) if address is not None else (0, 0.0)
+
+        # The prior of an area is the density of the category over every other area, so the area's own searches are only counted once
+        total, area = total - local_total, area - local_area
+        density = (PRIOR_WEIGHT * DEFAULT_DENSITY + total) / (PRIOR_WEIGHT + area) if area > 1e-9 else DEFAULT_DENSITY
+        return PRIOR_WEIGHT + local_total, PRIOR_WEIGHT / density + local_area
+
+    def density(self, alias, address=None):
+
+        '''
+        Estimates the number of businesses of a category per square kilometer
+
+        Parameters
+        ----------
+        alias (str):
+            The alias of the category
+        address (str):
+            The search address (None for every area)
+
+        Returns
+        -------
+        The expected density
+        '''
+
+        shape, rate = self.posterior(alias, address)
+        return shape / rate
+
+    def empty_probability(self, alias, address, radius):
+
+        '''
+        Predicts the chance that a search returns no business (gamma-Poisson, i.e. negative binomial, probability of zero)
+
+        Parameters
+        ----------
+        alias (str):
+            The alias of the category
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+
+        Returns
+        -------
+        The probability of an empty result, between 0 and 1
+        '''
+
+        shape, rate = self.posterior(alias, address)
+        return (rate / (rate + search_area(radius))) ** shape
+
+    def pick_radius(self, aliases, address, radii, max_empty=0.2):
+
+        '''
+        Picks the smallest radius for which every category is unlikely to return nothing
+
+        Parameters
+        ----------
+        aliases (str[]):
+            The aliases of the categories searched
+        address (str):
+            The search address
+        radii (int[]):
+            The radii that can be picked in meters, in increasing order
+        max_empty (float):
+            The highest acceptable chance of an empty result
+
+        Returns
+        -------
+        The picked radius (the largest one if none is good enough)
+        '''
+
+        for radius in radii:
+            if all(self.empty_probability(alias, address, radius) <= max_empty for alias in aliases):
+                return radius
+        return radii[-1]
+
+    def suggest(self, category, address, radius, cat_tree, view=None, max_empty=0.2):
+
+        '''
+        Suggests a related category (a sibling or a parent) that is more likely to return results, when a category is likely to return nothing
+
+        Parameters
+        ----------
+        category (Category):
+            The category to be searched
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+        cat_tree (CategoryTree):
+            The category tree the category belongs to
+        view (CountryView):
+            Only suggest categories available in this view (None for all)
+        max_empty (float):
+            The chance of an empty result above which an alternative is suggested
+
+        Returns
+        -------
+        suggestion (Category):
+            The suggested category OR None if the category is fine or nothing related is better
+        empty (float):
+            The chance that the category returns nothing
+        '''
+
+        empty = self.empty_probability(category.alias, address, radius)
+        if empty <= max_empty:
+            return None, empty
+
+        related = {}
+        for parent in [cat_tree.nodes[p] for p in category.parents]:
+            related[parent.alias] = parent
+            for sibling in parent.children:
+                if sibling is not category:
+                    related[sibling.alias] = sibling
+
+        # Categories never searched only have the default prior, they are not evidence of anything
+        with self.lock:
+            seen = set(self.counts)
+        candidates = [c for c in related.values() if c.alias in seen and (view is None or c in view)]
+        if not candidates:
+            return None, empty
+
+        best = min(candidates, key=lambda c: (self.empty_probability(c.alias, address, radius), c.title))
+        if self.empty_probability(best.alias, address, radius) >= empty:
+            return None, empty
+        return best, empty
+
+    def weights(self, address=None):
+
+        '''
+        Returns how much more populated than a category never searched each category seen is, to rank sub-categories when expanding a category (see CategoryTree.expand())
+
+        Parameters
+        ----------
+        address (str):
+            The search address (None for every area)
+
+        Returns
+        -------
+        A dictionary containing category alias, log density ratio pairs (positive for categories more populated than the default, negative for sparser ones)
+        '''
+
+        with self.lock:
+            aliases = list(self.counts)
+        return {alias: math.log(self.density(alias, address) / DEFAULT_DENSITY) for alias in aliases}
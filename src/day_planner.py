@@ -0,0 +1,348 @@
+'''
+This program contains the DayPlanner object that splits a large activity list into daily tours. The businesses assigned to the activities are clustered by location with a capacitated k-means, each cluster is assigned to the closest origin (e.g., the hotel or address the day starts from) and routed from it.
+'''
+
+import math
+import numpy as np
+from geo import EARTH_RADIUS
+
+# Google Maps directions take at most 9 waypoints besides the destination
+STOPS_PER_DAY = 8
+
+def project(coordinates, center):
+
+    '''
+    Projects coordinates onto a flat plane around a center point (equirectangular projection, accurate over the size of a city)
+
+    Parameters
+    ----------
+    coordinates (str:float{}[]):
+        The latitude and longitude coordinates to project (Yelp "coordinates" format)
+    center (str:float{}):
+        The latitude and longitude coordinates of the center of the projection
+
+    Returns
+    -------
+    An (n, 2) array of x, y positions in meters
+    '''
+
+    lat = np.radians([c['latitude'] for c in coordinates])
+    lon = np.radians([c['longitude'] for c in coordinates])
+    lat0 = math.radians(center['latitude'])
+    lon0 = math.radians(center['longitude'])
+    return np.column_stack(((lon - lon0) * math.cos(lat0) * EARTH_RADIUS, (lat - lat0) * EARTH_RADIUS))
+
+def located(coordinates, default):
+
+    '''
+    Returns coordinates if they are known, otherwise default coordinates
+
+    Parameters
+    ----------
+    coordinates (str:float{}):
+        The latitude and longitude coordinates (Yelp "coordinates" format, possibly None or with None values)
+    default (str:float{}):
+        The coordinates used if they are unknown
+
+    Returns
+    -------
+    The coordinates
+    '''
+
+    if coordinates and coordinates.get('latitude') is not None and coordinates.get('longitude') is not None:
+        return coordinates
+    return default
+
+def squared_distances(points, centers):
+
+    '''
+    Computes the squared distances between every point and every center
+
+    Parameters
+    ----------
+    points (np.ndarray):
+        An (n, 2) array of positions
+    centers (np.ndarray):
+        A (k, 2) array of positions
+
+    Returns
+    -------
+    An (n, k) array of squared distances
+    '''
+
+    d = (points * points).sum(1)[:, None] - 2 * points @ centers.T + (centers * centers).sum(1)[None, :]
+    return np.maximum(d, 0)
+
+def kmeans(points, k, capacity=None, iterations=30, seed=0):
+
+    '''
+    Clusters points with k-means (k-means++ seeding). With a capacity, points are assigned in order of how much they lose by not getting their closest center, to the closest center that is not full
+
+    Parameters
+    ----------
+    points (np.ndarray):
+        An (n, 2) array of positions
+    k (int):
+        The number of clusters
+    capacity (int):
+        The most points in a cluster (None for no limit)
+    iterations (int):
+        The most assignment/update rounds
+    seed (int):
+        The seed of the random number generator
+
+    Returns
+    -------
+    An array of the cluster index of each point
+    '''
+
+    n = len(points)
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+
+    # k-means++: each new center is drawn with a probability proportional to its squared distance to the closest chosen center
+    centers = np.empty((k, 2))
+    centers[0] = points[rng.integers(n)]
+    closest = squared_distances(points, centers[:1])[:, 0]
+    for i in range(1, k):
+        total = closest.sum()
+        pick = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centers[i] = points[pick]
+        closest = np.minimum(closest, squared_distances(points, centers[i:i + 1])[:, 0])
+
+    labels = None
+    for _ in range(iterations):
+        d = squared_distances(points, centers)
+        new_labels = d.argmin(1) if capacity is None or capacity * k < n else assign_capacitated(d, capacity)
+        if labels is not None and (new_labels == labels).all():
+            break
+        labels = new_labels
+
+        # Move each center to the mean of its points (empty clusters keep their center)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros((k, 2))
+        np.add.at(sums, labels, points)
+        filled = counts > 0
+        centers[filled] = sums[filled] / counts[filled, None]
+
+    return labels
+
+def assign_capacitated(d, capacity, candidates=8):
+
+    '''
+    Assigns points to centers without putting more than capacity points in a center. Points with the most to lose (largest gap between their closest and second closest center) are assigned first
+
+    Parameters
+    ----------
+    d (np.ndarray):
+        An (n, k) array of squared distances between points and centers
+    capacity (int):
+        The most points in a cluster
+    candidates (int):
+        The number of closest centers tried for each point before searching every center
+
+    Returns
+    -------
+    An array of the center index of each point
+    '''
+
+    n, k = d.shape
+    m = min(candidates, k)
+
+    # The m closest centers of each point, in order
+    nearest = np.argpartition(d, m - 1, axis=1)[:, :m] if m < k else np.tile(np.arange(k), (n, 1))
+    nearest = np.take_along_axis(nearest, np.take_along_axis(d, nearest, 1).argsort(1), 1)
+    regret = d[np.arange(n), nearest[:, 1]] - d[np.arange(n), nearest[:, 0]] if m > 1 else np.zeros(n)
+
+    labels = np.empty(n, dtype=np.intp)
+    load = np.zeros(k, dtype=np.intp)
+    for i in np.argsort(-regret, kind='stable'):
+        for c in nearest[i]:
+            if load[c] < capacity:
+                break
+        else:
+            c = np.where(load < capacity, d[i], np.inf).argmin()
+        labels[i] = c
+        load[c] += 1
+
+    return labels
+
+def route(start, points):
+
+    '''
+    Orders the stops of a tour from a starting point: nearest neighbor first, then improved with 2-opt moves until no reversal of a segment shortens it
+
+    Parameters
+    ----------
+    start (np.ndarray):
+        The x, y position the tour starts from
+    points (np.ndarray):
+        An (m, 2) array of stop positions
+
+    Returns
+    -------
+    order (int[]):
+        The indices of the stops in visiting order
+    length (float):
+        The length of the tour in meters
+    '''
+
+    nodes = np.vstack((start, points))
+    dist = np.sqrt(squared_distances(nodes, nodes))
+
+    # Nearest neighbor (node 0 is the start)
+    order = [0]
+    left = set(range(1, len(nodes)))
+    while left:
+        nxt = min(left, key=lambda j: dist[order[-1], j])
+        order.append(nxt)
+        left.remove(nxt)
+
+    # 2-opt on the open path: reverse order[i:j+1] if it shortens the tour
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(order) - 1):
+            for j in range(i + 1, len(order)):
+                a, b, c = order[i - 1], order[i], order[j]
+                after = dist[b, order[j + 1]] if j + 1 < len(order) else 0
+                before = dist[c, order[j + 1]] if j + 1 < len(order) else 0
+                if dist[a, c] + after < dist[a, b] + before - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+
+    length = sum(dist[order[i], order[i + 1]] for i in range(len(order) - 1))
+    return [j - 1 for j in order[1:]], length
+
+class DayPlan():
+
+    '''
+    A class to store the tour of a single day.
+
+    Attributes
+    ----------
+    day (int):
+        The day of the tour (1 for the first day)
+    origin (int):
+        The index of the origin the tour starts from
+    activities (Activity[]):
+        The activities in visiting order
+    distance (float):
+        The length of the tour in meters
+    '''
+
+    def __init__(self, day, origin, activities, distance):
+
+        '''
+        Constructs the DayPlan object
+
+        Parameters
+        ----------
+        day (int):
+            The day of the tour (1 for the first day)
+        origin (int):
+            The index of the origin the tour starts from
+        activities (Activity[]):
+            The activities in visiting order
+        distance (float):
+            The length of the tour in meters
+
+        Returns
+        -------
+        None
+        '''
+
+        self.day = day
+        self.origin = origin
+        self.activities = activities
+        self.distance = distance
+
+    def __repr__(self):
+        string = f"Day {self.day} ({len(self.activities)} stops, {self.distance / 1609:.1f} miles)"
+        for a in self.activities:
+            string += f"\n    {a.business.name} ({a.name})"
+        return string
+
+class DayPlanner():
+
+    '''
+    A class to split the activities of a large list into daily tours.
+
+    Attributes
+    ----------
+    origins (str:float{}[]):
+        The latitude and longitude coordinates of the places the tours can start from
+    stops_per_day (int):
+        The most stops in a day
+    seed (int):
+        The seed of the clustering
+    '''
+
+    def __init__(self, origins, stops_per_day=STOPS_PER_DAY, seed=0):
+
+        '''
+        Constructs the DayPlanner object
+
+        Parameters
+        ----------
+        origins (str:float{}[]):
+            The latitude and longitude coordinates of the places the tours can start from
+        stops_per_day (int):
+            The most stops in a day
+        seed (int):
+            The seed of the clustering
+
+        Returns
+        -------
+        None
+        '''
+
+        self.origins = origins
+        self.stops_per_day = stops_per_day
+        self.seed = seed
+
+    def plan(self, activities, days=None):
+
+        '''
+        Clusters the businesses of the activities into days, assigns each day to its closest origin and routes it. Days are ordered by the highest priority activity they contain
+
+        Parameters
+        ----------
+        activities (Activity[]):
+            The activities (those without a business are skipped, businesses without coordinates are placed at the first origin)
+        days (int):
+            The number of days (defaults to as few as stops_per_day allows)
+
+        Returns
+        -------
+        A list of DayPlan objects
+        '''
+
+        visiting = [a for a in activities if a.business is not None]
+        if not visiting:
+            return []
+
+        days = days or math.ceil(len(visiting) / self.stops_per_day)
+        capacity = max(self.stops_per_day, math.ceil(len(visiting) / days))
+
+        # Businesses Yelp returned no coordinates for are routed as if they were at the first origin, as the scheduler does
+        center = self.origins[0]
+        points = project([located(a.business.coordinates, center) for a in visiting], center)
+        origins = project(self.origins, center)
+        labels = kmeans(points, days, capacity, seed=self.seed)
+
+        plans = []
+        for label in np.unique(labels):
+            members = np.flatnonzero(labels == label)
+            cluster = points[members]
+
+            # Start from the origin closest to the middle of the cluster
+            origin = int(squared_distances(cluster.mean(0, keepdims=True), origins)[0].argmin())
+            order, length = route(origins[origin], cluster)
+            plans.append(DayPlan(0, origin, [visiting[members[j]] for j in order], length))
+
+        plans.sort(key=lambda p: min(a.prio for a in p.activities))
+        for day, p in enumerate(plans, 1):
+            p.day = day
+
+        return plans
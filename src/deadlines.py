@@ -0,0 +1,220 @@
+'''
+This program contains the helpers that bound the time a search spends waiting on YelpAPI calls: a tracker of the observed call latencies, and a caller that runs a call within a deadline and sends a hedged duplicate when the first copy is slower than usual.
+
+Hedging follows "The Tail at Scale": once a call has taken longer than the p95 latency observed so far, a second copy is sent and the first answer wins. Only about 1 call in 20 is duplicated, but a slow call no longer holds up the whole search. Calls running on another thread cannot be interrupted, so a call that misses its deadline or loses the race finishes in the background and its answer is dropped.
+'''
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+class DeadlineExceeded(TimeoutError):
+
+    '''
+    Raised when a call or a search does not finish within its deadline
+    '''
+
+class LatencyTracker():
+
+    '''
+    A class to keep the latencies of the most recent calls and compute their percentiles. It is safe to share between threads.
+
+    Attributes
+    ----------
+    window (int):
+        The number of recent latencies kept
+    min_samples (int):
+        The number of latencies needed before percentiles are reported
+    count (int):
+        The number of latencies recorded
+    '''
+
+    def __init__(self, window=200, min_samples=20):
+
+        '''
+        Constructs the LatencyTracker object
+
+        Parameters
+        ----------
+        window (int):
+            The number of recent latencies kept
+        min_samples (int):
+            The number of latencies needed before percentiles are reported
+
+        Returns
+        -------
+        None
+        '''
+
+        self.window = window
+        self.min_samples = min_samples
+        self.count = 0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def samples(self):
+        with self._lock:
+            return list(self._samples)
+
+    def percentile(self, p):
+
+        '''
+        Computes a percentile of the recent latencies (nearest rank)
+
+        Parameters
+        ----------
+        p (float):
+            The percentile, between 0 and 100
+
+        Returns
+        -------
+        The latency in seconds, None if fewer than min_samples latencies were recorded
+        '''
+
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+    def summary(self):
+
+        '''
+        Summarizes the recent latencies, reporting the tail apart from the median
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A dictionary with the number of calls and the p50, p95, p99 and max latencies in seconds (None for too few calls)
+        '''
+
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {'calls': 0, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+
+        rank = lambda p: samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+        return {'calls': self.count, 'p50': rank(50), 'p95': rank(95), 'p99': rank(99), 'max': samples[-1]}
+
+class HedgedCaller():
+
+    '''
+    A class to run calls with a deadline, sending a hedged duplicate of slow calls. It is safe to share between threads.
+
+    Attributes
+    ----------
+    max_workers (int):
+        The most calls running at once
+    hedged (int):
+        The number of calls a duplicate was sent for
+    hedge_wins (int):
+        The number of calls answered by their duplicate
+    '''
+
+    def __init__(self, max_workers=8):
+
+        '''
+        Constructs the HedgedCaller object
+
+        Parameters
+        ----------
+        max_workers (int):
+            The most calls running at once
+
+        Returns
+        -------
+        None
+        '''
+
+        self.max_workers = max_workers
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def call(self, fn, params, timeout=None, hedge_after=None, hedge_fn=None, tracker=None):
+
+        '''
+        Runs a call, waiting at most timeout seconds. If it has not answered after hedge_after seconds, a duplicate is sent and the first answer is returned. A failed copy only fails the call if the other copy fails too
+
+        Parameters
+        ----------
+        fn (callable):
+            The function to call
+        params (dict):
+            The keyword arguments of the call
+        timeout (float):
+            The seconds to wait for an answer (None to wait as long as needed)
+        hedge_after (float):
+            The seconds to wait before sending a duplicate (None to not hedge)
+        hedge_fn (callable):
+            The function the duplicate calls (defaults to fn, e.g., a second client so the two copies do not share a connection)
+        tracker (LatencyTracker):
+            The tracker the latency of the first copy is recorded in, even when it loses the race (None to not record it)
+
+        Returns
+        -------
+        The answer of the call
+        '''
+
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='yelist-hedge')
+
+        start = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        first = self._executor.submit(fn, **params)
+        if tracker is not None:
+            first.add_done_callback(lambda future: tracker.record(time.perf_counter() - start))
+        pending = {first}
+        error = None
+
+        # Wait for the first copy alone until the hedge delay (or the deadline, if it comes first)
+        if hedge_after is not None and (timeout is None or hedge_after < timeout):
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                duplicate = self._executor.submit(hedge_fn or fn, **params)
+                pending.add(duplicate)
+                with self._lock:
+                    self.hedged += 1
+
+        while pending:
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    for straggler in pending:
+                        straggler.cancel()
+                    if future is not first:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = error or future.exception()
+
+        if error is not None and not pending:
+            raise error
+        for straggler in pending:
+            straggler.cancel()
+        raise DeadlineExceeded(f"No answer within {timeout:.2f} s")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
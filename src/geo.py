@@ -0,0 +1,156 @@
+'''
+This program contains the helper functions used to reason about distances and travel times between Yelp businesses based on their latitude and longitude coordinates.
+'''
+
+import math
+
+# Mean radius of the Earth in meters
+EARTH_RADIUS = 6371008.8
+
+# Average travel speed used for travel time estimates (about 25 miles per hour of city driving)
+DEFAULT_SPEED = 11.2
+
+def haversine(origin, destination):
+
+    '''
+    Computes the great-circle distance between two coordinates
+
+    Parameters
+    ----------
+    origin (str:float{}):
+        The latitude and longitude coordinates of the starting point (Yelp "coordinates" format)
+    destination (str:float{}):
+        The latitude and longitude coordinates of the end point (Yelp "coordinates" format)
+
+    Returns
+    -------
+    The distance between the two coordinates in meters
+    '''
+
+    lat1 = math.radians(origin['latitude'])
+    lat2 = math.radians(destination['latitude'])
+    d_lat = lat2 - lat1
+    d_lon = math.radians(destination['longitude'] - origin['longitude'])
+
+    a = math.sin(d_lat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+def travel_minutes(origin, destination, speed=DEFAULT_SPEED):
+
+    '''
+    Estimates the travel time between two coordinates
+
+    Parameters
+    ----------
+    origin (str:float{}):
+        The latitude and longitude coordinates of the starting point
+    destination (str:float{}):
+        The latitude and longitude coordinates of the end point
+    speed (float):
+        The average travel speed in meters per second
+
+    Returns
+    -------
+    The estimated travel time in minutes
+    '''
+
+    return haversine(origin, destination) / speed / 60
+
+# The alphabet of geohash strings
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def geohash(latitude, longitude, precision=5):
+
+    '''
+    Encodes coordinates as a geohash, the name of the tile containing them. Each character splits the tile into 32 smaller ones (precision 5 tiles are about 4.9 by 4.9 km at the equator)
+
+    Parameters
+    ----------
+    latitude (float):
+        The latitude of the point
+    longitude (float):
+        The longitude of the point
+    precision (int):
+        The number of characters of the geohash
+
+    Returns
+    -------
+    The geohash string
+    '''
+
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+
+    # Interleave the longitude and latitude bisections, starting with the longitude
+    while len(chars) < precision:
+        span, point = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if point >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+
+    return ''.join(chars)
+
+def geohash_size(precision):
+
+    '''
+    Computes the size of the geohash tiles of a precision
+
+    Parameters
+    ----------
+    precision (int):
+        The number of characters of the geohash
+
+    Returns
+    -------
+    A tuple of the height (degrees of latitude) and width (degrees of longitude) of a tile
+    '''
+
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+def geohash_cover(center, radius, precision=5):
+
+    '''
+    Lists the geohash tiles overlapping the bounding box of a circle
+
+    Parameters
+    ----------
+    center (str:float{}):
+        The latitude and longitude coordinates of the center of the circle (Yelp "coordinates" format)
+    radius (float):
+        The radius of the circle in meters
+    precision (int):
+        The number of characters of the geohashes
+
+    Returns
+    -------
+    A set of geohash strings
+    '''
+
+    height, width = geohash_size(precision)
+    d_lat = math.degrees(radius / EARTH_RADIUS)
+    d_lon = math.degrees(radius / (EARTH_RADIUS * max(math.cos(math.radians(center['latitude'])), 1e-6)))
+    south = max(center['latitude'] - d_lat, -90.0)
+    north = min(center['latitude'] + d_lat, 90.0)
+    west = center['longitude'] - d_lon
+    east = center['longitude'] + d_lon
+
+    # Step one tile at a time across the box, the last row and column are added explicitly
+    lats = [south + i * height for i in range(int((north - south) / height) + 1)] + [north]
+    lons = [west + i * width for i in range(int((east - west) / width) + 1)] + [east]
+    return {geohash(lat, (lon + 180) % 360 - 180, precision) for lat in lats for lon in lons}
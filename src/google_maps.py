@@ -2,7 +2,6 @@
 This program contains the Map object that stores and manages all attributes and actions needed to search Google Maps for directions.
 '''
 
-import webbrowser
 import urllib.parse
 
 class Map():
@@ -107,10 +106,10 @@ class Map():
 		encoded = urllib.parse.quote_plus(address)
 		return encoded
 
-	def search_directions(self):
+	def directions_url(self):
 
 		'''
-        Puts together a URL string for Google Maps directions and opens the corresponding web page
+        Puts together a URL string for Google Maps directions
 
         Parameters
         ----------
@@ -118,7 +117,7 @@ class Map():
 
         Returns
         -------
-        None
+        The Google Maps directions URL
         '''
 
 		url = 'https://www.google.com/maps/dir/?api=1&origin='
@@ -128,21 +127,39 @@ class Map():
 
 		url += '&destination='
 
-		# If destination has not been specified, set the last waypoint as destination 
-		if self.destination is None:
-			self.destination = self.remove_waypoint(-1)
+		# If destination has not been specified, use the last waypoint as destination (the Map object is left unchanged)
+		waypoints = list(self.waypoints)
+		destination = self.destination
+		if destination is None and waypoints:
+			destination = waypoints.pop()
 
 		# URL encode the destination address
-		url += self.url_encode(self.destination)
+		url += self.url_encode(destination)
 
 		url += '&waypoints='
 
 		# Add each waypoint to the url string
-		for waypoint in self.waypoints:
+		for waypoint in waypoints:
 			url += self.url_encode(waypoint) + '%7C'
 
 		# Turn on navigation/route preview
 		url += '&dir_action=navigate'
 
-		webbrowser.open(url)
-		
\ No newline at end of file
+		return url
+
+	def search_directions(self):
+
+		'''
+        Puts together a URL string for Google Maps directions and opens the corresponding web page. Calls the directions_url() method
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+		import webbrowser
+		webbrowser.open(self.directions_url())
@@ -0,0 +1,683 @@
+'''
+This program builds an offline snapshot of Yelp businesses from recorded YelpAPI responses and searches it like the YelpAPI client, so plans can be made without network access.
+
+A snapshot is a single file: a JSON header, then fixed-size business records, the posting lists of each geohash tile and category, the record numbers sorted by business id and a string table. The file is memory-mapped, so opening even a city-scale snapshot only reads the header. A search only decodes the tiles around the search address and the businesses of the page it returns. Run with:
+
+    python offline.py build snapshot.yelist day.jsonl.gz [more archives or response .json files]
+    python offline.py search snapshot.yelist "San Francisco" coffee [--radius 8000] [--sort rating]
+'''
+
+import argparse
+import json
+import mmap
+import struct
+import threading
+import time
+from array import array
+
+from geo import haversine, geohash, geohash_cover
+
+MAGIC = b'YELIST01'
+
+# Precision 5 tiles are about 4.9 km wide, a 5 mile search reads about 25 of them
+PRECISION = 5
+
+# latitude, longitude, rating, review count, closed flag, then the (offset, length) of the id, name, url, address, category aliases and hours strings
+RECORD = struct.Struct('<ddfIB12I')
+STRINGS = ['id', 'name', 'url', 'address', 'aliases', 'hours']
+
+# The best_match order Yelp uses is not documented, it is approximated by the rating smoothed towards 3.5 stars over the first 10 reviews
+PRIOR_RATING = 3.5
+PRIOR_REVIEWS = 10
+
+class OfflineError(Exception):
+
+    '''
+    Raised when a search cannot be answered from the snapshot (e.g., the search address was never recorded)
+    '''
+
+def normalize_location(location):
+    return ' '.join(location.lower().split())
+
+class SnapshotBuilder():
+
+    '''
+    A class to collect the businesses of recorded YelpAPI responses and write them to a snapshot file.
+
+    Attributes
+    ----------
+    precision (int):
+        The geohash precision of the tiles
+    businesses (str:dict{}):
+        A dictionary containing business id, Yelp-shaped business dictionary pairs (the latest response wins)
+    aliases (str:set{}):
+        A dictionary containing business id, category aliases pairs
+    hours (str:list{}):
+        A dictionary containing business id, Yelp "hours" pairs from recorded business_query() calls
+    locations (str:float[]{}):
+        A dictionary containing normalized search address, [latitude, longitude] pairs of the recorded search centers
+    titles (str:str{}):
+        A dictionary containing category alias, category title pairs
+    '''
+
+    def __init__(self, precision=PRECISION):
+
+        '''
+        Constructs the SnapshotBuilder object
+
+        Parameters
+        ----------
+        precision (int):
+            The geohash precision of the tiles
+
+        Returns
+        -------
+        None
+        '''
+
+        self.precision = precision
+        self.businesses = {}
+        self.aliases = {}
+        self.hours = {}
+        self.locations = {}
+        self.titles = {}
+
+    def add_search(self, params, response):
+
+        '''
+        Adds the businesses of a search response
+
+        Parameters
+        ----------
+        params (dict):
+            The parameters of the search_query() call
+        response (dict):
+            The decoded search response
+
+        Returns
+        -------
+        None
+        '''
+
+        center = response.get('region', {}).get('center')
+        if params.get('location') and center:
+            self.locations[normalize_location(params['location'])] = [center['latitude'], center['longitude']]
+
+        searched = (params.get('categories') or '').split(',')
+        for b in response.get('businesses', []):
+            coordinates = b.get('coordinates') or {}
+            if coordinates.get('latitude') is None or coordinates.get('longitude') is None:
+                continue
+            self.businesses[b['id']] = b
+            aliases = self.aliases.setdefault(b['id'], set())
+            for c in b.get('categories', []):
+                aliases.add(c['alias'])
+                self.titles[c['alias']] = c['title']
+
+            # Without its categories, a business is filed under the single category it was searched for
+            if not b.get('categories') and len(searched) == 1 and searched[0]:
+                aliases.add(searched[0])
+
+    def add_details(self, params, response):
+
+        '''
+        Adds the opening hours of a business details response
+
+        Parameters
+        ----------
+        params (dict):
+            The parameters of the business_query() call
+        response (dict):
+            The decoded business details
+
+        Returns
+        -------
+        None
+        '''
+
+        if response.get('hours'):
+            self.hours[params.get('id', response.get('id'))] = response['hours']
+
+    def add_archive(self, path):
+
+        '''
+        Adds the responses of a record/replay archive (see replay.py)
+
+        Parameters
+        ----------
+        path (str):
+            The archive file
+
+        Returns
+        -------
+        The number of calls read
+        '''
+
+        from replay import load_archive
+
+        calls = load_archive(path)
+        for call in calls:
+            if call['method'] == 'search_query':
+                self.add_search(call['params'], json.loads(call['body']))
+            elif call['method'] == 'business_query':
+                self.add_details(call['params'], json.loads(call['body']))
+        return len(calls)
+
+    def add_file(self, path):
+
+        '''
+        Adds a record/replay archive (.gz) or a JSON file holding a search response or a list of them
+
+        Parameters
+        ----------
+        path (str):
+            The file to read
+
+        Returns
+        -------
+        The number of responses read
+        '''
+
+        if path.endswith('.gz'):
+            return self.add_archive(path)
+
+        with open(path) as file:
+            responses = json.load(file)
+        if isinstance(responses, dict):
+            responses = [responses]
+        for response in responses:
+            self.add_search({}, response)
+        return len(responses)
+
+    def write(self, path):
+
+        '''
+        Writes the snapshot file
+
+        Parameters
+        ----------
+        path (str):
+            The snapshot file
+
+        Returns
+        -------
+        The number of businesses written
+        '''
+
+        strings = bytearray()
+        offsets = {}
+
+        def intern(text):
+            # Repeated strings (city lines, category lists) are stored once
+            if text not in offsets:
+                data = text.encode()
+                offsets[text] = (len(strings), len(data))
+                strings.extend(data)
+            return offsets[text]
+
+        records = bytearray()
+        ids = list(self.businesses)
+        tiles = {}
+        for n, business_id in enumerate(ids):
+            b = self.businesses[business_id]
+            coordinates = b['coordinates']
+            fields = [business_id, b.get('name', ''), b.get('url', ''), '\n'.join(b.get('location', {}).get('display_address', [])), ','.join(sorted(self.aliases[business_id])), json.dumps(self.hours[business_id]) if business_id in self.hours else '']
+            refs = [value for text in fields for value in intern(text)]
+            records += RECORD.pack(coordinates['latitude'], coordinates['longitude'], b.get('rating', 0), b.get('review_count', 0), bool(b.get('is_closed')), *refs)
+
+            tile = tiles.setdefault(geohash(coordinates['latitude'], coordinates['longitude'], self.precision), {})
+            for alias in self.aliases[business_id]:
+                tile.setdefault(alias, []).append(n)
+
+        # Posting lists, as [start, count] slices of one array of record numbers
+        postings = array('I')
+        index = {}
+        for name in sorted(tiles):
+            index[name] = {}
+            for alias in sorted(tiles[name]):
+                index[name][alias] = [len(postings), len(tiles[name][alias])]
+                postings.extend(tiles[name][alias])
+
+        # Record numbers sorted by business id, for business_query() lookups
+        by_id = array('I', sorted(range(len(ids)), key=lambda n: ids[n].encode()))
+
+        header = {'precision': self.precision, 'records': len(ids), 'postings': len(postings), 'built': time.time(), 'tiles': index, 'locations': self.locations, 'titles': self.titles}
+        sections = [('records', bytes(records)), ('postings', postings.tobytes()), ('by_id', by_id.tobytes()), ('strings', bytes(strings))]
+
+        # The header stores the offset of every section, which depends on the header length itself
+        start = 0
+        while True:
+            header['sections'] = {}
+            offset = start
+            for name, data in sections:
+                offset += -offset % 8
+                header['sections'][name] = offset
+                offset += len(data)
+            encoded = json.dumps(header, separators=(',', ':')).encode()
+            needed = len(MAGIC) + 4 + len(encoded)
+            if needed <= start:
+                break
+            start = needed
+
+        with open(path, 'wb') as file:
+            file.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+            for name, data in sections:
+                file.write(b'\0' * (header['sections'][name] - file.tell()))
+                file.write(data)
+
+        return len(ids)
+
+class Snapshot():
+
+    '''
+    A class to read a memory-mapped snapshot file. It is safe to share between threads.
+
+    Attributes
+    ----------
+    path (str):
+        The snapshot file
+    precision (int):
+        The geohash precision of the tiles
+    records (int):
+        The number of businesses
+    built (float):
+        The time the snapshot was built (seconds since the epoch)
+    tiles (str:dict{}):
+        A dictionary containing geohash, {category alias: [start, count]} pairs locating the posting lists
+    locations (str:float[]{}):
+        A dictionary containing normalized search address, [latitude, longitude] pairs
+    titles (str:str{}):
+        A dictionary containing category alias, category title pairs
+    '''
+
+    def __init__(self, path):
+
+        '''
+        Constructs the Snapshot object. Only the header is read, the rest of the file is paged in by the searches
+
+        Parameters
+        ----------
+        path (str):
+            The snapshot file
+
+        Returns
+        -------
+        None
+        '''
+
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise OfflineError(f"{path} is not a Yelist snapshot")
+        length, = struct.unpack_from('<I', self._map, len(MAGIC))
+        header = json.loads(self._map[len(MAGIC) + 4:len(MAGIC) + 4 + length])
+
+        self.precision = header['precision']
+        self.records = header['records']
+        self.built = header['built']
+        self.tiles = header['tiles']
+        self.locations = header['locations']
+        self.titles = header['titles']
+
+        sections = header['sections']
+        view = memoryview(self._map)
+        self._records = sections['records']
+        self._postings = view[sections['postings']:sections['postings'] + 4 * header['postings']].cast('I')
+        self._by_id = view[sections['by_id']:sections['by_id'] + 4 * self.records].cast('I')
+        self._strings = sections['strings']
+
+    def __repr__(self):
+        return f"Snapshot of {self.records} businesses in {len(self.tiles)} tiles"
+
+    def __len__(self):
+        return self.records
+
+    def locate(self, location):
+
+        '''
+        Finds the coordinates of a search address recorded in the snapshot
+
+        Parameters
+        ----------
+        location (str):
+            The search address
+
+        Returns
+        -------
+        The latitude and longitude coordinates (Yelp "coordinates" format), None if the address was never recorded
+        '''
+
+        center = self.locations.get(normalize_location(location))
+        if center is None:
+            return None
+        return {'latitude': center[0], 'longitude': center[1]}
+
+    def postings(self, tile, alias):
+
+        '''
+        Returns the record numbers of the businesses of a category in a tile
+
+        Parameters
+        ----------
+        tile (str):
+            The geohash of the tile
+        alias (str):
+            The category alias
+
+        Returns
+        -------
+        A memoryview of record numbers (empty if there are none)
+        '''
+
+        start, count = self.tiles.get(tile, {}).get(alias, (0, 0))
+        return self._postings[start:start + count]
+
+    def values(self, n):
+
+        '''
+        Decodes the numeric fields of a record
+
+        Parameters
+        ----------
+        n (int):
+            The record number
+
+        Returns
+        -------
+        A tuple of latitude, longitude, rating, review count and closed flag
+        '''
+
+        return RECORD.unpack_from(self._map, self._records + n * RECORD.size)[:5]
+
+    def string(self, n, field):
+
+        '''
+        Decodes a string field of a record
+
+        Parameters
+        ----------
+        n (int):
+            The record number
+        field (str):
+            The name of the field (one of STRINGS)
+
+        Returns
+        -------
+        The string
+        '''
+
+        refs = RECORD.unpack_from(self._map, self._records + n * RECORD.size)[5:]
+        i = STRINGS.index(field)
+        offset = self._strings + refs[2 * i]
+        return self._map[offset:offset + refs[2 * i + 1]].decode()
+
+    def find(self, business_id):
+
+        '''
+        Finds the record of a business by binary search over the record numbers sorted by id
+
+        Parameters
+        ----------
+        business_id (str):
+            The Yelp business id
+
+        Returns
+        -------
+        The record number, None if the business is not in the snapshot
+        '''
+
+        target = business_id.encode()
+        low, high = 0, self.records
+        while low < high:
+            mid = (low + high) // 2
+            if self.string(self._by_id[mid], 'id').encode() < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.records and self.string(self._by_id[low], 'id') == business_id:
+            return self._by_id[low]
+        return None
+
+    def business(self, n, distance=None):
+
+        '''
+        Decodes a record into a Yelp-shaped business dictionary
+
+        Parameters
+        ----------
+        n (int):
+            The record number
+        distance (float):
+            The distance from the search address in meters (None to leave it out)
+
+        Returns
+        -------
+        A Yelp-shaped business dictionary
+        '''
+
+        latitude, longitude, rating, review_count, is_closed = self.values(n)
+        aliases = self.string(n, 'aliases')
+        business = {
+            'id': self.string(n, 'id'),
+            'name': self.string(n, 'name'),
+            'url': self.string(n, 'url'),
+            'rating': rating,
+            'review_count': review_count,
+            'is_closed': bool(is_closed),
+            'categories': [{'alias': alias, 'title': self.titles.get(alias, alias)} for alias in aliases.split(',') if alias],
+            'coordinates': {'latitude': latitude, 'longitude': longitude},
+            'location': {'display_address': self.string(n, 'address').split('\n')},
+        }
+        if distance is not None:
+            business['distance'] = distance
+        return business
+
+    def close(self):
+        self._postings.release()
+        self._by_id.release()
+        self._map.close()
+
+class OfflineClient():
+
+    '''
+    A class with the same search_query() and business_query() methods as the YelpAPI client, answered from a Snapshot. Searches cover the categories under the searched ones when a category tree is given, like Yelp does.
+
+    Attributes
+    ----------
+    snapshot (Snapshot):
+        The snapshot searched
+    cat_tree (CategoryTree):
+        The category tree used to match sub-categories (None to only match the searched aliases)
+    calls (int):
+        The number of calls made
+    '''
+
+    def __init__(self, snapshot, cat_tree=None):
+
+        '''
+        Constructs the OfflineClient object
+
+        Parameters
+        ----------
+        snapshot (Snapshot OR str):
+            The snapshot (or snapshot file) to search
+        cat_tree (CategoryTree):
+            The category tree used to match sub-categories (None to only match the searched aliases)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.snapshot = snapshot if isinstance(snapshot, Snapshot) else Snapshot(snapshot)
+        self.cat_tree = cat_tree
+        self.calls = 0
+        self._matching = {}
+        self._lock = threading.Lock()
+
+    def matching(self, categories):
+
+        '''
+        Lists the category aliases of the snapshot that fall under the searched categories. The list is computed once per search string
+
+        Parameters
+        ----------
+        categories (str):
+            A comma-separated list of category aliases
+
+        Returns
+        -------
+        A set of category aliases
+        '''
+
+        if categories not in self._matching:
+            searched = set(filter(None, categories.split(',')))
+            if self.cat_tree is None or not searched:
+                found = searched
+            else:
+                found = {alias for alias in self.snapshot.titles if any(self.cat_tree.is_descendant(alias, parent) for parent in searched)} | searched
+            self._matching[categories] = found
+        return self._matching[categories]
+
+    def search_query(self, location='', categories='', radius=40000, sort_by='best_match', limit=20, offset=0, latitude=None, longitude=None, **kwargs):
+
+        '''
+        Searches the snapshot like the YelpAPI search_query() method
+
+        Parameters
+        ----------
+        location (str):
+            The search address (must have been searched while the snapshot was recorded)
+        categories (str):
+            A comma-separated list of category aliases (empty for every category)
+        radius (int):
+            The search radius in meters
+        sort_by (str):
+            The sort type (review_count, rating, distance or best_match)
+        limit (int):
+            The maximum number of businesses returned
+        offset (int):
+            The number of businesses to skip
+        latitude (float):
+            The latitude of the search center (instead of the location)
+        longitude (float):
+            The longitude of the search center (instead of the location)
+
+        Returns
+        -------
+        A Yelp-shaped search response dictionary
+        '''
+
+        with self._lock:
+            self.calls += 1
+
+        if latitude is not None and longitude is not None:
+            center = {'latitude': latitude, 'longitude': longitude}
+        else:
+            center = self.snapshot.locate(location)
+            if center is None:
+                raise OfflineError(f"The snapshot has no businesses around {location!r}, it was not searched while recording")
+
+        radius = radius or 40000
+        aliases = self.matching(categories) if categories else None
+        snapshot = self.snapshot
+
+        # Collect the businesses of the matching categories in the tiles around the center, and keep those within the radius
+        found = {}
+        for tile in geohash_cover(center, radius, snapshot.precision):
+            if tile not in snapshot.tiles:
+                continue
+            for alias in (aliases if aliases is not None else snapshot.tiles[tile]):
+                for n in snapshot.postings(tile, alias):
+                    if n in found:
+                        continue
+                    lat, lon, rating, review_count, _ = snapshot.values(n)
+                    distance = haversine(center, {'latitude': lat, 'longitude': lon})
+                    if distance <= radius:
+                        found[n] = (rating, review_count, distance)
+
+        # Same orders as the YelpAPI (ties broken by distance, then record number so pages are stable)
+        if sort_by == 'distance':
+            key = lambda n: (found[n][2], n)
+        elif sort_by == 'rating':
+            key = lambda n: (-found[n][0], found[n][2], n)
+        elif sort_by == 'review_count':
+            key = lambda n: (-found[n][1], found[n][2], n)
+        else:
+            key = lambda n: (-(found[n][0] * found[n][1] + PRIOR_RATING * PRIOR_REVIEWS) / (found[n][1] + PRIOR_REVIEWS), found[n][2], n)
+        ranked = sorted(found, key=key)
+
+        businesses = [snapshot.business(n, found[n][2]) for n in ranked[offset:offset + limit]]
+        return {'businesses': businesses, 'total': len(ranked), 'region': {'center': center}}
+
+    def business_query(self, id, **kwargs):
+
+        '''
+        Returns the details of a business like the YelpAPI business_query() method. The hours are only known for the businesses looked up while recording
+
+        Parameters
+        ----------
+        id (str):
+            The business id
+
+        Returns
+        -------
+        A Yelp-shaped business details dictionary
+        '''
+
+        with self._lock:
+            self.calls += 1
+
+        n = self.snapshot.find(id)
+        if n is None:
+            raise OfflineError(f"Business {id} is not in the snapshot")
+        details = self.snapshot.business(n)
+        hours = self.snapshot.string(n, 'hours')
+        if hours:
+            details['hours'] = json.loads(hours)
+        return details
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and search an offline snapshot of Yelp businesses")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build a snapshot from record/replay archives or search response JSON files")
+    build.add_argument('snapshot', help="the snapshot file to write")
+    build.add_argument('sources', nargs='+', help="archives (.jsonl.gz, see replay.py) or JSON files of search responses")
+    build.add_argument('--precision', type=int, default=PRECISION, help=f"geohash precision of the tiles (default: {PRECISION})")
+    search = commands.add_parser('search', help="search a snapshot")
+    search.add_argument('snapshot', help="the snapshot file")
+    search.add_argument('location', help="the search address")
+    search.add_argument('categories', help="comma-separated category aliases")
+    search.add_argument('--radius', type=int, default=16090, help="search radius in meters (default: 16090)")
+    search.add_argument('--sort', default='best_match', choices=['best_match', 'rating', 'review_count', 'distance'])
+    search.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        builder = SnapshotBuilder(args.precision)
+        for source in args.sources:
+            print(f"{source}: {builder.add_file(source)} responses")
+        start = time.perf_counter()
+        count = builder.write(args.snapshot)
+        print(f"Wrote {count} businesses in {len(builder.locations)} recorded locations to {args.snapshot} in {time.perf_counter() - start:.2f} s")
+    else:
+        start = time.perf_counter()
+        snapshot = Snapshot(args.snapshot)
+        opened = time.perf_counter()
+
+        # Match sub-categories when the category file is at hand
+        try:
+            from yelp_categories import CategoryTree
+            with open("categories.json") as file:
+                cat_tree = CategoryTree(json.load(file))
+        except OSError:
+            cat_tree = None
+
+        searched = time.perf_counter()
+        response = OfflineClient(snapshot, cat_tree).search_query(location=args.location, categories=args.categories, radius=args.radius, sort_by=args.sort, limit=args.limit)
+        done = time.perf_counter()
+        print(f"{snapshot}, opened in {(opened - start) * 1000:.1f} ms, searched in {(done - searched) * 1000:.1f} ms: {response['total']} results")
+        for b in response['businesses']:
+            print(f"{b['rating']:>4} {b['review_count']:>6} {b['distance'] / 1609:6.2f} mi  {b['name']}")
@@ -0,0 +1,418 @@
+'''
+This program contains the output pipeline that delivers the final plan to its outputs (sinks): the plan table, the Google Maps directions and an optional file export.
+
+Every sink runs on its own background thread and is fed the same PlanOutput, so a slow sink (e.g., a web browser that takes seconds to start on a headless machine) never holds up the other sinks. When the program exits, the pipeline waits a bounded time for the sinks that can be given up on (the map prints its links instead), and as long as needed for those that must finish (the export file).
+'''
+
+import contextlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from google_maps import Map
+from result_cache import format_age
+
+# Serializes the writes of the sinks to the terminal
+_print_lock = threading.Lock()
+
+def write(stream, text):
+
+    '''
+    Writes text to a stream without interleaving it with the output of other sinks
+
+    Parameters
+    ----------
+    stream (file):
+        The stream to write to
+    text (str):
+        The text to write
+
+    Returns
+    -------
+    None
+    '''
+
+    with _print_lock:
+        stream.write(text)
+        stream.flush()
+
+class PlanOutput():
+
+    '''
+    A class to store a snapshot of the final plan given to the sinks.
+
+    Attributes
+    ----------
+    address (str):
+        The search address
+    tours ((int, Activity[])[]):
+        The tours of the plan as (day, activities in visiting order) pairs (day 0 for a single tour)
+    value_title (str):
+        The title of the column showing the value the results were sorted by
+    rows ((int, str[][])[]):
+        The rows of the results table of each tour, as (day, rows) pairs
+    '''
+
+    def __init__(self, address, activities, days=None, value=None):
+
+        '''
+        Constructs the PlanOutput object
+
+        Parameters
+        ----------
+        address (str):
+            The search address
+        activities (Activity[]):
+            The activities in visiting order (used if there are no daily tours)
+        days (DayPlan[]):
+            The daily tours of the plan (None for a single tour)
+        value ((str, callable)):
+            The title of the sorted-by column and the function formatting its value for a business (None for no such column)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.address = address
+        if days is not None:
+            self.tours = [(day.day, [a for a in day.activities if a.business is not None]) for day in days]
+        else:
+            self.tours = [(0, [a for a in activities if a.business is not None])]
+
+        # The table is rendered from a snapshot, the activities can change while a sink runs
+        self.value_title = value[0] if value is not None else None
+        self.rows = []
+        for day, activities in self.tours:
+            rows = []
+            for a in activities:
+                row = [a.name, a.business.name, a.category.title, ', '.join(a.business.location), format_age(a.business.fetched_at)]
+                if value is not None:
+                    row.insert(3, str(value[1](a.business)))
+                rows.append(row)
+            self.rows.append((day, rows))
+
+    def maps(self):
+
+        '''
+        Creates the Google Maps directions of every tour
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A list of (day, Map) pairs, for the tours with at least one stop
+        '''
+
+        maps = []
+        for day, activities in self.tours:
+            directions = Map(self.address, [])
+
+            # Activities sharing a business only need one stop
+            stops = set()
+            for a in activities:
+                if id(a.business) not in stops:
+                    stops.add(id(a.business))
+                    directions.add_waypoint(a.business.name + ', ' + ', '.join(a.business.location))
+
+            if directions.waypoints:
+                maps.append((day, directions))
+        return maps
+
+    def to_dict(self):
+
+        '''
+        Converts the plan to a JSON-serializable dictionary
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A dictionary with the search address and the tours of the plan
+        '''
+
+        tours = []
+        for day, activities in self.tours:
+            stops = [{'activity': a.name, 'category': a.category.alias, 'business': a.business.name, 'id': a.business.business_id, 'rating': a.business.rating, 'review_count': a.business.num_reviews, 'url': a.business.url, 'address': ', '.join(a.business.location), 'coordinates': a.business.coordinates} for a in activities]
+            tours.append({'day': day, 'stops': stops})
+        return {'address': self.address, 'tours': tours}
+
+def format_table(rows, value_title=None):
+
+    '''
+    Formats the results table: activity, business, category, the sorted-by value (right-aligned), address and age of the results
+
+    Parameters
+    ----------
+    rows (str[][]):
+        The rows of the table
+    value_title (str):
+        The title of the sorted-by column (None if the rows have no such column)
+
+    Returns
+    -------
+    The table string
+    '''
+
+    titles = ["Activity", "Business Name", "Business Category", "Address", "Updated"]
+    if value_title is not None:
+        titles.insert(3, value_title)
+    widths = [max(len(cell) for cell in column) for column in zip(titles, *rows)]
+
+    table = '|' + '|'.join(title.center(width + 4) for title, width in zip(titles, widths)) + '|\n'
+    table += '-' * (sum(widths) + 5 * len(widths) + 1) + '\n'
+    for row in rows:
+        cells = []
+        for i, (cell, width) in enumerate(zip(row, widths)):
+            if value_title is not None and i == 3:
+                cells.append(cell.rjust(width + 3) + ' ')
+            else:
+                cells.append(' ' + cell.ljust(width + 3))
+        table += '|' + '|'.join(cells) + '|\n'
+    return table
+
+class Sink():
+
+    '''
+    The base class of the output sinks. A sink writes a PlanOutput somewhere (see write()).
+
+    Attributes
+    ----------
+    name (str):
+        The name of the sink
+    must_finish (bool):
+        Whether the program waits for the sink however long it takes (otherwise it is given up on after a few seconds)
+    '''
+
+    name = 'sink'
+    must_finish = False
+
+    def write(self, plan):
+        raise NotImplementedError
+
+    def fallback(self, plan):
+
+        '''
+        Called on the main thread when the sink is given up on, to deliver what it can of the plan
+
+        Parameters
+        ----------
+        plan (PlanOutput):
+            The plan the sink did not finish writing
+
+        Returns
+        -------
+        None
+        '''
+
+class TableSink(Sink):
+
+    '''
+    A sink printing the results table of the plan, one table per tour.
+
+    Attributes
+    ----------
+    title (str):
+        The line printed above the tables
+    stream (file):
+        The stream the table is written to
+    '''
+
+    name = 'table'
+
+    def __init__(self, title='Your plan:', stream=None):
+        self.title = title
+        self.stream = stream if stream is not None else sys.stdout
+
+    def write(self, plan):
+        text = self.title + '\n\n'
+        for day, rows in plan.rows:
+            if day:
+                text += f'Day {day}:\n'
+            text += format_table(rows, plan.value_title) + '\n'
+        write(self.stream, text)
+
+class MapSink(Sink):
+
+    '''
+    A sink creating the Google Maps directions of the plan and opening them in a web browser (or printing the links in no-browser mode).
+
+    Attributes
+    ----------
+    open_browser (bool):
+        Whether the directions of a single tour are opened in a web browser (daily tours are always printed, so a long trip does not open a tab per day)
+    stream (file):
+        The stream the links are written to
+    '''
+
+    name = 'map'
+
+    def __init__(self, open_browser=True, stream=None):
+        self.open_browser = open_browser
+        self.stream = stream if stream is not None else sys.stdout
+
+    def write(self, plan):
+        maps = plan.maps()
+        for day, directions in maps:
+            url = directions.directions_url()
+            if self.open_browser and len(maps) == 1:
+                import webbrowser
+                webbrowser.open(url)
+            else:
+                write(self.stream, f"\n{f'Day {day} directions' if day else 'Directions'}:\n{url}\n")
+
+    def fallback(self, plan):
+
+        # The browser did not open in time, so the links are printed instead
+        for day, directions in plan.maps():
+            write(self.stream, f"\n{f'Day {day} directions' if day else 'Directions'}:\n{directions.directions_url()}\n")
+
+class FileSink(Sink):
+
+    '''
+    A sink exporting the plan to a JSON file. The plan is written to a temporary file that then replaces the export, so the export is never left half-written.
+
+    Attributes
+    ----------
+    path (str):
+        The file the plan is written to
+    '''
+
+    name = 'file'
+    must_finish = True
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, plan):
+        temporary = self.path + '.part'
+        try:
+            with open(temporary, 'w') as export_file:
+                json.dump(plan.to_dict(), export_file, indent=4)
+            os.replace(temporary, self.path)
+        except BaseException:
+            # The temporary file does not exist if it could not be created
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporary)
+            raise
+
+class OutputPipeline():
+
+    '''
+    A class to feed the final plan to independent sinks, each running on its own thread. Only the threads of the sinks that must finish keep the program alive.
+
+    Attributes
+    ----------
+    sinks (Sink[]):
+        The sinks of the pipeline
+    errors (str:Exception{}):
+        A dictionary containing the name of the sinks that failed and their error
+    '''
+
+    def __init__(self, sinks):
+
+        '''
+        Constructs the OutputPipeline object and starts a thread per sink
+
+        Parameters
+        ----------
+        sinks (Sink[]):
+            The sinks of the pipeline
+
+        Returns
+        -------
+        None
+        '''
+
+        self.sinks = sinks
+        self.errors = {}
+        self._last = None
+        self._queues = []
+        self._threads = []
+        for sink in sinks:
+            sink_queue = queue.Queue()
+            thread = threading.Thread(target=self.run, args=(sink, sink_queue), name=f'yelist-output-{sink.name}', daemon=not sink.must_finish)
+            thread.start()
+            self._queues.append(sink_queue)
+            self._threads.append(thread)
+
+    def run(self, sink, sink_queue):
+
+        '''
+        Writes every plan published to a sink until the pipeline is closed (runs on the thread of the sink)
+
+        Parameters
+        ----------
+        sink (Sink):
+            The sink
+        sink_queue (queue.Queue):
+            The plans published to the sink (None when the pipeline is closed)
+
+        Returns
+        -------
+        None
+        '''
+
+        while True:
+            plan = sink_queue.get()
+            if plan is None:
+                return
+            try:
+                sink.write(plan)
+            except Exception as error:
+                self.errors[sink.name] = error
+
+    def publish(self, plan):
+
+        '''
+        Gives a plan to every sink, without waiting for them
+
+        Parameters
+        ----------
+        plan (PlanOutput):
+            The plan
+
+        Returns
+        -------
+        None
+        '''
+
+        self._last = plan
+        for sink_queue in self._queues:
+            sink_queue.put(plan)
+
+    def close(self, timeout=5.0):
+
+        '''
+        Waits for the sinks to write the published plans: as long as needed for the sinks that must finish, and up to a timeout for the others. The sinks still running afterwards are given up on, and their fallback() is called with the last plan, as it is for the sinks that failed
+
+        Parameters
+        ----------
+        timeout (float):
+            The longest time to wait for the sinks that can be given up on, in seconds
+
+        Returns
+        -------
+        A list of the names of the sinks that did not finish (failed sinks are listed in errors)
+        '''
+
+        for sink_queue in self._queues:
+            sink_queue.put(None)
+
+        deadline = time.monotonic() + timeout
+        for sink, thread in zip(self.sinks, self._threads):
+            thread.join(None if sink.must_finish else max(deadline - time.monotonic(), 0))
+
+        unfinished = [sink for sink, thread in zip(self.sinks, self._threads) if thread.is_alive()]
+        if self._last is not None:
+            for sink in self.sinks:
+                if sink in unfinished or sink.name in self.errors:
+                    sink.fallback(self._last)
+        return [sink.name for sink in unfinished]
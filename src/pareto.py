@@ -0,0 +1,224 @@
+'''
+This program contains the helpers that compute Pareto fronts (skylines) of the Yelp search results, so the trade-offs between rating, number of reviews and distance can be explored instead of picking a single sort order.
+
+A business is on the front of its category when no other candidate is at least as good on every objective and better on one. The fronts are computed with Sort-Filter-Skyline: the candidates are sorted so that no candidate can be dominated by one sorted after it, and a single scan compares each candidate only with the front found so far. Whole itineraries (one business per category, visited in order from the search address) are traded off on total distance against average rating with a layered search that keeps, for each business, only the routes reaching it that are not beaten on both objectives.
+'''
+
+import math
+
+from geo import haversine
+
+def dominates(first, second):
+
+    '''
+    Checks if a vector of objectives dominates another (every objective is maximized)
+
+    Parameters
+    ----------
+    first (float[]):
+        The objectives of the first candidate
+    second (float[]):
+        The objectives of the second candidate
+
+    Returns
+    -------
+    Boolean value
+    '''
+
+    better = False
+    for a, b in zip(first, second):
+        if a < b:
+            return False
+        if a > b:
+            better = True
+    return better
+
+def skyline(items, key):
+
+    '''
+    Computes the Pareto front of a list of items with Sort-Filter-Skyline. Items with the same objectives are all kept
+
+    Parameters
+    ----------
+    items (object[]):
+        The items
+    key (callable):
+        Returns the objectives of an item as a tuple, every objective being maximized
+
+    Returns
+    -------
+    The items on the front, best first in the lexicographic order of their objectives
+    '''
+
+    # Sorted in descending lexicographic order, an item can only be dominated by an item before it
+    scored = sorted(((key(item), item) for item in items), key=lambda pair: pair[0], reverse=True)
+
+    front = []
+    for objectives, item in scored:
+        if not any(dominates(kept, objectives) for kept, _ in front):
+            front.append((objectives, item))
+    return [item for _, item in front]
+
+def business_objectives(business):
+
+    '''
+    The objectives a business is compared on: its rating, its number of reviews and its closeness to the search address
+
+    Parameters
+    ----------
+    business (YelpBusiness):
+        The business
+
+    Returns
+    -------
+    A tuple of the rating, the number of reviews and the negated distance (an unknown distance counts as the farthest)
+    '''
+
+    distance = business.distance if business.distance is not None else math.inf
+    return (business.rating or 0, business.num_reviews or 0, -distance)
+
+def business_front(businesses):
+
+    '''
+    Computes the Pareto front of a category's candidates across rating, number of reviews and distance
+
+    Parameters
+    ----------
+    businesses (YelpBusiness[]):
+        The candidates
+
+    Returns
+    -------
+    The candidates on the front, highest rated first
+    '''
+
+    return skyline(businesses, business_objectives)
+
+class Itinerary():
+
+    '''
+    A class to store one business per category, visited in order.
+
+    Attributes
+    ----------
+    businesses (YelpBusiness[]):
+        The businesses, in the order they are visited
+    distance (float):
+        The total distance travelled from the search address in meters
+    rating (float):
+        The average rating of the businesses
+    '''
+
+    def __init__(self, businesses, distance):
+
+        '''
+        Constructs the Itinerary object
+
+        Parameters
+        ----------
+        businesses (YelpBusiness[]):
+            The businesses, in the order they are visited
+        distance (float):
+            The total distance travelled from the search address in meters
+
+        Returns
+        -------
+        None
+        '''
+
+        self.businesses = businesses
+        self.distance = distance
+        self.rating = sum(b.rating for b in businesses) / len(businesses)
+
+    def __repr__(self):
+        return f"Itinerary({self.distance:.0f} m, rating {self.rating:.2f}, {[b.name for b in self.businesses]})"
+
+def itinerary_front(origin, layers):
+
+    '''
+    Computes the Pareto front of the itineraries visiting one business of each layer in order, trading off the total distance against the average rating.
+    Each business keeps a label per reachable rating total (in tenths of a star) with the shortest route reaching it, and labels beaten on both objectives by another label of the same business are dropped
+
+    Parameters
+    ----------
+    origin (str:float{}):
+        The coordinates of the search address (None to measure the first leg with the distance Yelp returned)
+    layers (YelpBusiness[][]):
+        The candidates of each category, in the order they are visited. Businesses without coordinates are skipped
+
+    Returns
+    -------
+    The itineraries on the front, shortest first
+    '''
+
+    layers = [[b for b in layer if b.coordinates and b.rating is not None] for layer in layers]
+    if not layers or not all(layers):
+        return []
+
+    # labels[i][j] maps a rating total to (distance, business index in the previous layer, rating total there)
+    labels = []
+    previous = None
+    for i, layer in enumerate(layers):
+        current = []
+        for business in layer:
+            rating = round(business.rating * 10)
+            best = {}
+
+            # The first leg starts at the search address
+            if previous is None:
+                if origin is not None:
+                    best[rating] = (haversine(origin, business.coordinates), None, None)
+                elif business.distance is not None:
+                    best[rating] = (business.distance, None, None)
+
+            else:
+                for k, (before, options) in enumerate(zip(layers[i - 1], previous)):
+                    if before.business_id is not None and before.business_id == business.business_id:
+                        continue
+                    leg = haversine(before.coordinates, business.coordinates)
+                    for total, (distance, _, _) in options.items():
+                        candidate = distance + leg
+                        if total + rating not in best or candidate < best[total + rating][0]:
+                            best[total + rating] = (candidate, k, total)
+
+            current.append(prune(best))
+        labels.append(current)
+        previous = current
+
+    # The front of the last layer's labels, each traced back to its businesses
+    ends = [(total, distance, j) for j, options in enumerate(previous) for total, (distance, _, _) in options.items()]
+    front = []
+    shortest = math.inf
+    for total, distance, j in sorted(ends, key=lambda end: (-end[0], end[1])):
+        if distance < shortest:
+            shortest = distance
+            businesses = []
+            for i in range(len(layers) - 1, -1, -1):
+                businesses.append(layers[i][j])
+                _, j, total = labels[i][j][total]
+            front.append(Itinerary(businesses[::-1], shortest))
+
+    return front[::-1]
+
+def prune(labels):
+
+    '''
+    Drops the labels that are beaten on both rating total and distance by another label
+
+    Parameters
+    ----------
+    labels (int:tuple{}):
+        The labels of a business, keyed by rating total
+
+    Returns
+    -------
+    The labels on the front
+    '''
+
+    kept = {}
+    shortest = math.inf
+    for total in sorted(labels, reverse=True):
+        if labels[total][0] < shortest:
+            shortest = labels[total][0]
+            kept[total] = labels[total]
+    return kept
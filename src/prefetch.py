@@ -0,0 +1,235 @@
+'''
+This program contains the Prefetcher object that speculatively searches Yelp in the background while the user is still building their activity list, so the final search can use results that are already fetched.
+
+Speculative searches use the address, radius and sort type of the previous session (stored in a small JSON file in the home directory) until the user enters new ones. Every speculative search costs a YelpAPI call, so the number of calls is capped by a budget.
+'''
+
+import json
+import os
+
+import profiling
+
+SESSION_FILE = os.path.join(os.path.expanduser('~'), '.yelist_session.json')
+
+def load_session(path=SESSION_FILE):
+
+    '''
+    Loads the search criteria of the previous session
+
+    Parameters
+    ----------
+    path (str):
+        The session file
+
+    Returns
+    -------
+    A dictionary with the "address", "radius" (meters), "sort" and "latencies" (seconds of the recent YelpAPI calls) of the previous search OR an empty dictionary if there is none
+    '''
+
+    try:
+        with open(path) as session_file:
+            session = json.load(session_file)
+    except (OSError, ValueError):
+        return {}
+
+    if type(session) is not dict or not session.get('address'):
+        return {}
+    return session
+
+def save_session(address, radius, sort, latencies=(), path=SESSION_FILE):
+
+    '''
+    Saves the search criteria of this session for the next one
+
+    Parameters
+    ----------
+    address (str):
+        The search address
+    radius (int):
+        The search radius in meters
+    sort (str):
+        The sort type when searching the Yelp database
+    latencies (float[]):
+        The seconds taken by the recent YelpAPI calls
+    path (str):
+        The session file
+
+    Returns
+    -------
+    None
+    '''
+
+    try:
+        with open(path, 'w') as session_file:
+            json.dump({'address': address, 'radius': radius, 'sort': sort, 'latencies': [round(seconds, 4) for seconds in latencies]}, session_file)
+    except OSError:
+        pass
+
+class Prefetcher():
+
+    '''
+    A class to run speculative Yelp searches on a background thread.
+
+    Attributes
+    ----------
+    handler (YelpAPIHandler):
+        The handler used only by the background thread to make the speculative calls
+    budget (int):
+        The maximum number of speculative YelpAPI calls
+    used (int):
+        The number of speculative calls made or scheduled so far
+    limit (int):
+        The number of results requested by each speculative call (the first page of a search)
+    '''
+
+    def __init__(self, handler, budget=10, limit=10):
+
+        '''
+        Constructs the Prefetcher object
+
+        Parameters
+        ----------
+        handler (YelpAPIHandler):
+            The handler used only by the background thread to make the speculative calls
+        budget (int):
+            The maximum number of speculative YelpAPI calls
+        limit (int):
+            The number of results requested by each speculative call (the first page of a search)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.handler = handler
+        self.budget = budget
+        self.used = 0
+        self.limit = limit
+        self._results = {}
+
+        # A single background thread: the handler is not shared and speculative calls never compete with each other
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='yelist-prefetch')
+
+    def prefetch(self, category, aliases, address, radius, sort):
+
+        '''
+        Schedules a speculative search of the first page of a category, unless it was already scheduled or the budget is spent
+
+        Parameters
+        ----------
+        category (Category):
+            The category to search
+        aliases (str):
+            The comma-separated category aliases to search
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+        sort (str):
+            The sort type when searching the Yelp database
+
+        Returns
+        -------
+        Boolean value (whether a search was scheduled)
+        '''
+
+        key = (address, radius, sort, aliases)
+        if key in self._results or self.used >= self.budget:
+            return False
+
+        self.used += 1
+        profiling.count('prefetch.calls')
+        self._results[key] = self._executor.submit(self.fetch, category, aliases, address, radius, sort)
+        return True
+
+    def fetch(self, category, aliases, address, radius, sort):
+
+        '''
+        Makes a speculative search (runs on the background thread)
+
+        Parameters
+        ----------
+        category (Category):
+            The category to search
+        aliases (str):
+            The comma-separated category aliases to search
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+        sort (str):
+            The sort type when searching the Yelp database
+
+        Returns
+        -------
+        page (YelpBusinessList):
+            The first page of results
+        total (int):
+            The total number of businesses Yelp found for the search
+        center (str:float{}):
+            The coordinates Yelp resolved the search address to
+        fetched_at (float):
+            The time the results were fetched (seconds since the epoch)
+        '''
+
+        with profiling.span('prefetch.search'):
+            self.handler.address = address
+            self.handler.radius = radius
+            self.handler.center = None
+            self.handler.fetched_at = {}
+            page, total = self.handler.search_page(category, sort, 0, self.limit, aliases)
+            return page, total, self.handler.center, self.handler.fetched_at[category.alias]
+
+    def take(self, address, radius, sort, aliases, timeout=None):
+
+        '''
+        Returns the result of a matching speculative search, waiting for it if it is still running. Each result is only returned once
+
+        Parameters
+        ----------
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+        sort (str):
+            The sort type when searching the Yelp database
+        aliases (str):
+            The comma-separated category aliases to search
+        timeout (float):
+            The seconds to wait for a search still running (None to wait until it finishes)
+
+        Returns
+        -------
+        The (page, total, center, fetched_at) result of the search OR None if no matching search was made, it failed or it did not finish in time
+        '''
+
+        future = self._results.pop((address, radius, sort, aliases), None)
+        if future is None:
+            profiling.count('prefetch.misses')
+            return None
+
+        try:
+            result = future.result(timeout)
+        except Exception:
+            profiling.count('prefetch.misses')
+            return None
+
+        profiling.count('prefetch.hits')
+        return result
+
+    def shutdown(self):
+
+        '''
+        Stops the background thread, cancelling the searches that have not started
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,354 @@
+'''
+This program contains the instrumentation used to find where time goes in Yelist: named timing spans and counters (API calls, cache hits, size of the responses).
+
+Profiling is off by default and is turned on by setting the YELIST_PROFILE environment variable to anything but "", "0", "false", "no" or "off" (or with the --profile flag). While it is off, span() returns a shared no-op object and count() returns immediately, so the instrumentation left in the code costs a single attribute check.
+
+The results can be printed as a summary table or exported as a Chrome trace-event JSON file (open it in chrome://tracing or https://ui.perfetto.dev).
+'''
+
+import json
+import os
+import threading
+import time
+
+ENV_VAR = 'YELIST_PROFILE'
+
+class NullSpan():
+
+    '''
+    A class for the no-op span returned while profiling is disabled.
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span():
+
+    '''
+    A class to time a named section of code. Used as a context manager.
+
+    Attributes
+    ----------
+    profiler (Profiler):
+        The profiler the span is recorded in
+    name (str):
+        The name of the span (e.g., "api.search_query")
+    start (float):
+        The start time of the span in seconds (time.perf_counter())
+    '''
+
+    def __init__(self, profiler, name):
+
+        '''
+        Constructs the Span object
+
+        Parameters
+        ----------
+        profiler (Profiler):
+            The profiler the span is recorded in
+        name (str):
+            The name of the span
+
+        Returns
+        -------
+        None
+        '''
+
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+class Profiler():
+
+    '''
+    A class to collect timing spans and counters.
+
+    Attributes
+    ----------
+    enabled (bool):
+        Whether spans and counters are being recorded
+    spans ((str, float, float, int)[]):
+        A list of (name, start, duration, thread id) tuples of the finished spans, times in seconds
+    counters (str:int{}):
+        A dictionary containing counter name, value pairs
+    origin (float):
+        The time profiling started in seconds (time.perf_counter())
+    '''
+
+    def __init__(self, enabled=False):
+
+        '''
+        Constructs the Profiler object
+
+        Parameters
+        ----------
+        enabled (bool):
+            Whether spans and counters are being recorded
+
+        Returns
+        -------
+        None
+        '''
+
+        self.enabled = enabled
+        self.spans = []
+        self.counters = {}
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def span(self, name):
+
+        '''
+        Creates a timing span. Use as "with profiler.span(name):"
+
+        Parameters
+        ----------
+        name (str):
+            The name of the span
+
+        Returns
+        -------
+        A Span object OR the shared no-op span if profiling is disabled
+        '''
+
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name, start, duration):
+
+        '''
+        Records a finished span
+
+        Parameters
+        ----------
+        name (str):
+            The name of the span
+        start (float):
+            The start time of the span in seconds (time.perf_counter())
+        duration (float):
+            The duration of the span in seconds
+
+        Returns
+        -------
+        None
+        '''
+
+        with self._lock:
+            self.spans.append((name, start, duration, threading.get_ident()))
+
+    def count(self, name, n=1):
+
+        '''
+        Increments a counter
+
+        Parameters
+        ----------
+        name (str):
+            The name of the counter (e.g., "api.calls")
+        n (int):
+            The amount to add to the counter
+
+        Returns
+        -------
+        None
+        '''
+
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+
+        '''
+        Creates a table of the total, mean and max time of each span name, followed by the counters
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        The summary table as a string
+        '''
+
+        # Copied under the lock, the counters are written from other threads
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+
+        totals = {}
+        for name, start, duration, tid in spans:
+            calls, total, longest = totals.get(name, (0, 0.0, 0.0))
+            totals[name] = (calls + 1, total + duration, max(longest, duration))
+
+        width = max([len(name) for name in totals] + [len(name) for name in counters] + [4])
+        table = '\nProfile summary:\n\n'
+        table += f"| {'Span'.ljust(width)} | {'Calls':>6} | {'Total (ms)':>11} | {'Mean (ms)':>10} | {'Max (ms)':>10} |\n"
+        table += '-' * (width + 52) + '\n'
+
+        # Slowest spans first
+        for name, (calls, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            table += f"| {name.ljust(width)} | {calls:>6} | {total * 1000:>11.2f} | {total / calls * 1000:>10.2f} | {longest * 1000:>10.2f} |\n"
+
+        if counters:
+            table += f"\n| {'Counter'.ljust(width)} | {'Value':>12} |\n"
+            table += '-' * (width + 19) + '\n'
+            for name in sorted(counters):
+                table += f"| {name.ljust(width)} | {counters[name]:>12} |\n"
+
+        return table
+
+    def chrome_trace(self):
+
+        '''
+        Creates the Chrome trace-event representation of the recorded spans and counters
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A dictionary in the Chrome trace-event JSON format
+        '''
+
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+
+        # Complete ("X") events use microsecond timestamps relative to the start of profiling
+        events = [{'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6, 'pid': pid, 'tid': tid} for name, start, duration, tid in spans]
+
+        end = (time.perf_counter() - self.origin) * 1e6
+        for name, value in counters.items():
+            events.append({'name': name, 'ph': 'C', 'ts': end, 'pid': pid, 'args': {'value': value}})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+
+        '''
+        Writes the recorded spans and counters to a Chrome trace-event JSON file
+
+        Parameters
+        ----------
+        path (str):
+            The path of the JSON file
+
+        Returns
+        -------
+        None
+        '''
+
+        with open(path, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+    def reset(self):
+
+        '''
+        Discards all recorded spans and counters
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        with self._lock:
+            self.spans = []
+            self.counters = {}
+            self.origin = time.perf_counter()
+
+def env_enabled(value):
+
+    '''
+    Reads the value of the YELIST_PROFILE environment variable
+
+    Parameters
+    ----------
+    value (str):
+        The value of the variable (None if it is not set)
+
+    Returns
+    -------
+    Boolean value (False for an unset or empty variable, "0", "false", "no" or "off")
+    '''
+
+    return (value or '').strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+# The process-wide profiler used by the instrumentation throughout Yelist
+profiler = Profiler(enabled=env_enabled(os.environ.get(ENV_VAR)))
+
+def span(name):
+
+    '''
+    Creates a timing span on the process-wide profiler. Use as "with profiling.span(name):"
+
+    Parameters
+    ----------
+    name (str):
+        The name of the span
+
+    Returns
+    -------
+    A Span object OR the shared no-op span if profiling is disabled
+    '''
+
+    if not profiler.enabled:
+        return NULL_SPAN
+    return Span(profiler, name)
+
+def count(name, n=1):
+
+    '''
+    Increments a counter on the process-wide profiler
+
+    Parameters
+    ----------
+    name (str):
+        The name of the counter
+    n (int):
+        The amount to add to the counter
+
+    Returns
+    -------
+    None
+    '''
+
+    if profiler.enabled:
+        profiler.count(name, n)
+
+def enable():
+
+    '''
+    Turns on the process-wide profiler
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    '''
+
+    profiler.enabled = True
@@ -0,0 +1,142 @@
+'''
+This program contains the Ranker object that re-ranks the businesses returned by the Yelp search locally, so the weighting of rating, popularity and distance can be changed without searching Yelp again.
+
+Ratings are smoothed towards a prior (a Bayesian average), so a 5-star business with 3 reviews does not outrank a 4.5-star business with 900 reviews. The scores of all the candidates of all the categories are computed in one vectorized NumPy pass.
+'''
+
+import numpy as np
+
+class Ranker():
+
+    '''
+    A class to score and re-rank YelpBusiness candidates with a configurable weighting.
+
+    Attributes
+    ----------
+    rating_weight (float):
+        The weight of the smoothed rating
+    reviews_weight (float):
+        The weight of the log review count
+    distance_weight (float):
+        The weight of the closeness to the search address
+    prior_rating (float):
+        The rating the smoothing pulls towards (None to use the review-weighted mean of the candidates)
+    prior_strength (float):
+        The number of reviews the prior rating counts as
+    '''
+
+    def __init__(self, rating_weight=1.0, reviews_weight=0.5, distance_weight=0.5, prior_rating=None, prior_strength=10):
+
+        '''
+        Constructs the Ranker object
+
+        Parameters
+        ----------
+        rating_weight (float):
+            The weight of the smoothed rating
+        reviews_weight (float):
+            The weight of the log review count
+        distance_weight (float):
+            The weight of the closeness to the search address
+        prior_rating (float):
+            The rating the smoothing pulls towards (None to use the review-weighted mean of the candidates)
+        prior_strength (float):
+            The number of reviews the prior rating counts as
+
+        Returns
+        -------
+        None
+        '''
+
+        self.rating_weight = rating_weight
+        self.reviews_weight = reviews_weight
+        self.distance_weight = distance_weight
+        self.prior_rating = prior_rating
+        self.prior_strength = prior_strength
+
+    def __repr__(self):
+        return f"Ranker(rating={self.rating_weight}, reviews={self.reviews_weight}, distance={self.distance_weight})"
+
+    def score(self, rating, reviews, distance, max_distance=None):
+
+        '''
+        Computes the score of each candidate. Each term is scaled to [0, 1] before weighting
+
+        Parameters
+        ----------
+        rating (numpy.ndarray):
+            The average ratings of the candidates
+        reviews (numpy.ndarray):
+            The review counts of the candidates
+        distance (numpy.ndarray):
+            The distances of the candidates from the search address in meters (NaN if unknown)
+        max_distance (float):
+            The distance scored as 0 closeness, usually the search radius (None to use the farthest candidate)
+
+        Returns
+        -------
+        A numpy.ndarray of the candidate scores
+        '''
+
+        prior = self.prior_rating
+        if prior is None:
+            prior = float((rating * reviews).sum() / reviews.sum()) if reviews.sum() > 0 else float(rating.mean())
+
+        # Bayesian average: the prior counts as prior_strength reviews
+        smoothed = (self.prior_strength * prior + reviews * rating) / (self.prior_strength + reviews)
+
+        # Yelp ratings range from 1 to 5
+        rating_term = (smoothed - 1) / 4
+
+        most_reviews = np.log1p(reviews.max())
+        reviews_term = np.log1p(reviews) / most_reviews if most_reviews > 0 else np.zeros_like(reviews)
+
+        # An unknown distance scores as the farthest candidate
+        known = ~np.isnan(distance)
+        if max_distance is None:
+            max_distance = distance[known].max() if known.any() else 0
+        distance_term = np.where(known, np.clip(1 - distance / max(max_distance, 1), 0, 1), 0)
+
+        return self.rating_weight * rating_term + self.reviews_weight * reviews_term + self.distance_weight * distance_term
+
+    def rerank(self, b_lists, max_distance=None):
+
+        '''
+        Re-orders the businesses of each YelpBusinessList by score (best first) and stores each score on its YelpBusiness
+
+        Parameters
+        ----------
+        b_lists (YelpBusinessList[]):
+            The business lists to re-rank (all candidates are scored together)
+        max_distance (float):
+            The distance scored as 0 closeness, usually the search radius (None to use the farthest candidate)
+
+        Returns
+        -------
+        None
+        '''
+
+        b_lists = list(b_lists)
+        businesses = [b for b_list in b_lists for b in b_list.business_list]
+        if not businesses:
+            return
+
+        n = len(businesses)
+        rating = np.fromiter((b.rating for b in businesses), dtype=float, count=n)
+        reviews = np.fromiter((b.num_reviews for b in businesses), dtype=float, count=n)
+        distance = np.fromiter((b.distance if b.distance is not None else np.nan for b in businesses), dtype=float, count=n)
+
+        # The list each candidate belongs to, so one sort orders every list at once
+        sizes = [len(b_list.business_list) for b_list in b_lists]
+        group = np.repeat(np.arange(len(b_lists)), sizes)
+
+        scores = self.score(rating, reviews, distance, max_distance)
+        order = np.lexsort((-scores, group)).tolist()
+
+        for b, s in zip(businesses, scores.tolist()):
+            b.score = s
+
+        start = 0
+        for b_list, size in zip(b_lists, sizes):
+            b_list.business_list = [businesses[i] for i in order[start:start + size]]
+            start += size
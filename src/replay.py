@@ -0,0 +1,408 @@
+'''
+This program records the YelpAPI traffic of a workload to a compact archive and replays it, so the performance of the YelpAPIHandler can be compared across versions on the same data.
+
+An archive is a gzip-compressed JSON Lines file. Each distinct response body is stored once ({"body": ...} lines, numbered in order) and each call references it ({"method": ..., "params": ..., "response": n, "start": ..., "latency": ...} lines). Run with:
+
+    python replay.py record plans.json day.jsonl.gz [--stub]
+    python replay.py replay plans.json day.jsonl.gz [--scale 1.0] [--workers 8]
+'''
+
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from Yelist import Activity, ActivityList, YelpAPIHandler
+from yelp_categories import CategoryTree
+
+def request_key(method, params):
+
+    '''
+    Creates the key identifying a call, independent of the order of its parameters
+
+    Parameters
+    ----------
+    method (str):
+        The client method called
+    params (dict):
+        The parameters of the call
+
+    Returns
+    -------
+    The key string
+    '''
+
+    return method + ' ' + json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+class ArchiveWriter():
+
+    '''
+    A class to write calls to an archive. It is safe to share between threads.
+
+    Attributes
+    ----------
+    path (str):
+        The archive file
+    calls (int):
+        The number of calls written
+    '''
+
+    def __init__(self, path):
+
+        '''
+        Constructs the ArchiveWriter object
+
+        Parameters
+        ----------
+        path (str):
+            The archive file
+
+        Returns
+        -------
+        None
+        '''
+
+        self.path = path
+        self.calls = 0
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def write(self, method, params, body, start, latency):
+
+        '''
+        Writes a call, and its response body if it was not already written
+
+        Parameters
+        ----------
+        method (str):
+            The client method called
+        params (dict):
+            The parameters of the call
+        body (str):
+            The JSON response body
+        start (float):
+            The perf_counter() time the call started
+        latency (float):
+            The duration of the call in seconds
+
+        Returns
+        -------
+        None
+        '''
+
+        digest = hashlib.sha1(body.encode()).digest()
+        with self._lock:
+            if digest not in self._bodies:
+                self._bodies[digest] = len(self._bodies)
+                self._file.write(json.dumps({'body': body}) + '\n')
+
+            call = {'method': method, 'params': params, 'response': self._bodies[digest], 'start': round(start - self._started, 6), 'latency': round(latency, 6)}
+            self._file.write(json.dumps(call, separators=(',', ':')) + '\n')
+            self.calls += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def load_archive(path):
+
+    '''
+    Reads the calls of an archive
+
+    Parameters
+    ----------
+    path (str):
+        The archive file
+
+    Returns
+    -------
+    A list of call dictionaries (method, params, body, start, latency) in recorded order
+    '''
+
+    bodies = []
+    calls = []
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            entry = json.loads(line)
+            if 'body' in entry:
+                bodies.append(entry['body'])
+            else:
+                entry['body'] = bodies[entry.pop('response')]
+                calls.append(entry)
+    return calls
+
+class RecordingClient():
+
+    '''
+    A class wrapping a client with the YelpAPI search_query()/business_query() methods and writing every call to an archive.
+
+    Attributes
+    ----------
+    client (object):
+        The wrapped client
+    writer (ArchiveWriter):
+        The archive the calls are written to
+    '''
+
+    def __init__(self, client, writer):
+
+        '''
+        Constructs the RecordingClient object
+
+        Parameters
+        ----------
+        client (object):
+            The wrapped client
+        writer (ArchiveWriter):
+            The archive the calls are written to
+
+        Returns
+        -------
+        None
+        '''
+
+        self.client = client
+        self.writer = writer
+
+    def call(self, method, params):
+
+        '''
+        Calls the wrapped client and records the call
+
+        Parameters
+        ----------
+        method (str):
+            The client method to call
+        params (dict):
+            The parameters of the call
+
+        Returns
+        -------
+        The response of the wrapped client
+        '''
+
+        start = time.perf_counter()
+        response = getattr(self.client, method)(**params)
+        latency = time.perf_counter() - start
+
+        body = json.dumps(response, separators=(',', ':'))
+        self.writer.write(method, params, body, start, latency)
+        return response
+
+    def search_query(self, **params):
+        return self.call('search_query', params)
+
+    def business_query(self, id, **params):
+        return self.call('business_query', dict(params, id=id))
+
+class ReplayClient():
+
+    '''
+    A class with the YelpAPI search_query()/business_query() methods serving the responses of an archive, after the recorded latency multiplied by a scale. Identical calls are served their recorded responses in order (the last one repeats).
+
+    Attributes
+    ----------
+    scale (float):
+        The factor applied to the recorded latencies (0 for no delay)
+    calls (int):
+        The number of calls served
+    misses (int):
+        The number of calls that were not recorded
+    '''
+
+    def __init__(self, calls, scale=1.0):
+
+        '''
+        Constructs the ReplayClient object
+
+        Parameters
+        ----------
+        calls (dict[]):
+            The recorded calls (see load_archive())
+        scale (float):
+            The factor applied to the recorded latencies (0 for no delay)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.scale = scale
+        self.calls = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._recorded = defaultdict(deque)
+        for call in calls:
+            self._recorded[request_key(call['method'], call['params'])].append(call)
+
+    def replay(self, method, params):
+
+        '''
+        Serves the recorded response body of a call
+
+        Parameters
+        ----------
+        method (str):
+            The client method called
+        params (dict):
+            The parameters of the call
+
+        Returns
+        -------
+        The recorded JSON response body
+        '''
+
+        key = request_key(method, params)
+        with self._lock:
+            recorded = self._recorded.get(key)
+            if not recorded:
+                self.misses += 1
+                raise LookupError(f"No recorded response for {key}")
+            call = recorded.popleft() if len(recorded) > 1 else recorded[0]
+            self.calls += 1
+
+        if self.scale:
+            time.sleep(call['latency'] * self.scale)
+        return call['body']
+
+    def search_query(self, **params):
+        return json.loads(self.replay('search_query', params))
+
+    def business_query(self, id, **params):
+        return json.loads(self.replay('business_query', dict(params, id=id)))
+
+def run_plan(plan, cat_tree, client):
+
+    '''
+    Searches Yelp for one plan (in the service format) with a given client
+
+    Parameters
+    ----------
+    plan (dict):
+        The plan to search
+    cat_tree (CategoryTree):
+        The category tree
+    client (object):
+        The client used by the YelpAPIHandler
+
+    Returns
+    -------
+    The list of searched Activity objects with their assigned businesses
+    '''
+
+    a_list = ActivityList()
+    for entry in plan['activities']:
+        category = cat_tree.nodes[entry['category']]
+        a_list.add_to_list(Activity(entry.get('name', category.title), entry.get('priority', len(a_list) + 1), category, entry.get('expand', False)))
+
+    view = cat_tree.country_view(plan.get('country', 'US'))
+    handler = YelpAPIHandler(None, plan['address'], plan.get('radius', 16090), view, cat_tree, client=client)
+    handler.API_call(a_list.list, plan.get('sort', 'review_count'))
+    return a_list.list
+
+def run_workload(plans, cat_tree, client, workers=1):
+
+    '''
+    Searches every plan of a workload and measures the latency of each one
+
+    Parameters
+    ----------
+    plans (dict[]):
+        The plans in the service format
+    cat_tree (CategoryTree):
+        The category tree
+    client (object):
+        The client used by the YelpAPIHandler (shared by the workers)
+    workers (int):
+        The number of plans searched concurrently
+
+    Returns
+    -------
+    elapsed (float):
+        The duration of the workload in seconds
+    latencies (float[]):
+        The latency of each plan in seconds, sorted
+    errors (int):
+        The number of plans that failed
+    '''
+
+    def timed(plan):
+        start = time.perf_counter()
+        try:
+            run_plan(plan, cat_tree, client)
+            return time.perf_counter() - start, False
+        except Exception:
+            return time.perf_counter() - start, True
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(timed, plans))
+    elapsed = time.perf_counter() - start
+
+    return elapsed, sorted(latency for latency, _ in results), sum(failed for _, failed in results)
+
+def percentile(values, p):
+
+    '''
+    Returns a percentile of sorted values (nearest rank)
+
+    Parameters
+    ----------
+    values (float[]):
+        The sorted values
+    p (float):
+        The percentile (0-100)
+
+    Returns
+    -------
+    The value at the percentile
+    '''
+
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or replay the YelpAPI traffic of a workload of plans")
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('plans', help="JSON file containing a list of plans")
+    parser.add_argument('archive', help="the archive file (.jsonl.gz)")
+    parser.add_argument('--stub', action='store_true', help="record the local stand-in for the Yelp API")
+    parser.add_argument('--scale', type=float, default=1.0, help="factor applied to the recorded latencies when replaying (default: 1.0, 0 for no delay)")
+    parser.add_argument('--workers', type=int, default=1, help="number of plans searched concurrently (default: 1)")
+    args = parser.parse_args()
+
+    with open(args.plans) as plans_file:
+        plans = json.load(plans_file)
+    with open("categories.json") as __file:
+        cat_tree = CategoryTree(json.load(__file))
+
+    if args.mode == 'record':
+        if args.stub:
+            from stub_yelp import StubYelpAPI
+            client = StubYelpAPI()
+        else:
+            import config
+            from yelpapi import YelpAPI
+            client = YelpAPI(config.yelp_api_key)
+
+        writer = ArchiveWriter(args.archive)
+        try:
+            elapsed, latencies, errors = run_workload(plans, cat_tree, RecordingClient(client, writer), args.workers)
+        finally:
+            writer.close()
+        print(f"Recorded {writer.calls} calls of {len(plans)} plans to {args.archive}")
+
+    else:
+        client = ReplayClient(load_archive(args.archive), args.scale)
+        elapsed, latencies, errors = run_workload(plans, cat_tree, client, args.workers)
+        print(f"Replayed {client.calls} calls ({client.misses} not recorded) at {args.scale}x latency")
+
+    print(f"{len(plans)} plans in {elapsed:.2f} s ({len(plans) / elapsed:.1f} plans/s), {errors} failed")
+    if latencies:
+        print(f"Plan latency: p50 {percentile(latencies, 50) * 1000:.1f} ms, p95 {percentile(latencies, 95) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms")
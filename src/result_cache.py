@@ -0,0 +1,271 @@
+'''
+This program contains the ResultCache object that keeps Yelp search results between searches with a stale-while-revalidate freshness policy.
+
+A cached result younger than the soft TTL is served as is. A result between the soft and the hard TTL is served immediately while a background thread fetches a fresh copy for the next search. A result older than the hard TTL is fetched again before it is served.
+'''
+
+import threading
+import time
+from collections import OrderedDict
+
+import profiling
+
+# Ratings and review counts change slowly, a few minutes old results are as good as new ones
+SOFT_TTL = 5 * 60
+HARD_TTL = 60 * 60
+
+def format_age(fetched_at, now=None):
+
+    '''
+    Describes how long ago a result was fetched
+
+    Parameters
+    ----------
+    fetched_at (float):
+        The time the result was fetched (seconds since the epoch, None if unknown)
+    now (float):
+        The current time (defaults to time.time())
+
+    Returns
+    -------
+    A short readable age, such as "just now" or "12 min ago"
+    '''
+
+    if fetched_at is None:
+        return 'unknown'
+
+    age = max((time.time() if now is None else now) - fetched_at, 0)
+    if age < 60:
+        return 'just now'
+    if age < 60 * 60:
+        return f'{int(age // 60)} min ago'
+    if age < 24 * 60 * 60:
+        return f'{int(age // 3600)} h ago'
+    return f'{int(age // 86400)} days ago'
+
+class CacheEntry():
+
+    '''
+    A class to store a cached result.
+
+    Attributes
+    ----------
+    value (object):
+        The cached result
+    fetched_at (float):
+        The time the result was fetched (seconds since the epoch)
+    refreshing (bool):
+        Whether a background refresh of the result is running
+    '''
+
+    def __init__(self, value, fetched_at):
+
+        '''
+        Constructs the CacheEntry object
+
+        Parameters
+        ----------
+        value (object):
+            The cached result
+        fetched_at (float):
+            The time the result was fetched (seconds since the epoch)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.value = value
+        self.fetched_at = fetched_at
+        self.refreshing = False
+
+class ResultCache():
+
+    '''
+    A class to cache search results with a soft and a hard time-to-live. It is safe to share between threads.
+
+    Attributes
+    ----------
+    soft_ttl (float):
+        The age in seconds after which a result is refreshed in the background
+    hard_ttl (float):
+        The age in seconds after which a result is no longer served
+    max_entries (int):
+        The most results kept (the least recently used ones are dropped first)
+    clock (callable):
+        The function returning the current time (seconds since the epoch)
+    '''
+
+    def __init__(self, soft_ttl=SOFT_TTL, hard_ttl=HARD_TTL, max_entries=1024, clock=time.time):
+
+        '''
+        Constructs the ResultCache object
+
+        Parameters
+        ----------
+        soft_ttl (float):
+            The age in seconds after which a result is refreshed in the background
+        hard_ttl (float):
+            The age in seconds after which a result is no longer served
+        max_entries (int):
+            The most results kept (the least recently used ones are dropped first)
+        clock (callable):
+            The function returning the current time (seconds since the epoch)
+
+        Returns
+        -------
+        None
+        '''
+
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # The refresh threads are only started by the first stale result
+        self._executor = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, fetch, refresh=None):
+
+        '''
+        Returns the cached result of a key, fetching it if it is missing or past the hard TTL, and refreshing it in the background if it is past the soft TTL
+
+        Parameters
+        ----------
+        key (tuple):
+            The key of the result
+        fetch (callable):
+            A function without arguments returning a fresh result
+        refresh (callable):
+            A function without arguments returning a fresh result, called on a background thread to replace a stale one (defaults to fetch)
+
+        Returns
+        -------
+        value (object):
+            The result
+        fetched_at (float):
+            The time the result was fetched (seconds since the epoch)
+        '''
+
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = now - entry.fetched_at
+
+                if age < self.soft_ttl:
+                    profiling.count('cache.fresh')
+                    return entry.value, entry.fetched_at
+
+                if age < self.hard_ttl:
+                    profiling.count('cache.stale')
+                    if not entry.refreshing:
+                        entry.refreshing = True
+                        if self._executor is None:
+                            from concurrent.futures import ThreadPoolExecutor
+                            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='yelist-refresh')
+                        self._executor.submit(self.refresh, key, refresh or fetch)
+                    return entry.value, entry.fetched_at
+
+        # Missing or expired: block on the network
+        profiling.count('cache.misses')
+        value = fetch()
+        return value, self.put(key, value)
+
+    def peek(self, key):
+
+        '''
+        Returns the cached result of a key without fetching or refreshing it
+
+        Parameters
+        ----------
+        key (tuple):
+            The key of the result
+
+        Returns
+        -------
+        A tuple of the result and the time it was fetched (seconds since the epoch), None if it is missing or past the hard TTL
+        '''
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self.clock() - entry.fetched_at >= self.hard_ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry.value, entry.fetched_at
+
+    def put(self, key, value):
+
+        '''
+        Stores a freshly fetched result
+
+        Parameters
+        ----------
+        key (tuple):
+            The key of the result
+        value (object):
+            The result
+
+        Returns
+        -------
+        The time the result was fetched (seconds since the epoch)
+        '''
+
+        fetched_at = self.clock()
+        with self._lock:
+            self._entries[key] = CacheEntry(value, fetched_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fetched_at
+
+    def refresh(self, key, fetch):
+
+        '''
+        Fetches a fresh result to replace a stale one (runs on a background thread). A failed refresh keeps the stale result until the hard TTL
+
+        Parameters
+        ----------
+        key (tuple):
+            The key of the result
+        fetch (callable):
+            A function without arguments returning a fresh result
+
+        Returns
+        -------
+        None
+        '''
+
+        try:
+            with profiling.span('cache.refresh'):
+                value = fetch()
+        except Exception:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refreshing = False
+            return
+
+        self.put(key, value)
+
+    def shutdown(self):
+
+        '''
+        Stops the background refreshes that have not started
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,317 @@
+'''
+This program contains the objects that schedule visits to the Yelp businesses assigned to an activity list while respecting their opening hours.
+
+The ItineraryScheduler object solves a travelling salesman problem with time windows (TSPTW) heuristically. Activities are inserted one at a time, in order of priority, at the position of the route that adds the least weighted delay and travel time while keeping every visit inside its business opening hours.
+'''
+
+from geo import travel_minutes, DEFAULT_SPEED
+
+MINUTES_PER_DAY = 1440
+
+def parse_hours(hours):
+
+    '''
+    Converts the "hours" field of a Yelp business details response into opening windows for each day of the week
+
+    Parameters
+    ----------
+    hours (dict[]):
+        The "hours" field of a Yelp business details response
+
+    Returns
+    -------
+    A dictionary of weekday (0 is Monday), (open, close)[] pairs with times in minutes since midnight OR None if no regular hours are listed
+    '''
+
+    if not hours:
+        return None
+
+    windows = {day: [] for day in range(7)}
+
+    for block in hours:
+
+        # Only regular hours apply to every week (special hours are one-off events)
+        if block.get('hours_type', 'REGULAR') != 'REGULAR':
+            continue
+
+        for slot in block.get('open', []):
+            start = int(slot['start'][:2]) * 60 + int(slot['start'][2:])
+            end = int(slot['end'][:2]) * 60 + int(slot['end'][2:])
+
+            # Overnight windows close on the following day
+            if slot.get('is_overnight') or end <= start:
+                end += MINUTES_PER_DAY
+
+            windows[slot['day']].append((start, end))
+
+    for day in windows:
+        windows[day].sort()
+
+    return windows
+
+def windows_for_day(windows, weekday):
+
+    '''
+    Finds the opening windows that apply to a single day, including overnight windows carried over from the previous day
+
+    Parameters
+    ----------
+    windows (int:(int, int)[]{}):
+        The opening windows returned by parse_hours()
+    weekday (int):
+        The day of the week (0 is Monday)
+
+    Returns
+    -------
+    A sorted list of (open, close) pairs in minutes since midnight OR None if the opening hours are unknown (always open)
+    '''
+
+    if windows is None:
+        return None
+
+    # Windows from the previous day that run past midnight
+    carried = [(0, end - MINUTES_PER_DAY) for start, end in windows[(weekday - 1) % 7] if end > MINUTES_PER_DAY]
+
+    return sorted(carried + windows[weekday])
+
+def format_minutes(minutes):
+
+    '''
+    Formats a number of minutes since midnight as a 24-hour clock time
+
+    Parameters
+    ----------
+    minutes (float):
+        The number of minutes since midnight
+
+    Returns
+    -------
+    The time as a "HH:MM" string
+    '''
+
+    minutes = int(round(minutes)) % MINUTES_PER_DAY
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+class Visit():
+
+    '''
+    A class to store a scheduled visit to a business.
+
+    Attributes
+    ----------
+    activity (Activity):
+        The activity being visited
+    arrival (float):
+        The arrival time at the business in minutes since midnight
+    start (float):
+        The start of the visit in minutes since midnight (later than arrival if the business is not yet open)
+    departure (float):
+        The departure time from the business in minutes since midnight
+    '''
+
+    def __init__(self, activity, arrival, start, departure):
+
+        '''
+        Constructs the Visit object
+
+        Parameters
+        ----------
+        activity (Activity):
+            The activity being visited
+        arrival (float):
+            The arrival time at the business in minutes since midnight
+        start (float):
+            The start of the visit in minutes since midnight
+        departure (float):
+            The departure time from the business in minutes since midnight
+
+        Returns
+        -------
+        None
+        '''
+
+        self.activity = activity
+        self.arrival = arrival
+        self.start = start
+        self.departure = departure
+
+    def __repr__(self):
+        return f"{format_minutes(self.start)}-{format_minutes(self.departure)} {self.activity.name} ({self.activity.business.name})"
+
+class ItineraryScheduler():
+
+    '''
+    A class to order the businesses of an activity list into a route that visits each business while it is open.
+
+    Attributes
+    ----------
+    origin (str:float{}):
+        The latitude and longitude coordinates of the search address
+    start (int):
+        The departure time from the origin in minutes since midnight
+    weekday (int):
+        The day of the week of the itinerary (0 is Monday)
+    visit_minutes (int):
+        The time spent at each business in minutes
+    speed (float):
+        The average travel speed in meters per second
+    priority_weight (float):
+        How strongly high priority activities are pulled to the front of the day relative to the travel time
+    '''
+
+    def __init__(self, origin, start, weekday, visit_minutes=30, speed=DEFAULT_SPEED, priority_weight=1.0):
+
+        '''
+        Constructs the ItineraryScheduler object
+
+        Parameters
+        ----------
+        origin (str:float{}):
+            The latitude and longitude coordinates of the search address
+        start (int):
+            The departure time from the origin in minutes since midnight
+        weekday (int):
+            The day of the week of the itinerary (0 is Monday)
+        visit_minutes (int):
+            The time spent at each business in minutes
+        speed (float):
+            The average travel speed in meters per second
+        priority_weight (float):
+            How strongly high priority activities are pulled to the front of the day relative to the travel time
+
+        Returns
+        -------
+        None
+        '''
+
+        self.origin = origin
+        self.start = start
+        self.weekday = weekday
+        self.visit_minutes = visit_minutes
+        self.speed = speed
+        self.priority_weight = priority_weight
+
+    def earliest_start(self, windows, arrival):
+
+        '''
+        Finds the earliest time a visit can start given the arrival time and the opening windows of the business
+
+        Parameters
+        ----------
+        windows ((int, int)[]):
+            The opening windows of the business for the day OR None if always open
+        arrival (float):
+            The arrival time at the business in minutes since midnight
+
+        Returns
+        -------
+        The start time of the visit OR None if the business cannot be visited after arrival
+        '''
+
+        if windows is None:
+            return arrival
+
+        for open_time, close_time in windows:
+            start = max(arrival, open_time)
+            if start + self.visit_minutes <= close_time:
+                return start
+
+        return None
+
+    def schedule(self, activities, hours):
+
+        '''
+        Orders the activities into a feasible route. Activities are inserted in order of priority at the cheapest feasible position
+
+        Parameters
+        ----------
+        activities (Activity[]):
+            The activities to schedule, each with an assigned business
+        hours (str:dict{}):
+            A dictionary of business id, parse_hours() output pairs. Businesses missing from the dictionary are treated as always open
+
+        Returns
+        -------
+        visits (Visit[]):
+            The scheduled visits in route order
+        unscheduled (Activity[]):
+            The activities that could not be visited while their business is open
+        '''
+
+        activities = sorted(activities, key=lambda a: a.prio)
+        n = len(activities)
+
+        # Node 0 is the origin, node i is activities[i-1]
+        points = [self.origin]
+        windows = [None]
+        weights = [0]
+        for rank, a in enumerate(activities):
+            points.append(a.business.coordinates if a.business.coordinates and a.business.coordinates.get('latitude') is not None else self.origin)
+            windows.append(windows_for_day(hours.get(a.business.business_id), self.weekday))
+
+            # The highest priority activity has the largest weight on its start time
+            weights.append(self.priority_weight * (n - rank) / n)
+
+        # Precompute the travel time matrix once, it is read O(n^2) times per insertion
+        travel = [[travel_minutes(p, q, self.speed) if p is not q else 0.0 for q in points] for p in points]
+
+        route = []
+        starts = []
+        unscheduled = []
+
+        for node in range(1, n + 1):
+            best = None
+
+            for pos in range(len(route) + 1):
+                prev = route[pos - 1] if pos else 0
+                leave = starts[pos - 1] + self.visit_minutes if pos else self.start
+
+                start = self.earliest_start(windows[node], leave + travel[prev][node])
+                if start is None:
+                    continue
+
+                cost = weights[node] * (start - self.start) + travel[prev][node]
+                if pos < len(route):
+                    cost += travel[node][route[pos]] - travel[prev][route[pos]]
+
+                # Push the new start times forward along the rest of the route until nothing changes
+                feasible = True
+                t = start + self.visit_minutes
+                last = node
+                for i in range(pos, len(route)):
+                    j = route[i]
+                    new_start = self.earliest_start(windows[j], t + travel[last][j])
+                    if new_start is None:
+                        feasible = False
+                        break
+                    if new_start == starts[i]:
+                        break
+                    cost += weights[j] * (new_start - starts[i])
+                    t = new_start + self.visit_minutes
+                    last = j
+
+                if feasible and (best is None or cost < best[0]):
+                    best = (cost, pos, start)
+
+            if best is None:
+                unscheduled.append(activities[node - 1])
+                continue
+
+            # Insert the node and recompute the start times after it
+            pos = best[1]
+            route.insert(pos, node)
+            starts.insert(pos, best[2])
+            for i in range(pos + 1, len(route)):
+                new_start = self.earliest_start(windows[route[i]], starts[i - 1] + self.visit_minutes + travel[route[i - 1]][route[i]])
+                if new_start == starts[i]:
+                    break
+                starts[i] = new_start
+
+        visits = []
+        prev = 0
+        for i, node in enumerate(route):
+            leave = starts[i - 1] + self.visit_minutes if i else self.start
+            visits.append(Visit(activities[node - 1], leave + travel[prev][node], starts[i], starts[i] + self.visit_minutes))
+            prev = node
+
+        return visits, unscheduled
@@ -0,0 +1,628 @@
+'''
+This program exposes the Yelist planner as an HTTP service so many users can build activity lists and search Yelp at the same time.
+
+The service runs on asyncio and only uses the standard library. One CategoryTree is loaded per process, its country views are built up front, and it is shared read-only by every request. Yelp searches block, so they run in a thread pool and never hold up the event loop. Each tenant (the X-Tenant request header) only sees its own plans, and a per-tenant limit on concurrent searches keeps one tenant from starving the others.
+
+Endpoints
+---------
+GET  /categories?q=[text]&country=[code]   Search the category titles (case-insensitive)
+POST /plans                                Create a plan: {"country": "US", "activities": [{"name": "Lunch", "category": "pizza", "priority": 1, "expand": false}]}
+GET  /plans/[id]                           Return a plan and the results of its last search
+POST /plans/[id]/search                    Search Yelp for a plan: {"address": "San Francisco", "radius": 16090, "sort": "rating"}
+
+Run with "python service.py --port 8080" (add --stub to use the local stand-in for the Yelp API).
+'''
+
+import argparse
+import asyncio
+import itertools
+import json
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from yelp_categories import CategoryTree
+from Yelist import Activity, ActivityList, YelpAPIHandler
+from result_cache import ResultCache
+from deadlines import HedgedCaller, LatencyTracker
+import profiling
+
+SORT_TYPES = ['review_count', 'rating', 'distance']
+
+# Largest accepted request body in bytes
+MAX_BODY = 1 << 20
+
+# Largest search radius accepted by the Yelp API in meters
+MAX_RADIUS = 40000
+
+# Number of plans kept across every tenant, the oldest plans are dropped first
+MAX_PLANS = 10000
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class HTTPError(Exception):
+
+    '''
+    An exception that is turned into an HTTP error response.
+
+    Attributes
+    ----------
+    status (int):
+        The HTTP status code
+    message (str):
+        The error message returned to the client
+    '''
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class Plan():
+
+    '''
+    A class to store an activity list created through the service.
+
+    Attributes
+    ----------
+    plan_id (str):
+        The id of the plan
+    country (str):
+        The two-letter code of the country being searched
+    a_list (ActivityList):
+        The activity list of the plan
+    results (dict):
+        The results of the last search of the plan (None until searched)
+    '''
+
+    def __init__(self, plan_id, country, a_list):
+
+        '''
+        Constructs the Plan object
+
+        Parameters
+        ----------
+        plan_id (str):
+            The id of the plan
+        country (str):
+            The two-letter code of the country being searched
+        a_list (ActivityList):
+            The activity list of the plan
+
+        Returns
+        -------
+        None
+        '''
+
+        self.plan_id = plan_id
+        self.country = country
+        self.a_list = a_list
+        self.results = None
+
+    def to_dict(self):
+        return {'id': self.plan_id, 'country': self.country, 'activities': [activity_to_dict(a) for a in self.a_list.list], 'results': self.results}
+
+def activity_to_dict(activity):
+
+    '''
+    Converts an activity (and its assigned business, if any) to a JSON-serializable dictionary
+
+    Parameters
+    ----------
+    activity (Activity):
+        The activity to convert
+
+    Returns
+    -------
+    A dictionary representation of the activity
+    '''
+
+    output = {'priority': activity.prio, 'name': activity.name, 'category': activity.category.alias, 'expand': activity.expand}
+
+    b = activity.business
+    if b is not None:
+        output['business'] = {'id': b.business_id, 'name': b.name, 'rating': b.rating, 'review_count': b.num_reviews, 'url': b.url, 'coordinates': b.coordinates, 'address': ', '.join(b.location), 'distance': b.distance, 'fetched_at': b.fetched_at}
+
+    return output
+
+class PlannerService():
+
+    '''
+    A class to serve the planner over HTTP.
+
+    Attributes
+    ----------
+    cat_tree (CategoryTree):
+        The category tree shared read-only by every request
+    api_key (str):
+        YelpAPI key (unused if a client is given)
+    client (object):
+        A shared, thread-safe client with the YelpAPI search_query() method (None to create a YelpAPI client per search)
+    executor (ThreadPoolExecutor):
+        The thread pool the blocking Yelp searches run in
+    tenant_limit (int):
+        The maximum number of concurrent searches per tenant
+    plans (str:str:Plan{}{}):
+        A dictionary containing tenant, (plan id, Plan object dictionary) pairs (at most MAX_PLANS plans)
+    views (str:CountryView{}):
+        The country views of the category tree, built up front so that no request thread fills a cache ("" for the countries without their own view)
+    result_cache (ResultCache):
+        The search results shared by every plan and tenant, served stale while they are refreshed in the background
+    hedge (bool):
+        Whether a duplicate of a YelpAPI call is sent once it has taken longer than the p95 latency
+    latency (LatencyTracker):
+        The latencies of the recent YelpAPI calls of every search, so the p95 is known from the first calls of a search
+    caller (HedgedCaller):
+        The caller sending the hedged duplicates, shared by every search
+    '''
+
+    def __init__(self, cat_tree, api_key=None, client=None, max_workers=64, tenant_limit=32, hedge=False):
+
+        '''
+        Constructs the PlannerService object
+
+        Parameters
+        ----------
+        cat_tree (CategoryTree):
+            The category tree shared read-only by every request
+        api_key (str):
+            YelpAPI key (unused if a client is given)
+        client (object):
+            A shared, thread-safe client with the YelpAPI search_query() method (None to create a YelpAPI client per search)
+        max_workers (int):
+            The number of threads running Yelp searches
+        tenant_limit (int):
+            The maximum number of concurrent searches per tenant
+        hedge (bool):
+            Whether a duplicate of a YelpAPI call is sent once it has taken longer than the p95 latency
+
+        Returns
+        -------
+        None
+        '''
+
+        self.cat_tree = cat_tree
+        self.api_key = api_key
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yelist-search')
+        self.tenant_limit = tenant_limit
+        self.plans = {}
+        self._plan_order = deque()
+        self._ids = itertools.count(1)
+        self._tenant_slots = {}
+        self.result_cache = ResultCache()
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+        self.caller = HedgedCaller(max_workers=max_workers) if hedge else None
+        self.views = self.build_views()
+
+    def build_views(self):
+
+        '''
+        Builds the country view of every country the category tree knows before any request is served
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A dictionary containing country code, CountryView object pairs
+        '''
+
+        views = {}
+        for country in [c for c in self.cat_tree.country_bits if type(c) is str] + ['']:
+            views[country.upper()] = self.cat_tree.country_view(country)
+        return views
+
+    def view(self, country):
+
+        '''
+        Returns the prebuilt view of the category tree for a country
+
+        Parameters
+        ----------
+        country (str):
+            The two-letter country code
+
+        Returns
+        -------
+        The CountryView object (the view shared by the countries without their own view if the code is unknown)
+        '''
+
+        return self.views.get(country.upper(), self.views[''])
+
+    async def handle_connection(self, reader, writer):
+
+        '''
+        Reads HTTP/1.1 requests from a connection and writes the responses. Connections are kept alive unless the client asks to close them
+
+        Parameters
+        ----------
+        reader (asyncio.StreamReader):
+            The connection reader
+        writer (asyncio.StreamWriter):
+            The connection writer
+
+        Returns
+        -------
+        None
+        '''
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                try:
+                    # A request that cannot be framed leaves the rest of the connection unreadable
+                    request = request_line.decode('latin-1').split()
+                    length = headers.get('content-length', '0')
+                    if len(request) != 3 or not (length.isascii() and length.isdigit()):
+                        keep_alive = False
+                        raise HTTPError(400, 'Malformed request')
+
+                    method, target, version = request
+                    keep_alive = keep_alive and version == 'HTTP/1.1'
+
+                    length = int(length)
+                    if length > MAX_BODY:
+                        keep_alive = False
+                        raise HTTPError(413, 'Request body too large')
+                    body = await reader.readexactly(length) if length else b''
+
+                    status, payload = await self.dispatch(method, target, headers, body)
+
+                except HTTPError as e:
+                    status, payload = e.status, {'error': e.message}
+                except Exception as e:
+                    status, payload = 500, {'error': f'{type(e).__name__}: {e}'}
+
+                data = json.dumps(payload).encode()
+                head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                writer.write(head.encode('latin-1') + data)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, body):
+
+        '''
+        Routes a request to the matching endpoint
+
+        Parameters
+        ----------
+        method (str):
+            The HTTP method
+        target (str):
+            The request path and query string
+        headers (str:str{}):
+            The request headers (lower-case names)
+        body (bytes):
+            The request body
+
+        Returns
+        -------
+        status (int):
+            The HTTP status code
+        payload (dict):
+            The JSON-serializable response body
+        '''
+
+        try:
+            url = urllib.parse.urlsplit(target)
+        except ValueError:
+            raise HTTPError(400, 'Malformed request target')
+        parts = [p for p in url.path.split('/') if p]
+        tenant = headers.get('x-tenant', 'default')
+
+        with profiling.span('service.request'):
+            if parts == ['categories']:
+                if method != 'GET':
+                    raise HTTPError(405, 'Use GET')
+                query = urllib.parse.parse_qs(url.query)
+                return 200, self.search_categories(query.get('q', [''])[0], query.get('country', ['US'])[0])
+
+            if parts == ['plans']:
+                if method != 'POST':
+                    raise HTTPError(405, 'Use POST')
+                return 201, self.create_plan(tenant, self.read_json(body)).to_dict()
+
+            if len(parts) == 2 and parts[0] == 'plans':
+                if method != 'GET':
+                    raise HTTPError(405, 'Use GET')
+                return 200, self.get_plan(tenant, parts[1]).to_dict()
+
+            if len(parts) == 3 and parts[0] == 'plans' and parts[2] == 'search':
+                if method != 'POST':
+                    raise HTTPError(405, 'Use POST')
+                return 200, await self.search(tenant, parts[1], self.read_json(body))
+
+        raise HTTPError(404, 'Unknown endpoint')
+
+    def read_json(self, body):
+
+        '''
+        Decodes a JSON request body
+
+        Parameters
+        ----------
+        body (bytes):
+            The request body
+
+        Returns
+        -------
+        The decoded JSON object (an empty dictionary for an empty body)
+        '''
+
+        if not body:
+            return {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, 'Request body must be JSON')
+        if type(data) is not dict:
+            raise HTTPError(400, 'Request body must be a JSON object')
+        return data
+
+    def search_categories(self, text, country):
+
+        '''
+        Finds the categories available in a country whose title contains the search text
+
+        Parameters
+        ----------
+        text (str):
+            The text to search for (case-insensitive)
+        country (str):
+            The two-letter country code
+
+        Returns
+        -------
+        A dictionary with the list of matching categories, sorted by title
+        '''
+
+        view = self.view(country)
+        text = text.lower()
+        found = [cat for cat in self.cat_tree.nodes.values() if text in cat.title.lower() and cat in view]
+
+        return {'categories': [{'alias': cat.alias, 'title': cat.title, 'parents': cat.parents, 'has_children': bool(view.children(cat))} for cat in sorted(found)]}
+
+    def create_plan(self, tenant, data):
+
+        '''
+        Creates a plan from a list of activities
+
+        Parameters
+        ----------
+        tenant (str):
+            The tenant creating the plan
+        data (dict):
+            The decoded request body
+
+        Returns
+        -------
+        The new Plan object
+        '''
+
+        country = data.get('country', 'US')
+        if type(country) is not str:
+            raise HTTPError(400, '"country" must be a two-letter country code')
+        country = country.upper()
+        view = self.view(country)
+        activities = data.get('activities')
+        if not activities or type(activities) is not list:
+            raise HTTPError(400, '"activities" must be a non-empty list')
+
+        a_list = ActivityList()
+        for entry in activities:
+            if type(entry) is not dict:
+                raise HTTPError(400, 'Each activity must be a JSON object')
+
+            alias = entry.get('category')
+            category = self.cat_tree.nodes.get(alias) if type(alias) is str else None
+            if category is None:
+                raise HTTPError(400, f"Unknown category: {entry.get('category')}")
+            if category not in view:
+                raise HTTPError(400, f"Category {category.alias} is not available in {country}")
+
+            # Activities without a priority go to the end of the list
+            prio = entry.get('priority', len(a_list) + 1)
+            if type(prio) is not int or prio < 1 or prio > len(a_list) + 1:
+                raise HTTPError(400, f"Priority must be an integer between 1 and {len(a_list) + 1}")
+
+            name = entry.get('name', category.title)
+            if type(name) is not str:
+                raise HTTPError(400, '"name" must be a string')
+            expand = entry.get('expand', False)
+            if type(expand) is not bool:
+                raise HTTPError(400, '"expand" must be true or false')
+
+            a_list.add_to_list(Activity(name, prio, category, expand))
+
+        plan = Plan(str(next(self._ids)), country, a_list)
+        self.plans.setdefault(tenant, {})[plan.plan_id] = plan
+        self._plan_order.append((tenant, plan.plan_id))
+
+        # Drop the oldest plans once too many are kept
+        while len(self._plan_order) > MAX_PLANS:
+            old_tenant, old_id = self._plan_order.popleft()
+            tenant_plans = self.plans[old_tenant]
+            del tenant_plans[old_id]
+            if not tenant_plans:
+                del self.plans[old_tenant]
+
+        return plan
+
+    def get_plan(self, tenant, plan_id):
+
+        '''
+        Finds a plan of a tenant
+
+        Parameters
+        ----------
+        tenant (str):
+            The tenant owning the plan
+        plan_id (str):
+            The id of the plan
+
+        Returns
+        -------
+        The Plan object
+        '''
+
+        plan = self.plans.get(tenant, {}).get(plan_id)
+        if plan is None:
+            raise HTTPError(404, f"Plan {plan_id} not found")
+        return plan
+
+    async def search(self, tenant, plan_id, data):
+
+        '''
+        Searches Yelp for every activity of a plan. The search runs in the thread pool, limited per tenant
+
+        Parameters
+        ----------
+        tenant (str):
+            The tenant owning the plan
+        plan_id (str):
+            The id of the plan
+        data (dict):
+            The decoded request body with the "address", "radius" (meters) and "sort" search criteria
+
+        Returns
+        -------
+        A dictionary with the plan id and the activities with their assigned businesses
+        '''
+
+        plan = self.get_plan(tenant, plan_id)
+
+        address = data.get('address')
+        if not address or type(address) is not str:
+            raise HTTPError(400, '"address" is required')
+        radius = data.get('radius', 16090)
+        if type(radius) is not int or radius < 1 or radius > MAX_RADIUS:
+            raise HTTPError(400, f'"radius" must be an integer number of meters between 1 and {MAX_RADIUS}')
+        sort = data.get('sort', 'review_count')
+        if sort not in SORT_TYPES:
+            raise HTTPError(400, f'"sort" must be one of {", ".join(SORT_TYPES)}')
+
+        if tenant not in self._tenant_slots:
+            self._tenant_slots[tenant] = asyncio.Semaphore(self.tenant_limit)
+
+        async with self._tenant_slots[tenant]:
+            loop = asyncio.get_running_loop()
+            activities = await loop.run_in_executor(self.executor, self.search_plan, plan, address, radius, sort)
+
+        plan.results = {'address': address, 'radius': radius, 'sort': sort, 'activities': [activity_to_dict(a) for a in activities]}
+        return dict(plan.results, plan_id=plan.plan_id)
+
+    def search_plan(self, plan, address, radius, sort):
+
+        '''
+        Runs the blocking Yelp search of a plan (called from the thread pool). Searches copies of the activities so concurrent searches of one plan do not interfere
+
+        Parameters
+        ----------
+        plan (Plan):
+            The plan to search
+        address (str):
+            The search address
+        radius (int):
+            The search radius in meters
+        sort (str):
+            The sort type when searching the Yelp database
+
+        Returns
+        -------
+        The list of searched Activity objects with their assigned businesses
+        '''
+
+        activities = [Activity(a.name, a.prio, a.category, a.expand) for a in plan.a_list.list]
+
+        view = self.view(plan.country)
+        handler = YelpAPIHandler(self.api_key, address, radius, view, self.cat_tree, client=self.client, latency=self.latency, caller=self.caller)
+        handler.result_cache = self.result_cache
+        handler.hedge = self.hedge
+        handler.API_call(activities, sort)
+
+        return activities
+
+    async def serve(self, host, port):
+
+        '''
+        Starts the HTTP server and serves requests until cancelled
+
+        Parameters
+        ----------
+        host (str):
+            The interface to listen on
+        port (int):
+            The port to listen on
+
+        Returns
+        -------
+        None
+        '''
+
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print(f"Yelist service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+def load_tree(categories_file):
+
+    '''
+    Loads the category tree shared by the whole process
+
+    Parameters
+    ----------
+    categories_file (str):
+        The JSON file name containing the categories
+
+    Returns
+    -------
+    The CategoryTree object
+    '''
+
+    with open(categories_file) as __file:
+        return CategoryTree(json.load(__file))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Yelist planner over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=64, help="threads running Yelp searches (default: 64)")
+    parser.add_argument('--stub', action='store_true', help="use the local stand-in for the Yelp API")
+    parser.add_argument('--hedge', action='store_true', help="send a duplicate of YelpAPI calls slower than the p95 latency observed across searches")
+    args = parser.parse_args()
+
+    if args.stub:
+        from stub_yelp import StubYelpAPI
+        service = PlannerService(load_tree("categories.json"), client=StubYelpAPI(latency=0.05), max_workers=args.workers, hedge=args.hedge)
+    else:
+        import config
+        service = PlannerService(load_tree("categories.json"), api_key=config.yelp_api_key, max_workers=args.workers, hedge=args.hedge)
+
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
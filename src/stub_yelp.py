@@ -0,0 +1,163 @@
+'''
+This program contains a local stand-in for the YelpAPI client. It returns deterministic, Yelp-shaped responses without network access or an API key, so the service, benchmarks and batch modes can be exercised offline.
+'''
+
+import hashlib
+import math
+import random
+import threading
+import time
+
+# Coordinates used for every search address (downtown San Francisco)
+DEFAULT_CENTER = {'latitude': 37.7749, 'longitude': -122.4194}
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = 111320
+
+class StubYelpAPI():
+
+    '''
+    A class with the same search_query() and business_query() methods as the YelpAPI client, backed by generated businesses.
+
+    Attributes
+    ----------
+    latency (float):
+        The simulated network latency of each call in seconds
+    max_businesses (int):
+        The largest number of businesses generated for a category
+    calls (int):
+        The number of calls made to the stand-in
+    '''
+
+    def __init__(self, latency=0.0, max_businesses=120):
+
+        '''
+        Constructs the StubYelpAPI object
+
+        Parameters
+        ----------
+        latency (float):
+            The simulated network latency of each call in seconds
+        max_businesses (int):
+            The largest number of businesses generated for a category
+
+        Returns
+        -------
+        None
+        '''
+
+        self.latency = latency
+        self.max_businesses = max_businesses
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, location, category):
+
+        '''
+        Generates the businesses of one category around a location. The same location and category always produce the same businesses
+
+        Parameters
+        ----------
+        location (str):
+            The search address
+        category (str):
+            The category alias
+
+        Returns
+        -------
+        A list of Yelp-shaped business dictionaries
+        '''
+
+        seed = int(hashlib.md5(f'{location}|{category}'.encode()).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        businesses = []
+
+        for i in range(rng.randint(0, self.max_businesses)):
+
+            # Spread businesses up to 30 km from the center, denser close in
+            distance = 30000 * rng.random() ** 2
+            bearing = rng.uniform(0, 2 * math.pi)
+            latitude = DEFAULT_CENTER['latitude'] + distance * math.cos(bearing) / METERS_PER_DEGREE
+            longitude = DEFAULT_CENTER['longitude'] + distance * math.sin(bearing) / (METERS_PER_DEGREE * math.cos(math.radians(DEFAULT_CENTER['latitude'])))
+            business_id = f'{category}-{seed % 10000}-{i}'
+
+            businesses.append({
+                'id': business_id,
+                'alias': business_id,
+                'name': f'{category.title()} Spot {i + 1}',
+                'url': f'https://www.yelp.com/biz/{business_id}',
+                'review_count': int(rng.paretovariate(1.2) * 5),
+                'rating': rng.choice([2.5, 3.0, 3.5, 4.0, 4.0, 4.5, 4.5, 5.0]),
+                'categories': [{'alias': category, 'title': category.title()}],
+                'coordinates': {'latitude': latitude, 'longitude': longitude},
+                'location': {'display_address': [f'{rng.randint(1, 9999)} Market St', 'San Francisco, CA 94103']},
+                'distance': distance,
+            })
+
+        return businesses
+
+    def search_query(self, location='', categories='', radius=40000, sort_by='best_match', limit=20, offset=0, **kwargs):
+
+        '''
+        Searches the generated businesses like the YelpAPI search_query() method
+
+        Parameters
+        ----------
+        location (str):
+            The search address
+        categories (str):
+            A comma-separated list of category aliases
+        radius (int):
+            The search radius in meters
+        sort_by (str):
+            The sort type (review_count, rating, distance or best_match)
+        limit (int):
+            The maximum number of businesses returned
+        offset (int):
+            The number of businesses to skip
+
+        Returns
+        -------
+        A Yelp-shaped search response dictionary
+        '''
+
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        found = {}
+        for alias in categories.split(','):
+            for b in self.generate(location, alias):
+                if b['distance'] <= radius:
+                    found[b['id']] = b
+        found = list(found.values())
+
+        if sort_by == 'distance':
+            found.sort(key=lambda b: b['distance'])
+        elif sort_by in ('rating', 'review_count'):
+            found.sort(key=lambda b: (-b[sort_by], b['distance']))
+
+        return {'businesses': found[offset:offset + limit], 'total': len(found), 'region': {'center': dict(DEFAULT_CENTER)}}
+
+    def business_query(self, id, **kwargs):
+
+        '''
+        Returns the details of a generated business like the YelpAPI business_query() method. Every business is open 09:00-21:00
+
+        Parameters
+        ----------
+        id (str):
+            The business id
+
+        Returns
+        -------
+        A Yelp-shaped business details dictionary
+        '''
+
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        return {'id': id, 'hours': [{'hours_type': 'REGULAR', 'is_open_now': True, 'open': [{'is_overnight': False, 'start': '0900', 'end': '2100', 'day': day} for day in range(7)]}]}
@@ -0,0 +1,618 @@
+'''
+This program runs batches of plans across a pool of worker processes.
+
+The category taxonomy is built once in the parent process and copied into shared memory as flat arrays: the aliases and titles in one UTF-8 blob with offset arrays, the parent and child links in compressed sparse row form, the country bitsets, and one ancestor bitset row per category. Workers attach to the shared block without copying it and answer category lookups, country checks and is_descendant() checks straight from the arrays, so the memory of each worker does not grow with the size of the taxonomy.
+
+Run with "python worker_pool.py plans.json --processes 4" where plans.json is a list of plans in the service format: {"address": "San Francisco", "radius": 16090, "sort": "rating", "country": "US", "activities": [{"name": "Lunch", "category": "pizza"}]}.
+'''
+
+import argparse
+import json
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+
+from yelp_categories import Category, CategoryTree, OTHER_COUNTRIES
+
+MAGIC = 0x59454c49
+
+# magic, categories, parent links, child links, ancestor row bytes, string bytes, metadata bytes
+HEADER = struct.Struct('<7q')
+
+def layout(n, parent_links, child_links, row_bytes, string_bytes, meta_bytes):
+
+    '''
+    Computes the byte offset of each array in the shared memory block. Every array starts on an 8-byte boundary
+
+    Parameters
+    ----------
+    n (int):
+        The number of categories
+    parent_links (int):
+        The number of category-parent links
+    child_links (int):
+        The number of category-child links
+    row_bytes (int):
+        The size of one ancestor bitset row in bytes
+    string_bytes (int):
+        The size of the alias/title blob in bytes
+    meta_bytes (int):
+        The size of the JSON metadata in bytes
+
+    Returns
+    -------
+    offsets (str:(int, int){}):
+        A dictionary containing array name, (start, end) byte offset pairs
+    size (int):
+        The total size of the block in bytes
+    '''
+
+    sections = [
+        ('alias_off', 4 * (n + 1)),
+        ('title_off', 4 * (n + 1)),
+        ('parent_ptr', 4 * (n + 1)),
+        ('parent_idx', 4 * parent_links),
+        ('child_ptr', 4 * (n + 1)),
+        ('child_idx', 4 * child_links),
+        ('sorted_alias', 4 * n),
+        ('country_mask', 8 * n),
+        ('ancestors', row_bytes * n),
+        ('strings', string_bytes),
+        ('meta', meta_bytes),
+    ]
+
+    offsets = {}
+    position = HEADER.size
+    for name, length in sections:
+        position = (position + 7) & ~7
+        offsets[name] = (position, position + length)
+        position += length
+
+    return offsets, position
+
+def attach_block(name):
+
+    '''
+    Attaches to an existing shared memory block without taking ownership of it (only the creating process unlinks it)
+
+    Parameters
+    ----------
+    name (str):
+        The name of the shared memory block
+
+    Returns
+    -------
+    The SharedMemory object
+    '''
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # Python < 3.13 always registers attached blocks, but pool workers share the resource tracker of the parent, which unregisters the block when it unlinks it
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+class SharedCategoryTree():
+
+    '''
+    A class to read a category taxonomy stored as flat arrays in shared memory. Offers the CategoryTree lookups used by YelpAPIHandler.
+
+    Attributes
+    ----------
+    shm (SharedMemory):
+        The shared memory block holding the arrays
+    n (int):
+        The number of categories
+    country_bits (str:int{}):
+        A dictionary containing country code, bit index pairs used by the country bitsets
+    '''
+
+    def __init__(self, shm):
+
+        '''
+        Constructs the SharedCategoryTree object over a shared memory block (see create() and attach())
+
+        Parameters
+        ----------
+        shm (SharedMemory):
+            The shared memory block holding the arrays
+
+        Returns
+        -------
+        None
+        '''
+
+        self.shm = shm
+        magic, self.n, parent_links, child_links, self.row_bytes, string_bytes, meta_bytes = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            raise Exception("Shared memory block does not hold a category tree")
+
+        offsets, size = layout(self.n, parent_links, child_links, self.row_bytes, string_bytes, meta_bytes)
+        buf = shm.buf
+
+        # Zero-copy views into the shared block
+        self.alias_off = buf[slice(*offsets['alias_off'])].cast('i')
+        self.title_off = buf[slice(*offsets['title_off'])].cast('i')
+        self.parent_ptr = buf[slice(*offsets['parent_ptr'])].cast('i')
+        self.parent_idx = buf[slice(*offsets['parent_idx'])].cast('i')
+        self.child_ptr = buf[slice(*offsets['child_ptr'])].cast('i')
+        self.child_idx = buf[slice(*offsets['child_idx'])].cast('i')
+        self.sorted_alias = buf[slice(*offsets['sorted_alias'])].cast('i')
+        self.country_mask = buf[slice(*offsets['country_mask'])].cast('Q')
+        self.ancestors = buf[slice(*offsets['ancestors'])]
+        self.strings = buf[slice(*offsets['strings'])]
+
+        self.country_bits = json.loads(bytes(buf[slice(*offsets['meta'])]))['country_bits']
+        self._categories = {}
+        self._country_views = {}
+
+    def __repr__(self):
+        return f"Shared category tree of size: {self.n}"
+
+    def __len__(self):
+        return self.n
+
+    @classmethod
+    def create(cls, cat_tree):
+
+        '''
+        Copies a CategoryTree into a new shared memory block
+
+        Parameters
+        ----------
+        cat_tree (CategoryTree):
+            The category tree to share
+
+        Returns
+        -------
+        The SharedCategoryTree object owning the new block (call close() and unlink() when done)
+        '''
+
+        cats = cat_tree.by_index
+        n = len(cats)
+        row_bytes = (n + 7) // 8
+
+        # Aliases and titles share one UTF-8 blob, each with its own offset array
+        strings = bytearray()
+        alias_off = [0] * (n + 1)
+        title_off = [0] * (n + 1)
+        for cat in cats:
+            alias_off[cat.index] = len(strings)
+            strings += cat.alias.encode()
+        alias_off[n] = len(strings)
+        for cat in cats:
+            title_off[cat.index] = len(strings)
+            strings += cat.title.encode()
+        title_off[n] = len(strings)
+
+        # Parent and child links in compressed sparse row form
+        parent_ptr, parent_idx, child_ptr, child_idx = [0], [], [0], []
+        for cat in cats:
+            parent_idx += [cat_tree.nodes[p].index for p in cat.parents]
+            parent_ptr.append(len(parent_idx))
+            child_idx += [child.index for child in cat.children]
+            child_ptr.append(len(child_idx))
+
+        meta = json.dumps({'country_bits': cat_tree.country_bits}).encode()
+
+        offsets, size = layout(n, len(parent_idx), len(child_idx), row_bytes, len(strings), len(meta))
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        buf = shm.buf
+
+        HEADER.pack_into(buf, 0, MAGIC, n, len(parent_idx), len(child_idx), row_bytes, len(strings), len(meta))
+        for name, values, fmt in [('alias_off', alias_off, 'i'), ('title_off', title_off, 'i'), ('parent_ptr', parent_ptr, 'i'), ('parent_idx', parent_idx, 'i'), ('child_ptr', child_ptr, 'i'), ('child_idx', child_idx, 'i'), ('sorted_alias', [cat.index for cat in sorted(cats, key=lambda c: c.alias.encode())], 'i'), ('country_mask', [cat.country_mask for cat in cats], 'Q')]:
+            start = offsets[name][0]
+            struct.pack_into(f'<{len(values)}{fmt}', buf, start, *values)
+
+        start = offsets['ancestors'][0]
+        for cat in cats:
+            row = start + cat.index * row_bytes
+            buf[row:row + row_bytes] = cat.ancestor_mask.to_bytes(row_bytes, 'little')
+
+        buf[slice(*offsets['strings'])] = strings
+        buf[slice(*offsets['meta'])] = meta
+
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name):
+
+        '''
+        Attaches to a shared category tree created by another process
+
+        Parameters
+        ----------
+        name (str):
+            The name of the shared memory block
+
+        Returns
+        -------
+        The SharedCategoryTree object
+        '''
+
+        return cls(attach_block(name))
+
+    def release(self):
+
+        '''
+        Releases the views into the shared memory block and closes it (the block itself is only removed by unlink())
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+
+        for view in ['alias_off', 'title_off', 'parent_ptr', 'parent_idx', 'child_ptr', 'child_idx', 'sorted_alias', 'country_mask', 'ancestors', 'strings']:
+            getattr(self, view).release()
+        self._categories = {}
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    def alias(self, i):
+        return str(self.strings[self.alias_off[i]:self.alias_off[i + 1]], 'utf-8')
+
+    def title(self, i):
+        return str(self.strings[self.title_off[i]:self.title_off[i + 1]], 'utf-8')
+
+    def find(self, alias):
+
+        '''
+        Finds the index of a category by binary search over the aliases (no per-process dictionary is built)
+
+        Parameters
+        ----------
+        alias (str):
+            The category alias
+
+        Returns
+        -------
+        The index of the category OR -1 if the alias is unknown
+        '''
+
+        key = alias.encode()
+        low, high = 0, self.n
+        while low < high:
+            mid = (low + high) // 2
+            i = self.sorted_alias[mid]
+            current = bytes(self.strings[self.alias_off[i]:self.alias_off[i + 1]])
+            if current < key:
+                low = mid + 1
+            elif current > key:
+                high = mid
+            else:
+                return i
+        return -1
+
+    def category(self, alias):
+
+        '''
+        Creates the Category object of an alias. Only the categories a worker actually uses are materialized, and they are reused
+
+        Parameters
+        ----------
+        alias (str):
+            The category alias
+
+        Returns
+        -------
+        The Category object (with index and country_mask set) OR None if the alias is unknown
+        '''
+
+        if alias not in self._categories:
+            i = self.find(alias)
+            if i < 0:
+                return None
+            cat = Category(alias, self.title(i), [self.alias(p) for p in self.parent_idx[self.parent_ptr[i]:self.parent_ptr[i + 1]]])
+            cat.index = i
+            cat.country_mask = self.country_mask[i]
+            self._categories[alias] = cat
+
+        return self._categories[alias]
+
+    def country_view(self, country):
+
+        '''
+        Returns the view of the shared tree filtered to the categories available in a country
+
+        Parameters
+        ----------
+        country (str):
+            A two-letter country code (e.g., "US")
+
+        Returns
+        -------
+        The SharedCountryView object for the country
+        '''
+
+        country = country.upper()
+        if country not in self._country_views:
+            self._country_views[country] = SharedCountryView(1 << self.country_bits.get(country, OTHER_COUNTRIES), country)
+        return self._country_views[country]
+
+    def is_descendant(self, category, ancestor):
+
+        '''
+        Checks if a category is the same as, or falls under, another category using the shared ancestor bitset rows
+
+        Parameters
+        ----------
+        category (Category OR str):
+            The category (or category alias) to check
+        ancestor (Category OR str):
+            The possible ancestor category (or category alias)
+
+        Returns
+        -------
+        Boolean value (False if either alias is unknown)
+        '''
+
+        i = self.find(category) if type(category) is str else category.index
+        j = self.find(ancestor) if type(ancestor) is str else ancestor.index
+        if i < 0 or j < 0:
+            return False
+
+        return bool(self.ancestors[i * self.row_bytes + (j >> 3)] >> (j & 7) & 1)
+
+    def matches(self, aliases, category):
+        return any(self.is_descendant(alias, category) for alias in aliases)
+
+    def expand(self, category, limit=5, view=None, weights=None):
+
+        '''
+        Expands a category into its most populated leaf categories (same ordering as CategoryTree.expand())
+
+        Parameters
+        ----------
+        category (Category):
+            The category to expand
+        limit (int):
+            The maximum number of leaf categories to return
+        view (SharedCountryView):
+            Only return leaf categories available in this view (None for all)
+        weights (str:float{}):
+            A dictionary containing category alias, popularity pairs (0 for categories missing from it)
+
+        Returns
+        -------
+        A list of up to limit leaf Category objects under the category, most populated first
+        '''
+
+        # Walk the child links below the category
+        seen = {category.index}
+        stack = [category.index]
+        leaves = []
+        while stack:
+            i = stack.pop()
+            children = self.child_idx[self.child_ptr[i]:self.child_ptr[i + 1]]
+            if not children and i != category.index and (view is None or self.country_mask[i] & view.bit):
+                leaves.append(i)
+            for child in children:
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+
+        if weights is None:
+            leaves.sort(key=lambda i: (-self.country_mask[i].bit_count(), self.title(i)))
+        else:
+            leaves.sort(key=lambda i: (-weights.get(self.alias(i), 0), -self.country_mask[i].bit_count(), self.title(i)))
+
+        return [self.category(self.alias(i)) for i in leaves[:limit]]
+
+class SharedCountryView():
+
+    '''
+    A class to check if categories of a SharedCategoryTree are available in a country.
+
+    Attributes
+    ----------
+    bit (int):
+        The bitset value of the country
+    country (str):
+        The two-letter country code of the view
+    '''
+
+    def __init__(self, bit, country):
+        self.bit = bit
+        self.country = country
+
+    def __contains__(self, category):
+        return bool(category.country_mask & self.bit)
+
+class PlanError(Exception):
+
+    '''
+    Raised for a malformed plan, which is reported in its result instead of failing the batch
+    '''
+
+# The state of a worker process, set by init_worker()
+_worker = {}
+
+def init_worker(name, api_key, client_factory):
+
+    '''
+    Attaches a worker process to the shared category tree (pool initializer)
+
+    Parameters
+    ----------
+    name (str):
+        The name of the shared memory block
+    api_key (str):
+        YelpAPI key
+    client_factory (callable):
+        A picklable callable returning a client with the YelpAPI search_query() method (None to use YelpAPI)
+
+    Returns
+    -------
+    None
+    '''
+
+    _worker['tree'] = SharedCategoryTree.attach(name)
+    _worker['api_key'] = api_key
+    _worker['client'] = client_factory() if client_factory is not None else None
+
+def run_plan(plan):
+
+    '''
+    Searches Yelp for one plan inside a worker process
+
+    Parameters
+    ----------
+    plan (dict):
+        The plan in the service format
+
+    Returns
+    -------
+    A dictionary with the search criteria and the activities with their assigned businesses (or an "error" entry)
+    '''
+
+    from Yelist import YelpAPIHandler
+    from service import activity_to_dict
+
+    tree = _worker['tree']
+    try:
+        a_list, view, address, radius, sort = parse_plan(plan, tree)
+    except PlanError as e:
+        return {'error': str(e)}
+
+    handler = YelpAPIHandler(_worker['api_key'], address, radius, view, tree, client=_worker['client'])
+    handler.API_call(a_list.list, sort)
+
+    return {'address': address, 'radius': radius, 'sort': sort, 'activities': [activity_to_dict(a) for a in a_list.list]}
+
+def parse_plan(plan, tree):
+
+    '''
+    Checks a plan the way the service checks its requests (see PlannerService.create_plan() and search()) and builds its activity list
+
+    Parameters
+    ----------
+    plan (dict):
+        The plan in the service format
+    tree (SharedCategoryTree):
+        The category tree
+
+    Returns
+    -------
+    a_list (ActivityList):
+        The activity list of the plan
+    view (SharedCountryView):
+        The view of the country searched
+    address (str):
+        The search address
+    radius (int):
+        The search radius in meters
+    sort (str):
+        The sort type when searching the Yelp database
+    '''
+
+    from Yelist import Activity, ActivityList
+    from service import MAX_RADIUS, SORT_TYPES
+
+    if type(plan) is not dict:
+        raise PlanError('A plan must be a JSON object')
+
+    country = plan.get('country', 'US')
+    if type(country) is not str:
+        raise PlanError('"country" must be a two-letter country code')
+    view = tree.country_view(country)
+
+    address = plan.get('address')
+    if not address or type(address) is not str:
+        raise PlanError('"address" is required')
+    radius = plan.get('radius', 16090)
+    if type(radius) is not int or radius < 1 or radius > MAX_RADIUS:
+        raise PlanError(f'"radius" must be an integer number of meters between 1 and {MAX_RADIUS}')
+    sort = plan.get('sort', 'review_count')
+    if sort not in SORT_TYPES:
+        raise PlanError(f'"sort" must be one of {", ".join(SORT_TYPES)}')
+
+    activities = plan.get('activities')
+    if not activities or type(activities) is not list:
+        raise PlanError('"activities" must be a non-empty list')
+
+    a_list = ActivityList()
+    for entry in activities:
+        if type(entry) is not dict:
+            raise PlanError('Each activity must be a JSON object')
+
+        alias = entry.get('category')
+        category = tree.category(alias) if type(alias) is str else None
+        if category is None:
+            raise PlanError(f"Unknown category: {alias}")
+        if category not in view:
+            raise PlanError(f"Category {category.alias} is not available in {country.upper()}")
+
+        # Activities without a priority go to the end of the list
+        prio = entry.get('priority', len(a_list) + 1)
+        if type(prio) is not int or prio < 1 or prio > len(a_list) + 1:
+            raise PlanError(f"Priority must be an integer between 1 and {len(a_list) + 1}")
+        name = entry.get('name', category.title)
+        if type(name) is not str:
+            raise PlanError('"name" must be a string')
+        expand = entry.get('expand', False)
+        if type(expand) is not bool:
+            raise PlanError('"expand" must be true or false')
+
+        a_list.add_to_list(Activity(name, prio, category, expand))
+
+    return a_list, view, address, radius, sort
+
+def run_batch(plans, cat_tree, api_key=None, client_factory=None, processes=None, chunksize=4):
+
+    '''
+    Searches Yelp for a batch of plans across a pool of worker processes sharing one copy of the category tree
+
+    Parameters
+    ----------
+    plans (dict[]):
+        The plans in the service format
+    cat_tree (CategoryTree):
+        The category tree, built once in this process
+    api_key (str):
+        YelpAPI key
+    client_factory (callable):
+        A picklable callable returning a client with the YelpAPI search_query() method (None to use YelpAPI)
+    processes (int):
+        The number of worker processes (None for one per core)
+    chunksize (int):
+        The number of plans sent to a worker at a time
+
+    Returns
+    -------
+    A list of the plan results, in the order of the plans
+    '''
+
+    shared = SharedCategoryTree.create(cat_tree)
+    try:
+        with multiprocessing.Pool(processes, initializer=init_worker, initargs=(shared.shm.name, api_key, client_factory)) as pool:
+            return pool.map(run_plan, plans, chunksize)
+    finally:
+        shared.release()
+        shared.unlink()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search Yelp for a batch of plans across worker processes")
+    parser.add_argument('plans', help="JSON file containing a list of plans")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes (default: one per core)")
+    parser.add_argument('--stub', action='store_true', help="use the local stand-in for the Yelp API")
+    args = parser.parse_args()
+
+    with open(args.plans) as plans_file:
+        plans = json.load(plans_file)
+    with open("categories.json") as __file:
+        cat_tree = CategoryTree(json.load(__file))
+
+    if args.stub:
+        from stub_yelp import StubYelpAPI
+        results = run_batch(plans, cat_tree, client_factory=StubYelpAPI, processes=args.processes)
+    else:
+        import config
+        results = run_batch(plans, cat_tree, api_key=config.yelp_api_key, processes=args.processes)
+
+    print(json.dumps(results, indent=4))
@@ -2,8 +2,83 @@
 This program contains the objects that take the Yelp business categories listed in the categories.json file and creates a category tree based on the category-subcategory relationships (referenced as parent-child relationships throughout the comments). 
 
 A Category object is created for to manage each category and then mapped together in the CategoryTree object.
+
+Yelp only returns results for some categories in certain countries. Each Category keeps its country whitelist/blacklist, and the CategoryTree precomputes a country bitset for every category so a CountryView can filter the tree for a search locale in O(1) per category.
+
+Categories can have several parents, so the tree is really a directed acyclic graph. The CategoryTree also precomputes ancestor and descendant bitsets for every category, which makes is_descendant() checks O(1) and lets a broad category be expanded into its leaf categories.
 '''
 
+import unicodedata
+from operator import attrgetter
+
+# Bit 0 of a country bitset stands for every country not named in any whitelist or blacklist
+OTHER_COUNTRIES = 0
+
+# The number of rows of a page when a long level of the category tree is printed in columns
+PAGE_ROWS = 20
+
+def collation_key(title):
+
+    '''
+    Returns the key categories are sorted by: the title without case or accents, so "ATV Rentals/Tours" sorts between "Active Life" and "Auto Repair", then the title itself to break ties
+
+    Parameters
+    ----------
+    title (str):
+        The category title
+
+    Returns
+    -------
+    A tuple of the folded title and the title
+    '''
+
+    folded = ''.join(char for char in unicodedata.normalize('NFKD', title) if not unicodedata.combining(char))
+    return folded.casefold(), title
+
+def format_level(categories, page=0, width=80, rows=PAGE_ROWS):
+
+    '''
+    Formats one level of the category tree as a single block of text. Levels of up to rows categories are listed one per line, longer levels are laid out in columns that fit the width (sorted down each column) and split into pages of rows lines
+
+    Parameters
+    ----------
+    categories (Category[]):
+        The sorted categories of the level
+    page (int):
+        The page to format (long levels only)
+    width (int):
+        The width of the terminal in characters
+    rows (int):
+        The most lines of a page
+
+    Returns
+    -------
+    text (str):
+        The formatted page
+    pages (int):
+        The number of pages of the level
+    '''
+
+    titles = [cat.title for cat in categories]
+    if len(titles) <= rows:
+        return ''.join(title + '\n' for title in titles), 1
+
+    column = max(len(title) for title in titles) + 2
+    columns = max(1, width // column)
+    per_page = rows * columns
+    pages = -(-len(titles) // per_page)
+    titles = titles[page * per_page:(page + 1) * per_page]
+
+    # Fill the page column by column, so the titles still read in order from top to bottom
+    height = -(-len(titles) // columns)
+    lines = []
+    for row in range(height):
+        cells = titles[row::height]
+        lines.append(''.join(title.ljust(column) for title in cells[:-1]) + cells[-1] + '\n')
+    if pages > 1:
+        lines.append(f'\n(Page {page + 1} of {pages}, enter "MORE" to see more categories)\n')
+    return ''.join(lines), pages
+
 class Category():
 
     '''
@@ -19,9 +94,23 @@ class Category():
         A list of aliases of the parent categories (defined by YelpAPI)
     children (Category[]):
         A list of Category objects of the children categories (defined by YelpAPI)
+    country_whitelist (str[]):
+        A list of the only country codes the category is available in (defined by YelpAPI, None if unrestricted)
+    country_blacklist (str[]):
+        A list of country codes the category is not available in (defined by YelpAPI, None if unrestricted)
+    country_mask (int):
+        A bitset of the countries the category and at least one chain of its parent categories are available in (set by the CategoryTree)
+    index (int):
+        The position of the category in the CategoryTree bitsets (set by the CategoryTree)
+    ancestor_mask (int):
+        A bitset of the category and all of its ancestor categories (set by the CategoryTree)
+    descendant_mask (int):
+        A bitset of the category and all of its descendant categories (set by the CategoryTree)
+    sort_key (tuple):
+        The collation key of the title the categories are sorted by
     '''
 
-    def __init__(self, alias, title, parents):
+    def __init__(self, alias, title, parents, country_whitelist=None, country_blacklist=None):
         
         '''
         Constructs the Category object
@@ -34,6 +123,10 @@ class Category():
             The category title (defined by YelpAPI)
         parents (str[]):
             A list of aliases of the parent categories (defined by YelpAPI)
+        country_whitelist (str[]):
+            A list of the only country codes the category is available in (defined by YelpAPI)
+        country_blacklist (str[]):
+            A list of country codes the category is not available in (defined by YelpAPI)
 
         Returns
         -------
@@ -44,18 +137,26 @@ class Category():
         self.title = title
         self.parents = parents
         self.children = []
+        self.country_whitelist = country_whitelist
+        self.country_blacklist = country_blacklist
+        self.country_mask = None
+        self.index = None
+        self.ancestor_mask = None
+        self.descendant_mask = None
+        self.sort_key = collation_key(title)
+        self._sorted_children = None
         
     def __repr__(self):
         return self.title
 
     def __lt__(self, other):
-    	if self.title < other.title:
+    	if self.sort_key < other.sort_key:
     		return True
     	else:
     		return False
 
     def __gt__(self,other):
-    	if self.title > other.title:
+    	if self.sort_key > other.sort_key:
     		return True
     	else:
     		return False
@@ -114,6 +215,25 @@ class Category():
         '''
 
         self.children.append(child)
+        self._sorted_children = None
+
+    def sorted_children(self):
+
+        '''
+        Returns the children categories sorted by title. The sorted list is built the first time a category is browsed and then reused, comparing the precomputed collation keys rather than calling __lt__
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A list of Category objects of the children categories, sorted by title
+        '''
+
+        if self._sorted_children is None:
+            self._sorted_children = sorted(self.children, key=attrgetter('sort_key'))
+        return self._sorted_children
     
 class CategoryTree():
     
@@ -124,8 +244,12 @@ class CategoryTree():
     ----------
     nodes (str:Category{}):
         A dictionary containing category alias, Category object pairs
-    print_output (dict):
-        A nested dictionary structure representing the category tree
+    country_bits (str:int{}):
+        A dictionary containing country code, bit index pairs used by the Category country bitsets
+    by_index (Category[]):
+        A list of the Category objects ordered by their bitset index
+    leaf_mask (int):
+        A bitset of all the categories without children
     '''
     
     def __init__(self, categories):
@@ -147,11 +271,21 @@ class CategoryTree():
 
         # Create a Category object for each store category and add it to the CategoryTree
         for cat in categories:
-            self.add_node(Category(cat['alias'], cat['title'], cat['parents']))
+            self.add_node(Category(cat['alias'], cat['title'], cat['parents'], cat.get('country_whitelist'), cat.get('country_blacklist')))
 
         # Find the children of each category, and create the tree structure
         self.create_children()
-        self.print_output = self.create_tree()
+        self._roots = None
+
+        # Precompute the countries each category is available in
+        self.country_bits = {}
+        self.create_country_masks()
+        self._country_views = {}
+
+        # Precompute the ancestor/descendant bitsets of each category
+        self.by_index = []
+        self.leaf_mask = 0
+        self.create_hierarchy_masks()
         
     def __repr__(self):
         return "Category tree of size: " + str(len(self.nodes))
@@ -191,39 +325,116 @@ class CategoryTree():
             for parent in cat.parents:
                 self.nodes[parent].add_child(cat)
 
-    def traverse_tree(self, node, node_tree):
+    def roots(self):
 
         '''
-        Recursively traverses all branches of a category node
+        Returns the root categories (the top level of the category tree) sorted by title. The sorted list is built on first access and then reused
 
         Parameters
         ----------
-        node (Category):
-        	The category node to be traversed from
-        node_tree (dict):
-        	A nested dictionary structure representing the tree starting from the input category node
+        None
+
+        Returns
+        -------
+        A list of the root Category objects, sorted by title
+        '''
+
+        if self._roots is None:
+            self._roots = sorted((cat for cat in self.nodes.values() if cat.is_root()), key=attrgetter('sort_key'))
+        return self._roots
+
+    def country_bit(self, country):
+
+        '''
+        Finds the bit index of a country in the Category country bitsets
+
+        Parameters
+        ----------
+        country (str):
+            A two-letter country code (e.g., "US")
+
+        Returns
+        -------
+        The bit index of the country
+        '''
+
+        return self.country_bits.get(country.upper(), OTHER_COUNTRIES)
+
+    def create_country_masks(self):
+
+        '''
+        Computes the country bitset of every category. A category is available in a country if its own whitelist/blacklist allows it and at least one of its parent categories is available there
+
+        Parameters
+        ----------
+        None
 
         Returns
         -------
         None
         '''
 
-        # If the node has no child, stop traversal and asign an empty string to the node (end node)
-        if not node.has_child():
-            node_tree[node] = ''
-            return
+        # Give every country named in a whitelist or blacklist its own bit
+        for cat in self.nodes.values():
+            for country in (cat.country_whitelist or []) + (cat.country_blacklist or []):
+                if country not in self.country_bits:
+                    self.country_bits[country] = len(self.country_bits) + 1
 
-        # If the node has children, continue to traverse through each child node
-        else:
-            child_tree = {}
-            for child in node.children:
-                node_tree[node] = child_tree
-                self.traverse_tree(child, child_tree)  
-    
-    def create_tree(self):
+        all_countries = (1 << (len(self.country_bits) + 1)) - 1
+
+        # Resolve the bitsets from the roots down, using an explicit stack (parents before children)
+        for cat in self.nodes.values():
+            stack = [cat]
+            while stack:
+                node = stack[-1]
+                if node.country_mask is not None:
+                    stack.pop()
+                    continue
+                pending = [self.nodes[p] for p in node.parents if self.nodes[p].country_mask is None]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+
+                if node.country_whitelist:
+                    mask = sum(1 << self.country_bits[c] for c in set(node.country_whitelist))
+                else:
+                    mask = all_countries
+                if node.country_blacklist:
+                    mask &= ~sum(1 << self.country_bits[c] for c in set(node.country_blacklist))
+
+                if node.parents:
+                    inherited = 0
+                    for p in node.parents:
+                        inherited |= self.nodes[p].country_mask
+                    mask &= inherited
+
+                node.country_mask = mask
+
+    def country_view(self, country):
 
         '''
-        Creates a nested dictionary representation of a category tree. Calls the traverse_tree() method
+        Returns the view of the category tree filtered to the categories available in a country. Each view is created once per country and reused
+
+        Parameters
+        ----------
+        country (str):
+            A two-letter country code (e.g., "US")
+
+        Returns
+        -------
+        The CountryView object for the country
+        '''
+
+        country = country.upper()
+        if country not in self._country_views:
+            self._country_views[country] = CountryView(self, country)
+        return self._country_views[country]
+
+    def create_hierarchy_masks(self):
+
+        '''
+        Computes the ancestor and descendant bitsets of every category. Each bitset includes the category itself
 
         Parameters
         ----------
@@ -231,18 +442,225 @@ class CategoryTree():
 
         Returns
         -------
-        The nested dictionary representation of a category tree
+        None
         '''
 
-        tree_output = {}
+        for i, cat in enumerate(self.nodes.values()):
+            cat.index = i
+            self.by_index.append(cat)
+            if not cat.has_child():
+                self.leaf_mask |= 1 << i
+
+        # Resolve the ancestor bitsets from the roots down (parents before children)
+        for cat in self.nodes.values():
+            stack = [cat]
+            while stack:
+                node = stack[-1]
+                if node.ancestor_mask is not None:
+                    stack.pop()
+                    continue
+                pending = [self.nodes[p] for p in node.parents if self.nodes[p].ancestor_mask is None]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+
+                mask = 1 << node.index
+                for p in node.parents:
+                    mask |= self.nodes[p].ancestor_mask
+                node.ancestor_mask = mask
+
+        # Resolve the descendant bitsets from the leaves up (children before parents)
         for cat in self.nodes.values():
+            stack = [cat]
+            while stack:
+                node = stack[-1]
+                if node.descendant_mask is not None:
+                    stack.pop()
+                    continue
+                pending = [child for child in node.children if child.descendant_mask is None]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+
+                mask = 1 << node.index
+                for child in node.children:
+                    mask |= child.descendant_mask
+                node.descendant_mask = mask
+
+    def is_descendant(self, category, ancestor):
+
+        '''
+        Checks if a category is the same as, or falls under, another category in O(1)
 
-        	# Starting from each root node, create a category tree
-            if cat.is_root():
-                root_tree = {}
-                self.traverse_tree(cat, root_tree)
+        Parameters
+        ----------
+        category (Category OR str):
+            The category (or category alias) to check
+        ancestor (Category OR str):
+            The possible ancestor category (or category alias)
+
+        Returns
+        -------
+        Boolean value (False if either alias is unknown)
+        '''
+
+        if type(category) is str:
+            category = self.nodes.get(category)
+        if type(ancestor) is str:
+            ancestor = self.nodes.get(ancestor)
+        if category is None or ancestor is None:
+            return False
+
+        return bool(category.ancestor_mask >> ancestor.index & 1)
+
+    def matches(self, aliases, category):
+
+        '''
+        Checks if a business belongs under a category, given the category aliases Yelp lists for the business
+
+        Parameters
+        ----------
+        aliases (str[]):
+            The category aliases of the business
+        category (Category):
+            The category to match against
+
+        Returns
+        -------
+        Boolean value
+        '''
+
+        return any(self.is_descendant(alias, category) for alias in aliases)
+
+    def expand(self, category, limit=5, view=None, weights=None):
+
+        '''
+        Expands a category into its most populated leaf categories, so that a search for a broad category also covers its sub-categories
+
+        Parameters
+        ----------
+        category (Category):
+            The category to expand
+        limit (int):
+            The maximum number of leaf categories to return
+        view (CountryView):
+            Only return leaf categories available in this view (None for all)
+        weights (str:float{}):
+            A dictionary containing category alias, popularity pairs (0 for categories missing from it). If not given, or for equal popularities, leaf categories available in more countries are considered more populated
+
+        Returns
+        -------
+        A list of up to limit leaf Category objects under the category, most populated first
+        '''
+
+        # Walk the set bits of the leaf descendants, excluding the category itself
+        mask = category.descendant_mask & self.leaf_mask & ~(1 << category.index)
+        leaves = []
+        while mask:
+            low = mask & -mask
+            leaf = self.by_index[low.bit_length() - 1]
+            if view is None or leaf in view:
+                leaves.append(leaf)
+            mask ^= low
+
+        if weights is None:
+            leaves.sort(key=lambda leaf: (-leaf.country_mask.bit_count(), leaf.title))
+        else:
+            leaves.sort(key=lambda leaf: (-weights.get(leaf.alias, 0), -leaf.country_mask.bit_count(), leaf.title))
+
+        return leaves[:limit]
+
+class CountryView():
+
+    '''
+    A class to browse a CategoryTree restricted to the categories Yelp supports in one country.
+
+    Attributes
+    ----------
+    tree (CategoryTree):
+        The category tree being filtered
+    country (str):
+        The two-letter country code of the view
+    bit (int):
+        The bitset value of the country, tested against Category.country_mask
+    '''
+
+    def __init__(self, tree, country):
+
+        '''
+        Constructs the CountryView object
+
+        Parameters
+        ----------
+        tree (CategoryTree):
+            The category tree being filtered
+        country (str):
+            The two-letter country code of the view
+
+        Returns
+        -------
+        None
+        '''
+
+        self.tree = tree
+        self.country = country
+        self.bit = 1 << tree.country_bit(country)
+
+        # The filtered levels are computed once, so the view is read-only afterwards (and can be shared between threads)
+        self._roots = [cat for cat in tree.roots() if cat.country_mask & self.bit]
+        self._children = {cat.alias: [child for child in cat.sorted_children() if child.country_mask & self.bit] for cat in tree.nodes.values()}
+
+    def __repr__(self):
+        return f"Category tree view for {self.country}"
+
+    def __contains__(self, category):
+
+        '''
+        Checks if a category is available in the country of the view in O(1)
+
+        Parameters
+        ----------
+        category (Category):
+            The category to check
+
+        Returns
+        -------
+        Boolean value
+        '''
+
+        return bool(category.country_mask & self.bit)
+
+    def roots(self):
+
+        '''
+        Returns the available root categories sorted by title
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        A list of the available root Category objects, sorted by title
+        '''
+
+        return self._roots
+
+    def children(self, category):
+
+        '''
+        Returns the available children of a category sorted by title
+
+        Parameters
+        ----------
+        category (Category):
+            The category to list the children of
+
+        Returns
+        -------
+        A list of the available children Category objects, sorted by title
+        '''
 
-                # Merge the root node tree to the category tree once the entire branch is found
-                tree_output = {**tree_output, **root_tree} 
-                
-        return tree_output
\ No newline at end of file
+        return self._children[category.alias]
@@ -0,0 +1,8 @@
+'''
+Puts the program modules on the import path, the tests are run from the repository root with "python -m pytest".
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
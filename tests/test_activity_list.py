@@ -0,0 +1,69 @@
+'''
+Tests of the ActivityList treap, checked against a plain list doing the same operations.
+'''
+
+import random
+
+import pytest
+
+from Yelist import Activity, ActivityList
+from yelp_categories import Category
+
+CATEGORY = Category('coffee', 'Coffee & Tea', ['food'])
+
+def check_tree(a_list):
+    stack = [(a_list.root, None)]
+    while stack:
+        node, parent = stack.pop()
+        if node is None:
+            continue
+        assert node.parent is parent
+        assert node.size == 1 + ActivityList.size(node.left) + ActivityList.size(node.right)
+        for child in (node.left, node.right):
+            if child is not None:
+                assert child.weight <= node.weight
+            stack.append((child, node))
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_a_list_model(seed):
+    rng = random.Random(seed)
+    random.seed(seed)
+    a_list = ActivityList()
+    model = []
+
+    for step in range(300):
+        op = rng.random()
+        if op < 0.45 or not model:
+            prio = rng.randint(1, len(model) + 1)
+            activity = Activity(f'activity {step}', prio, CATEGORY)
+            a_list.add_to_list(activity)
+            model.insert(prio - 1, activity)
+        elif op < 0.7:
+            prio = rng.randint(1, len(model))
+            removed = a_list.remove_from_list(prio)
+            assert removed is model.pop(prio - 1)
+            assert removed.prio == prio
+        else:
+            prio = rng.randint(1, len(model))
+            new_prio = rng.randint(1, len(model))
+            a_list.change_list_priority(prio, new_prio)
+            model.insert(new_prio - 1, model.pop(prio - 1))
+
+        assert len(a_list) == len(model)
+        assert a_list.list == model
+        assert [a.prio for a in model] == list(range(1, len(model) + 1))
+        if model:
+            prio = rng.randint(1, len(model))
+            assert a_list.activity(prio) is model[prio - 1]
+        check_tree(a_list)
+
+def test_out_of_range_priorities():
+    a_list = ActivityList()
+    first = Activity('first', 5, CATEGORY)
+    a_list.add_to_list(first)
+    second = Activity('second', 0, CATEGORY)
+    a_list.add_to_list(second)
+    assert a_list.list == [second, first]
+
+    with pytest.raises(IndexError):
+        a_list.activity(3)
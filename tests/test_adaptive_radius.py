@@ -0,0 +1,63 @@
+'''
+Tests of the adaptive search radius of YelpAPIHandler.search_category().
+'''
+
+from Yelist import YelpAPIHandler
+from yelp_categories import Category
+
+CATEGORY = Category('coffee', 'Coffee & Tea', ['food'])
+
+class SpreadClient():
+
+    '''
+    Serves businesses at the given distances from the search address, only those within the search radius, and records every call.
+    '''
+
+    def __init__(self, distances):
+        self.distances = sorted(distances)
+        self.params = []
+
+    def search_query(self, **params):
+        self.params.append(params)
+        within = [d for d in self.distances if d <= params['radius']]
+        businesses = [{'id': f'b{d}', 'name': f'business {d}', 'rating': 4.0, 'review_count': 1, 'url': '', 'coordinates': None, 'location': {'display_address': []}, 'distance': float(d)} for d in within]
+        page = businesses[params['offset']:params['offset'] + params['limit']]
+        return {'total': len(within), 'businesses': page}
+
+def adaptive_handler(client):
+    handler = YelpAPIHandler(None, 'San Francisco', 40000, client=client)
+    handler.adaptive = True
+    return handler
+
+def test_widens_while_too_few_results_come_back():
+    client = SpreadClient([1000, 5000, 6000])
+    handler = adaptive_handler(client)
+    found = handler.search_category(CATEGORY, 'rating', needed=3)
+
+    assert [params['radius'] for params in client.params] == [1609, 3218, 6436]
+    assert [b.distance for b in found] == [1000.0, 5000.0, 6000.0]
+    assert handler.report['coffee'] == {'radius': 6436, 'requests': 3, 'results': 3}
+    assert handler.radius == 40000
+
+def test_stops_at_the_largest_radius():
+    client = SpreadClient([1000])
+    handler = adaptive_handler(client)
+    found = handler.search_category(CATEGORY, 'rating', needed=2)
+
+    assert [params['radius'] for params in client.params] == [1609, 3218, 6436, 12872, 25744, 40000]
+    assert len(found) == 1
+    assert handler.report['coffee']['radius'] == 40000
+
+def test_a_dense_category_stays_narrow():
+    client = SpreadClient(range(100, 1600, 100))
+    handler = adaptive_handler(client)
+    found = handler.search_category(CATEGORY, 'rating', needed=5)
+
+    assert [params['radius'] for params in client.params] == [1609]
+    assert len(found) >= 5
+
+    # Without the adaptive search the whole radius is searched at once
+    client = SpreadClient(range(100, 1600, 100))
+    handler = YelpAPIHandler(None, 'San Francisco', 40000, client=client)
+    handler.search_category(CATEGORY, 'rating', needed=5)
+    assert [params['radius'] for params in client.params] == [40000]
@@ -0,0 +1,57 @@
+'''
+Tests of the fan-out search backend.
+'''
+
+import asyncio
+
+from backends import FanOutBackend, SearchBackend
+
+class ListBackend(SearchBackend):
+
+    '''
+    A backend answering from a fixed list of businesses, already in its best-match order
+    '''
+
+    def __init__(self, name, businesses):
+        self.name = name
+        self.businesses = businesses
+        self.params = []
+
+    async def search(self, **params):
+        self.params.append(params)
+        businesses = self.businesses
+        if params.get('sort_by') == 'rating':
+            businesses = sorted(businesses, key=lambda b: -b['rating'])
+        offset = params.get('offset', 0)
+        return {'businesses': businesses[offset:offset + params.get('limit', 20)], 'total': len(businesses), 'region': {}}
+
+def businesses(prefix, ratings):
+    return [{'id': f'{prefix}{i}', 'name': f'{prefix}{i}', 'rating': rating, 'distance': None} for i, rating in enumerate(ratings)]
+
+def test_merged_pages_cover_the_union():
+    first = ListBackend('first', businesses('a', [5.0, 4.9, 4.8, 4.7, 4.6]))
+    second = ListBackend('second', businesses('b', [4.95, 4.85, 4.75, 4.65, 4.55]))
+    fan_out = FanOutBackend([first, second], mode='merge')
+
+    pages = [asyncio.run(fan_out.search(sort_by='rating', offset=offset, limit=3)) for offset in (0, 3, 6)]
+    ids = [b['id'] for page in pages for b in page['businesses']]
+    assert ids == ['a0', 'b0', 'a1', 'b1', 'a2', 'b2', 'a3', 'b3', 'a4']
+    assert all(params['offset'] == 0 for params in first.params)
+
+def test_best_match_merge_interleaves_by_rank():
+    first = ListBackend('first', businesses('a', [3.0, 3.0, 3.0]))
+    second = ListBackend('second', [{'id': 'a1', 'name': 'a1', 'rating': 3.0, 'distance': None}] + businesses('b', [5.0, 5.0]))
+    fan_out = FanOutBackend([first, second], mode='merge')
+
+    response = asyncio.run(fan_out.search(sort_by='best_match', offset=0, limit=5))
+    assert [b['id'] for b in response['businesses']] == ['a0', 'a1', 'b0', 'a2', 'b1']
+
+def test_deep_merge_pages_fall_back_to_the_first_answer():
+    first = ListBackend('first', businesses('a', [4.0] * 60))
+    second = ListBackend('second', businesses('b', [5.0] * 60))
+    fan_out = FanOutBackend([first, second], mode='merge')
+
+    response = asyncio.run(fan_out.search(sort_by='rating', offset=45, limit=10))
+    ids = [b['id'] for b in response['businesses']]
+    assert ids in ([f'a{i}' for i in range(45, 55)], [f'b{i}' for i in range(45, 55)])
+    assert all(params['offset'] == 45 for params in first.params + second.params)
@@ -0,0 +1,45 @@
+'''
+Tests of the category statistics.
+'''
+
+import json
+import threading
+
+from category_stats import DEFAULT_DENSITY, PRIOR_WEIGHT, CategoryStats, search_area
+
+def test_area_searches_are_counted_once():
+    stats = CategoryStats()
+    stats.observe('coffee', 'San Francisco', 1000, 30)
+
+    # The only area searched has the default prior, updated by its own search
+    shape, rate = stats.posterior('coffee', 'san francisco')
+    assert shape == PRIOR_WEIGHT + 30
+    assert abs(rate - (PRIOR_WEIGHT / DEFAULT_DENSITY + search_area(1000))) < 1e-9
+
+    # Another area takes its prior from the first one
+    shape, rate = stats.posterior('coffee', 'Oakland')
+    assert shape == PRIOR_WEIGHT
+    assert abs(shape / rate - (PRIOR_WEIGHT * DEFAULT_DENSITY + 30) / (PRIOR_WEIGHT + search_area(1000))) < 1e-9
+
+def test_save_while_observing(tmp_path):
+    path = str(tmp_path / 'stats.json')
+    stats = CategoryStats(path=path)
+    done = threading.Event()
+
+    def observe():
+        i = 0
+        while not done.is_set() and i < 50000:
+            stats.observe(f'category{i % 50}', f'area {i}', 1000, 1)
+            i += 1
+
+    thread = threading.Thread(target=observe)
+    thread.start()
+    try:
+        for _ in range(20):
+            stats.save()
+    finally:
+        done.set()
+        thread.join()
+
+    with open(path) as stats_file:
+        assert type(json.load(stats_file)) is dict
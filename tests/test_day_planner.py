@@ -0,0 +1,36 @@
+'''
+Tests of the DayPlanner splitting an activity list into daily tours.
+'''
+
+import random
+
+from Yelist import Activity, YelpBusiness
+from day_planner import DayPlanner
+from yelp_categories import Category
+
+ORIGIN = {'latitude': 37.7749, 'longitude': -122.4194}
+
+def activities(n, seed=0):
+    rng = random.Random(seed)
+    category = Category('coffee', 'Coffee & Tea', ['food'])
+    listed = []
+    for i in range(n):
+        coordinates = {'latitude': ORIGIN['latitude'] + rng.uniform(-0.05, 0.05), 'longitude': ORIGIN['longitude'] + rng.uniform(-0.05, 0.05)}
+        a = Activity(f'stop {i}', i + 1, category)
+        a.business = YelpBusiness(f'business {i}', category, 4.0, 10, '', coordinates, ['1 Main St'], 1000.0, business_id=f'b{i}')
+        listed.append(a)
+    return listed
+
+def test_every_stop_is_planned_once_within_the_day_limit():
+    listed = activities(20)
+    days = DayPlanner([ORIGIN], stops_per_day=8).plan(listed, 3)
+    assert len(days) == 3
+    assert all(len(day.activities) <= 8 for day in days)
+    assert sorted(a.name for day in days for a in day.activities) == sorted(a.name for a in listed)
+
+def test_businesses_without_coordinates_are_planned():
+    listed = activities(12)
+    listed[3].business.coordinates = {'latitude': None, 'longitude': None}
+    listed[5].business.coordinates = None
+    days = DayPlanner([ORIGIN]).plan(listed, 2)
+    assert sorted(a.name for day in days for a in day.activities) == sorted(a.name for a in listed)
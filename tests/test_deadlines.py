@@ -0,0 +1,89 @@
+'''
+Tests of the latency tracker and of the hedged caller.
+'''
+
+import threading
+import time
+
+import pytest
+
+from deadlines import DeadlineExceeded, HedgedCaller, LatencyTracker
+
+def test_percentile_needs_min_samples():
+    tracker = LatencyTracker(min_samples=5)
+    for seconds in [0.1, 0.2, 0.3, 0.4]:
+        tracker.record(seconds)
+    assert tracker.percentile(95) is None
+
+    tracker.record(0.5)
+    assert tracker.percentile(50) == 0.3
+    assert tracker.percentile(95) == 0.5
+
+def test_window_keeps_the_recent_latencies():
+    tracker = LatencyTracker(window=3, min_samples=1)
+    for seconds in [9.0, 1.0, 2.0, 3.0]:
+        tracker.record(seconds)
+    assert tracker.samples() == [1.0, 2.0, 3.0]
+    assert tracker.summary()['calls'] == 4
+    assert tracker.summary()['max'] == 3.0
+
+def test_fast_call_is_not_hedged():
+    caller = HedgedCaller()
+    duplicate = lambda **params: pytest.fail("the duplicate should not be sent")
+    assert caller.call(lambda x: x * 2, {'x': 21}, timeout=1.0, hedge_after=0.5, hedge_fn=duplicate) == 42
+    assert caller.hedged == 0
+    caller.shutdown()
+
+def test_duplicate_wins_when_the_first_copy_is_slow():
+    caller = HedgedCaller()
+    release = threading.Event()
+
+    def slow(x):
+        release.wait(5)
+        return 'first'
+
+    tracker = LatencyTracker(min_samples=1)
+    start = time.monotonic()
+    assert caller.call(slow, {'x': 1}, timeout=2.0, hedge_after=0.05, hedge_fn=lambda x: 'duplicate', tracker=tracker) == 'duplicate'
+    assert time.monotonic() - start < 1.0
+    assert (caller.hedged, caller.hedge_wins) == (1, 1)
+
+    # The first copy still records its latency once it answers
+    release.set()
+    end = time.monotonic() + 5
+    while not len(tracker):
+        assert time.monotonic() < end
+        time.sleep(0.01)
+    caller.shutdown()
+
+def test_deadline_exceeded():
+    caller = HedgedCaller()
+    release = threading.Event()
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        caller.call(lambda: release.wait(5), {}, timeout=0.1)
+    assert time.monotonic() - start < 1.0
+    release.set()
+    caller.shutdown()
+
+def test_one_failed_copy_does_not_fail_the_call():
+    caller = HedgedCaller()
+
+    def failing():
+        time.sleep(0.1)
+        raise ConnectionError("reset")
+
+    assert caller.call(failing, {}, timeout=2.0, hedge_after=0.02, hedge_fn=lambda: 'duplicate') == 'duplicate'
+    caller.shutdown()
+
+def test_both_copies_fail():
+    caller = HedgedCaller()
+
+    def failing():
+        time.sleep(0.1)
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        caller.call(failing, {}, timeout=2.0, hedge_after=0.02)
+    assert caller.hedged == 1
+    caller.shutdown()
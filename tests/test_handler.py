@@ -0,0 +1,200 @@
+'''
+Tests of the YelpAPIHandler search paths, run against the local stand-in for YelpAPI.
+'''
+
+import threading
+import time
+
+from Yelist import FIRST_PAGE, Activity, YelpAPIHandler
+from category_stats import CategoryStats
+from deadlines import LatencyTracker
+from prefetch import Prefetcher
+from result_cache import ResultCache
+from stub_yelp import StubYelpAPI
+from yelp_categories import Category, CategoryTree
+
+class RecordingStub(StubYelpAPI):
+
+    '''
+    A StubYelpAPI recording the parameters of every call.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.params = []
+
+    def search_query(self, **params):
+        self.params.append(params)
+        return super().search_query(**params)
+
+class GatedCache(ResultCache):
+
+    '''
+    A ResultCache whose background refreshes wait until the test releases them.
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.gate = threading.Event()
+
+    def refresh(self, key, fetch):
+        self.gate.wait(5)
+        super().refresh(key, fetch)
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def wait_for(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end
+        time.sleep(0.01)
+
+def test_refresh_keeps_the_search_criteria_of_its_key():
+    clock = FakeClock()
+    cache = GatedCache(soft_ttl=60, hard_ttl=600, clock=clock)
+    client = RecordingStub()
+    handler = YelpAPIHandler(None, 'San Francisco', 1609, client=client)
+    handler.result_cache = cache
+    category = Category('coffee', 'Coffee & Tea', ['food'])
+
+    _, total = handler.search_page(category, 'rating', 0, 10)
+    key = ('San Francisco', 1609, 'rating', 'coffee', 0, 10)
+    assert cache.peek(key) is not None
+
+    # The stale entry is refreshed in the background, while the handler moves on to a wider radius
+    clock.now += 120
+    handler.search_page(category, 'rating', 0, 10)
+    handler.radius = 3218
+    cache.gate.set()
+    wait_for(lambda: cache.peek(key)[1] == clock.now)
+
+    (_, refreshed_total, _), _ = cache.peek(key)
+    assert client.params[-1]['radius'] == 1609
+    assert refreshed_total == total
+    cache.shutdown()
+
+class SlowFirstStub(StubYelpAPI):
+
+    '''
+    A StubYelpAPI whose first call is slow.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.first = True
+        self.first_lock = threading.Lock()
+
+    def search_query(self, **params):
+        with self.first_lock:
+            slow, self.first = self.first, False
+        if slow:
+            time.sleep(0.5)
+        return super().search_query(**params)
+
+def test_new_handler_hedges_with_the_shared_latencies():
+    tracker = LatencyTracker()
+    for _ in range(tracker.min_samples):
+        tracker.record(0.01)
+
+    # A new handler has made no call yet, but knows the p95 of the earlier searches
+    handler = YelpAPIHandler(None, 'San Francisco', 16090, client=SlowFirstStub(), latency=tracker)
+    handler.hedge = True
+    start = time.monotonic()
+    handler.search_page(Category('coffee', 'Coffee & Tea', ['food']), 'rating', 0, 10)
+    assert time.monotonic() - start < 0.4
+    assert handler.caller.hedged == 1
+    handler.caller.shutdown()
+
+def test_cached_businesses_are_not_shared_between_handlers():
+    cache = ResultCache()
+    client = StubYelpAPI()
+    first = YelpAPIHandler(None, 'San Francisco', 1609, client=client)
+    second = YelpAPIHandler(None, 'San Francisco', 1609, client=client)
+    first.result_cache = second.result_cache = cache
+    category = Category('coffee', 'Coffee & Tea', ['food'])
+
+    first_page, _ = first.search_page(category, 'rating', 0, 10)
+    second_page, _ = second.search_page(category, 'rating', 0, 10)
+    business = first_page.business_list[0]
+    business.aliases.append('first-only')
+    business.fetched_at = 0
+
+    (cached, _, _), _ = cache.peek(('San Francisco', 1609, 'rating', 'coffee', 0, 10))
+    for other in (second_page.business_list[0], cached.business_list[0]):
+        assert other.business_id == business.business_id
+        assert other is not business
+        assert 'first-only' not in other.aliases
+        assert other.fetched_at != 0
+    cache.shutdown()
+
+class CoffeeStub(StubYelpAPI):
+
+    '''
+    A StubYelpAPI listing only coffee shops, whatever the categories searched.
+    '''
+
+    def search_query(self, **params):
+        return super().search_query(**dict(params, categories='coffee'))
+
+def test_narrow_activity_skips_the_business_of_the_broad_one():
+    tree = CategoryTree([{'alias': 'food', 'title': 'Food', 'parents': []}, {'alias': 'coffee', 'title': 'Coffee & Tea', 'parents': ['food']}])
+    handler = YelpAPIHandler(None, 'San Francisco', 1609, cat_tree=tree, client=CoffeeStub())
+    broad = Activity('broad', 1, tree.nodes['food'], expand=True)
+    narrow = Activity('narrow', 2, tree.nodes['coffee'])
+
+    handler.API_call([broad, narrow], 'rating')
+    assert broad.business is not None and narrow.business is not None
+    assert narrow.business.business_id != broad.business.business_id
+
+def test_a_search_is_recorded_once():
+    clock = FakeClock()
+    cache = ResultCache(soft_ttl=60, hard_ttl=600, clock=clock)
+    stats = CategoryStats()
+    client = RecordingStub()
+    category = Category('coffee', 'Coffee & Tea', ['food'])
+
+    # The prefetcher records the search it makes, the handler taking its result does not
+    background = YelpAPIHandler(None, 'San Francisco', 1609, client=client)
+    background.result_cache, background.stats = cache, stats
+    prefetcher = Prefetcher(background, limit=FIRST_PAGE)
+    prefetcher.prefetch(category, 'coffee', 'San Francisco', 1609, 'rating')
+
+    handler = YelpAPIHandler(None, 'San Francisco', 1609, client=client)
+    handler.result_cache, handler.stats, handler.prefetcher = cache, stats, prefetcher
+    next(handler.iter_pages(category, 'rating'))
+    total, _ = stats.counts['coffee']['*']
+    assert len(client.params) == 1 and total > 0
+
+    # Neither a cached result nor its background refresh is a new search
+    handler.search_page(category, 'rating', 0, FIRST_PAGE)
+    clock.now += 120
+    handler.search_page(category, 'rating', 0, FIRST_PAGE)
+    wait_for(lambda: len(client.params) == 2 and cache.peek(('San Francisco', 1609, 'rating', 'coffee', 0, FIRST_PAGE))[1] == clock.now)
+    assert stats.counts['coffee']['*'][0] == total
+    prefetcher.shutdown()
+    cache.shutdown()
+
+def test_refresh_leaves_the_handler_alone():
+    clock = FakeClock()
+    cache = ResultCache(soft_ttl=60, hard_ttl=600, clock=clock)
+    client = RecordingStub()
+    handler = YelpAPIHandler(None, 'San Francisco', 1609, client=client)
+    handler.result_cache = cache
+    category = Category('coffee', 'Coffee & Tea', ['food'])
+
+    handler.search_page(category, 'rating', 0, 10)
+    assert handler.requests == 1 and len(handler.latency) == 1
+
+    # The background refresh makes a call, but it is not one of the handler's requests
+    clock.now += 120
+    handler.search_page(category, 'rating', 0, 10)
+    wait_for(lambda: cache.peek(('San Francisco', 1609, 'rating', 'coffee', 0, 10))[1] == clock.now)
+    assert len(client.params) == 2
+    assert handler.requests == 1 and len(handler.latency) == 1
+    cache.shutdown()
@@ -0,0 +1,71 @@
+'''
+Tests of the offline snapshot: built from recorded searches, opened and searched like the YelpAPI.
+'''
+
+import pytest
+
+from Yelist import Activity, YelpAPIHandler
+from offline import OfflineClient, OfflineError, Snapshot, SnapshotBuilder
+from stub_yelp import StubYelpAPI
+from yelp_categories import Category
+
+def build(tmp_path):
+    stub = StubYelpAPI()
+    builder = SnapshotBuilder()
+    params = {'location': 'San Francisco', 'categories': 'coffee', 'radius': 16090, 'sort_by': 'rating', 'limit': 50}
+    response = stub.search_query(**params)
+    builder.add_search(params, response)
+
+    path = str(tmp_path / 'day.snap')
+    builder.write(path)
+    return path, response
+
+def test_build_open_and_search(tmp_path):
+    path, recorded = build(tmp_path)
+    snapshot = Snapshot(path)
+    try:
+        client = OfflineClient(snapshot)
+        response = client.search_query(location='san francisco', categories='coffee', radius=40000, sort_by='rating', limit=50)
+
+        recorded_ids = {b['id'] for b in recorded['businesses']}
+        assert {b['id'] for b in response['businesses']} == recorded_ids
+        ratings = [b['rating'] for b in response['businesses']]
+        assert ratings == sorted(ratings, reverse=True)
+
+        first = response['businesses'][0]
+        assert client.business_query(first['id'])['name'] == first['name']
+
+        page = client.search_query(location='San Francisco', categories='coffee', radius=40000, sort_by='rating', limit=5, offset=5)
+        assert [b['id'] for b in page['businesses']] == [b['id'] for b in response['businesses'][5:10]]
+    finally:
+        snapshot.close()
+
+def test_unknown_location_and_business(tmp_path):
+    path, _ = build(tmp_path)
+    snapshot = Snapshot(path)
+    try:
+        client = OfflineClient(snapshot)
+        with pytest.raises(OfflineError):
+            client.search_query(location='Boston', categories='coffee')
+        with pytest.raises(OfflineError):
+            client.business_query('missing')
+    finally:
+        snapshot.close()
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / 'plain.txt'
+    path.write_bytes(b'not a snapshot at all, just some text' * 4)
+    with pytest.raises(OfflineError):
+        Snapshot(str(path))
+
+def test_handler_skips_an_address_the_snapshot_does_not_cover(tmp_path):
+    path, _ = build(tmp_path)
+    snapshot = Snapshot(path)
+    try:
+        handler = YelpAPIHandler(None, 'Boston', 16090, client=OfflineClient(snapshot))
+        activity = Activity('coffee', 1, Category('coffee', 'Coffee & Tea', ['food']))
+        handler.API_call([activity], 'rating')
+        assert activity.business is None
+        assert handler.uncovered == {'coffee'}
+    finally:
+        snapshot.close()
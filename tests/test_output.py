@@ -0,0 +1,96 @@
+'''
+Tests of the output pipeline, its sinks and the Google Maps directions.
+'''
+
+import io
+import json
+import threading
+
+import pytest
+
+from Yelist import Activity, YelpBusiness
+from google_maps import Map
+from output import FileSink, MapSink, OutputPipeline, PlanOutput, Sink, TableSink, format_table
+from yelp_categories import Category
+
+CATEGORY = Category('coffee', 'Coffee & Tea', ['food'])
+
+def plan(n=2):
+    activities = []
+    for i in range(n):
+        a = Activity(f'stop {i}', i + 1, CATEGORY)
+        a.business = YelpBusiness(f'business {i}', CATEGORY, 4.5, 10 ** i, '', None, [f'{i} Main St', 'SF'], 1609.0 * i, business_id=f'b{i}')
+        activities.append(a)
+    return PlanOutput('San Francisco', activities, value=('Reviews', lambda b: b.num_reviews))
+
+class RecordingSink(Sink):
+
+    def __init__(self, name, gate=None):
+        self.name = name
+        self.gate = gate
+        self.plans = []
+
+    def write(self, plan):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.plans.append(plan)
+
+class BrokenBrowserSink(MapSink):
+
+    def write(self, plan):
+        raise OSError('no browser')
+
+def test_format_table():
+    table = format_table([['stop 0', 'business 0', 'Coffee & Tea', '1', '0 Main St, SF', 'just now'], ['stop 1', 'business 1', 'Coffee & Tea', '10', '1 Main St, SF', 'just now']], 'Reviews')
+    lines = table.splitlines()
+    assert lines[0] == '|  Activity  |  Business Name  |  Business Category  |  Reviews  |     Address     |  Updated   |'
+    assert lines[1] == '-' * len(lines[0])
+    assert lines[2] == '| stop 0     | business 0      | Coffee & Tea        |         1 | 0 Main St, SF   | just now   |'
+    assert lines[3].split('|')[4] == '        10 '
+
+def test_table_sink_renders_the_plan_rows():
+    stream = io.StringIO()
+    TableSink('Results:', stream).write(plan())
+    text = stream.getvalue()
+    assert text.startswith('Results:\n\n|  Activity')
+    assert '| stop 1 ' in text and 'Day' not in text
+
+def test_pipeline_feeds_every_sink_without_waiting_for_a_slow_one():
+    gate = threading.Event()
+    fast, slow = RecordingSink('fast'), RecordingSink('slow', gate)
+    output = OutputPipeline([fast, slow])
+    published = plan()
+    output.publish(published)
+
+    assert output.close(0.2) == ['slow']
+    assert fast.plans == [published]
+    gate.set()
+
+def test_failed_map_sink_prints_the_links():
+    stream = io.StringIO()
+    output = OutputPipeline([BrokenBrowserSink(stream=stream)])
+    output.publish(plan())
+
+    assert output.close(1.0) == []
+    assert type(output.errors['map']) is OSError
+    assert 'Directions:\nhttps://www.google.com/maps/dir/?api=1&origin=San+Francisco' in stream.getvalue()
+
+def test_file_sink_replaces_the_export(tmp_path):
+    path = str(tmp_path / 'plan.json')
+    FileSink(path).write(plan())
+    with open(path) as export_file:
+        assert [stop['id'] for stop in json.load(export_file)['tours'][0]['stops']] == ['b0', 'b1']
+    assert not (tmp_path / 'plan.json.part').exists()
+
+def test_file_sink_keeps_the_original_error(tmp_path):
+    with pytest.raises(FileNotFoundError) as error:
+        FileSink(str(tmp_path / 'missing' / 'plan.json')).write(plan())
+    assert 'plan.json.part' in str(error.value)
+
+def test_directions_url_leaves_the_map_unchanged():
+    directions = Map('San Francisco', ['A St', 'B St'])
+    url = directions.directions_url()
+    assert '&destination=B+St&waypoints=A+St%7C&' in url
+    assert directions.destination is None and directions.waypoints == ['A St', 'B St']
+    assert directions.directions_url() == url
+    assert callable(directions.search_directions)
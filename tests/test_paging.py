@@ -0,0 +1,61 @@
+'''
+Tests of the lazy paging of search results: YelpAPIHandler.iter_pages() and fetch_until().
+'''
+
+from Yelist import FIRST_PAGE, MAX_DEPTH, PAGE_LIMIT, YelpAPIHandler
+from yelp_categories import Category
+
+CATEGORY = Category('coffee', 'Coffee & Tea', ['food'])
+
+class PagedClient():
+
+    '''
+    Serves the first `available` of a list of numbered businesses, reporting `total` of them, and records every call.
+    '''
+
+    def __init__(self, total, available=None):
+        self.total = total
+        self.available = available if available is not None else total
+        self.params = []
+
+    def search_query(self, **params):
+        self.params.append(params)
+        end = min(params['offset'] + params['limit'], self.available)
+        businesses = [{'id': f'b{i}', 'name': f'business {i}', 'rating': 4.0, 'review_count': i, 'url': '', 'coordinates': None, 'location': {'display_address': []}, 'distance': 10.0} for i in range(params['offset'], end)]
+        return {'total': self.total, 'businesses': businesses}
+
+def handler(client):
+    return YelpAPIHandler(None, 'San Francisco', 1609, client=client)
+
+def test_stops_at_the_total():
+    client = PagedClient(25)
+    pages = list(handler(client).iter_pages(CATEGORY, 'rating'))
+
+    assert sum(len(page) for page in pages) == 25
+    assert [params['offset'] for params in client.params] == [0, 10, 20]
+    assert all(params['limit'] == FIRST_PAGE for params in client.params)
+
+def test_stops_on_a_short_page():
+    client = PagedClient(500, available=13)
+    pages = list(handler(client).iter_pages(CATEGORY, 'rating'))
+
+    assert [len(page) for page in pages] == [10, 3]
+    assert len(client.params) == 2
+
+def test_stops_at_the_offset_cap():
+    client = PagedClient(5000)
+    pages = list(handler(client).iter_pages(CATEGORY, 'rating', page_size=lambda fetched: PAGE_LIMIT))
+
+    assert sum(len(page) for page in pages) == MAX_DEPTH
+    last = client.params[-1]
+    assert last['offset'] + last['limit'] == MAX_DEPTH
+    assert all(params['limit'] <= PAGE_LIMIT for params in client.params)
+
+def test_fetch_until_sizes_pages_from_the_usable_share():
+    client = PagedClient(5000)
+    found = handler(client).fetch_until(CATEGORY, 'rating', lambda b: b.num_reviews % 4 == 0, needed=12)
+
+    assert [b.num_reviews for b in found] == [4 * i for i in range(12)]
+
+    # 3 of the first 10 businesses are usable, so 30 more are asked for the 9 still needed, then 8 for the last 2
+    assert [params['limit'] for params in client.params] == [FIRST_PAGE, 30, 8]
@@ -0,0 +1,58 @@
+'''
+Tests of the Pareto fronts of the candidates and of the itineraries, checked against brute force.
+'''
+
+import itertools
+import math
+import random
+
+from Yelist import YelpBusiness
+from geo import haversine
+from pareto import business_front, business_objectives, dominates, itinerary_front, skyline
+
+CENTER = {'latitude': 37.7749, 'longitude': -122.4194}
+
+def candidates(n, category, rng):
+    businesses = []
+    for i in range(n):
+        coordinates = {'latitude': CENTER['latitude'] + rng.uniform(-0.05, 0.05), 'longitude': CENTER['longitude'] + rng.uniform(-0.05, 0.05)}
+        businesses.append(YelpBusiness(f'{category} {i}', category, rng.choice([3.0, 3.5, 4.0, 4.5, 5.0]), rng.randint(0, 50), '', coordinates, [], haversine(CENTER, coordinates), business_id=f'{category}-{i}'))
+    return businesses
+
+def test_dominates():
+    assert dominates((2, 1), (1, 1))
+    assert not dominates((1, 1), (1, 1))
+    assert not dominates((2, 0), (1, 1))
+
+def test_skyline_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(20):
+        items = [(rng.randint(0, 5), rng.randint(0, 5), rng.randint(0, 5)) for _ in range(40)]
+        expected = [item for item in items if not any(dominates(other, item) for other in items)]
+        assert sorted(skyline(items, key=lambda item: item)) == sorted(expected)
+
+def test_unknown_distance_counts_as_the_farthest():
+    near = YelpBusiness('near', 'coffee', 4.0, 10, '', None, [], 100.0)
+    unknown = YelpBusiness('unknown', 'coffee', 4.0, 10, '', None, [], None)
+    assert business_objectives(unknown)[2] == -math.inf
+    assert business_front([near, unknown]) == [near]
+
+def test_itinerary_front_matches_brute_force():
+    rng = random.Random(1)
+    layers = [candidates(6, f'category {c}', rng) for c in range(3)]
+
+    routes = []
+    for businesses in itertools.product(*layers):
+        points = [CENTER] + [b.coordinates for b in businesses]
+        distance = sum(haversine(p, q) for p, q in zip(points, points[1:]))
+        routes.append((round(sum(b.rating for b in businesses) * 10), distance))
+    expected = sorted({(total, round(distance, 6)) for total, distance in routes if not any(other_total >= total and other_distance < distance - 1e-9 for other_total, other_distance in routes)}, key=lambda route: route[1])
+
+    front = itinerary_front(CENTER, layers)
+    assert [(round(itinerary.rating * len(layers) * 10), round(itinerary.distance, 6)) for itinerary in front] == expected
+    for itinerary in front:
+        assert [b.category for b in itinerary.businesses] == [f'category {c}' for c in range(3)]
+
+def test_itinerary_front_needs_every_layer():
+    rng = random.Random(2)
+    assert itinerary_front(CENTER, [candidates(3, 'coffee', rng), []]) == []
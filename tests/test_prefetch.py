@@ -0,0 +1,87 @@
+'''
+Tests of the Prefetcher budget and cancellation, and of the session file.
+'''
+
+import threading
+
+from Yelist import FIRST_PAGE, YelpAPIHandler
+from prefetch import Prefetcher, load_session, save_session
+from stub_yelp import StubYelpAPI
+from yelp_categories import Category
+
+COFFEE = Category('coffee', 'Coffee & Tea', ['food'])
+THAI = Category('thai', 'Thai', ['restaurants'])
+
+class GatedStub(StubYelpAPI):
+
+    '''
+    A StubYelpAPI whose calls wait until the test releases them.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.started = threading.Event()
+
+    def search_query(self, **params):
+        self.started.set()
+        self.gate.wait(5)
+        return super().search_query(**params)
+
+def prefetcher(client, budget=10):
+    return Prefetcher(YelpAPIHandler(None, client=client), budget, FIRST_PAGE)
+
+def test_budget_caps_the_searches():
+    client = StubYelpAPI()
+    background = prefetcher(client, budget=2)
+
+    assert background.prefetch(COFFEE, 'coffee', 'San Francisco', 1609, 'rating')
+    assert not background.prefetch(COFFEE, 'coffee', 'San Francisco', 1609, 'rating')
+    assert background.prefetch(THAI, 'thai', 'San Francisco', 1609, 'rating')
+    assert not background.prefetch(COFFEE, 'coffee', 'Oakland', 1609, 'rating')
+    assert background.used == 2
+
+    page, total, _, _ = background.take('San Francisco', 1609, 'rating', 'coffee')
+    assert len(page) == min(total, FIRST_PAGE)
+    assert background.take('San Francisco', 1609, 'rating', 'coffee') is None
+    assert background.take('Oakland', 1609, 'rating', 'coffee') is None
+    assert background.take('San Francisco', 1609, 'rating', 'thai') is not None
+    background.shutdown()
+    assert client.calls == 2
+
+def test_take_gives_up_on_a_slow_search():
+    client = GatedStub()
+    background = prefetcher(client)
+    background.prefetch(COFFEE, 'coffee', 'San Francisco', 1609, 'rating')
+
+    assert background.take('San Francisco', 1609, 'rating', 'coffee', timeout=0.05) is None
+    client.gate.set()
+    background.shutdown()
+
+def test_shutdown_cancels_the_searches_not_started():
+    client = GatedStub()
+    background = prefetcher(client)
+    background.prefetch(COFFEE, 'coffee', 'San Francisco', 1609, 'rating')
+    background.prefetch(THAI, 'thai', 'San Francisco', 1609, 'rating')
+    assert client.started.wait(5)
+
+    background.shutdown()
+    assert background.take('San Francisco', 1609, 'rating', 'thai') is None
+    client.gate.set()
+    assert background.take('San Francisco', 1609, 'rating', 'coffee') is not None
+    assert client.calls == 1
+
+def test_session_round_trip(tmp_path):
+    path = str(tmp_path / 'session.json')
+    save_session('San Francisco', 1609, 'rating', [0.123456], path=path)
+    assert load_session(path) == {'address': 'San Francisco', 'radius': 1609, 'sort': 'rating', 'latencies': [0.1235]}
+
+    # A session that cannot be written is not an error
+    save_session('San Francisco', 1609, 'rating', path=str(tmp_path / 'missing' / 'session.json'))
+
+def test_corrupt_session_file_is_ignored(tmp_path):
+    path = tmp_path / 'session.json'
+    for text in ['{"address": "San Fr', '["San Francisco"]', '{"radius": 1609}', '']:
+        path.write_text(text)
+        assert load_session(str(path)) == {}
+    assert load_session(str(tmp_path / 'missing.json')) == {}
@@ -0,0 +1,56 @@
+'''
+Tests of the profiler: spans, counters, the summary and the trace export.
+'''
+
+import json
+import threading
+
+from profiling import Profiler, env_enabled
+
+def test_environment_variable_values():
+    assert not any(env_enabled(value) for value in (None, '', '0', 'false', 'False', ' no ', 'off'))
+    assert all(env_enabled(value) for value in ('1', 'true', 'yes', 'on'))
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    with profiler.span('api.search_query'):
+        profiler.count('api.calls')
+    assert profiler.spans == [] and profiler.counters == {}
+
+def test_summary_and_trace(tmp_path):
+    profiler = Profiler(enabled=True)
+    for _ in range(3):
+        with profiler.span('api.search_query'):
+            profiler.count('api.calls')
+    profiler.count('cache.hits', 2)
+
+    summary = profiler.summary()
+    assert '| api.search_query |      3 |' in summary
+    assert '| cache.hits       |            2 |' in summary
+
+    path = str(tmp_path / 'trace.json')
+    profiler.export_chrome_trace(path)
+    with open(path) as trace_file:
+        events = json.load(trace_file)['traceEvents']
+    assert [e['name'] for e in events if e['ph'] == 'X'] == ['api.search_query'] * 3
+    assert {e['name']: e['args']['value'] for e in events if e['ph'] == 'C'} == {'api.calls': 3, 'cache.hits': 2}
+
+def test_summary_while_counting():
+    profiler = Profiler(enabled=True)
+    done = threading.Event()
+
+    def count():
+        i = 0
+        while not done.is_set() and i < 20000:
+            profiler.count(f'counter {i}')
+            i += 1
+
+    thread = threading.Thread(target=count)
+    thread.start()
+    try:
+        for _ in range(20):
+            profiler.summary()
+            profiler.chrome_trace()
+    finally:
+        done.set()
+        thread.join()
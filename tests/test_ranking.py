@@ -0,0 +1,13 @@
+'''
+Tests of the custom ranking.
+'''
+
+import numpy as np
+
+from ranking import Ranker
+
+def test_unknown_distance_scores_as_the_farthest():
+    ranker = Ranker()
+    scores = ranker.score(np.array([4.0, 4.0, 4.0]), np.array([10.0, 10.0, 10.0]), np.array([np.nan, 100.0, 900.0]))
+    assert scores[0] == scores[2] < scores[1]
+    assert not np.isnan(scores).any()
@@ -0,0 +1,74 @@
+'''
+Tests of the recording and replay of YelpAPI traffic.
+'''
+
+import gzip
+import json
+import time
+
+import pytest
+
+from replay import ArchiveWriter, RecordingClient, ReplayClient, load_archive
+
+class CountingClient():
+
+    '''
+    Answers search calls with the number of calls of the same location so far, capped at a maximum.
+    '''
+
+    def __init__(self, most=2):
+        self.most = most
+        self.seen = {}
+
+    def search_query(self, **params):
+        n = self.seen[params['location']] = min(self.seen.get(params['location'], 0) + 1, self.most)
+        return {'total': n, 'businesses': []}
+
+    def business_query(self, id, **params):
+        return {'id': id}
+
+def record(path, calls):
+    writer = ArchiveWriter(path)
+    client = RecordingClient(CountingClient(), writer)
+    try:
+        return [client.search_query(**params) for params in calls]
+    finally:
+        writer.close()
+
+def test_round_trip_stores_each_body_once(tmp_path):
+    path = str(tmp_path / 'day.jsonl.gz')
+    calls = [{'location': 'SF', 'limit': 10}, {'location': 'SF', 'limit': 10}, {'limit': 10, 'location': 'SF'}, {'location': 'LA', 'limit': 10}]
+    responses = record(path, calls)
+    assert [r['total'] for r in responses] == [1, 2, 2, 1]
+
+    # The second and third SF answers, and the first SF and LA answers, share their bodies
+    with gzip.open(path, 'rt') as archive:
+        lines = [json.loads(line) for line in archive]
+    assert sum('body' in line for line in lines) == 2
+    recorded = load_archive(path)
+    assert [call['params'] for call in recorded] == calls
+    assert [json.loads(call['body']) for call in recorded] == responses
+
+def test_identical_calls_replay_in_order_and_the_last_one_repeats(tmp_path):
+    path = str(tmp_path / 'day.jsonl.gz')
+    record(path, [{'location': 'SF'}, {'location': 'SF'}, {'location': 'LA'}])
+
+    client = ReplayClient(load_archive(path), scale=0)
+    assert [client.search_query(location='SF')['total'] for _ in range(4)] == [1, 2, 2, 2]
+    assert client.search_query(location='LA')['total'] == 1
+    assert client.calls == 5
+
+    with pytest.raises(LookupError):
+        client.search_query(location='Boston')
+    assert client.misses == 1
+
+def test_latencies_are_scaled():
+    calls = [{'method': 'search_query', 'params': {'location': 'SF'}, 'body': '{}', 'start': 0.0, 'latency': 0.4}]
+
+    start = time.perf_counter()
+    ReplayClient(calls, scale=0.25).search_query(location='SF')
+    assert 0.09 < time.perf_counter() - start < 0.3
+
+    start = time.perf_counter()
+    ReplayClient(calls, scale=0).search_query(location='SF')
+    assert time.perf_counter() - start < 0.05
@@ -0,0 +1,101 @@
+'''
+Tests of the ResultCache freshness policy, run on a fake clock.
+'''
+
+import threading
+import time
+
+from result_cache import ResultCache, format_age
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class Fetcher():
+
+    '''
+    Returns a new value on each call, optionally failing.
+    '''
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.done = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        try:
+            if self.fail:
+                raise OSError('network down')
+            return f'value {self.calls}'
+        finally:
+            self.done.set()
+
+def wait_for(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end
+        time.sleep(0.01)
+
+def test_fresh_stale_and_expired_results():
+    clock = FakeClock()
+    cache = ResultCache(soft_ttl=60, hard_ttl=600, clock=clock)
+    fetch = Fetcher()
+
+    assert cache.get('key', fetch) == ('value 1', 1000.0)
+    clock.now += 30
+    assert cache.get('key', fetch) == ('value 1', 1000.0)
+    assert fetch.calls == 1
+
+    # A stale result is served while it is refreshed in the background
+    clock.now += 60
+    assert cache.get('key', fetch) == ('value 1', 1000.0)
+    wait_for(lambda: cache.peek('key')[0] == 'value 2')
+    assert cache.get('key', fetch) == ('value 2', 1090.0)
+
+    # An expired result is fetched again before it is served
+    clock.now += 600
+    assert cache.peek('key') is None
+    assert cache.get('key', fetch) == ('value 3', 1690.0)
+    cache.shutdown()
+
+def test_failed_refresh_keeps_the_stale_result():
+    clock = FakeClock()
+    cache = ResultCache(soft_ttl=60, hard_ttl=600, clock=clock)
+    fetch = Fetcher()
+    cache.get('key', fetch)
+
+    fetch.fail = True
+    fetch.done.clear()
+    clock.now += 120
+    assert cache.get('key', fetch)[0] == 'value 1'
+    assert fetch.done.wait(5)
+    wait_for(lambda: not cache._entries['key'].refreshing)
+
+    # The next stale read tries again
+    fetch.fail = False
+    assert cache.get('key', fetch)[0] == 'value 1'
+    wait_for(lambda: cache.peek('key')[0] == 'value 3')
+    cache.shutdown()
+
+def test_least_recently_used_results_are_dropped():
+    cache = ResultCache(max_entries=2, clock=FakeClock())
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.peek('a')
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.peek('b') is None
+    assert cache.peek('a')[0] == 1
+
+def test_format_age():
+    assert format_age(None) == 'unknown'
+    assert format_age(1000, now=1030) == 'just now'
+    assert format_age(1000, now=1000 + 12 * 60) == '12 min ago'
+    assert format_age(1000, now=1000 + 3 * 3600) == '3 h ago'
+    assert format_age(1000, now=1000 + 2 * 86400) == '2 days ago'
+    assert format_age(1000, now=900) == 'just now'
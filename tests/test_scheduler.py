@@ -0,0 +1,85 @@
+'''
+Tests of the opening hours helpers and of the ItineraryScheduler.
+'''
+
+import random
+
+from Yelist import Activity, YelpBusiness
+from scheduler import ItineraryScheduler, format_minutes, parse_hours, windows_for_day
+from yelp_categories import Category
+
+ORIGIN = {'latitude': 37.7749, 'longitude': -122.4194}
+CATEGORY = Category('coffee', 'Coffee & Tea', ['food'])
+
+def activity(i, latitude=None, longitude=None):
+    coordinates = {'latitude': ORIGIN['latitude'] if latitude is None else latitude, 'longitude': ORIGIN['longitude'] if longitude is None else longitude}
+    a = Activity(f'stop {i}', i + 1, CATEGORY)
+    a.business = YelpBusiness(f'business {i}', CATEGORY, 4.0, 10, '', coordinates, ['1 Main St'], 1000.0, business_id=f'b{i}')
+    return a
+
+def hours(slots):
+    return parse_hours([{'hours_type': 'REGULAR', 'open': [{'day': day, 'start': start, 'end': end, 'is_overnight': end <= start} for day, start, end in slots]}])
+
+def test_parse_hours_and_overnight_windows():
+    windows = hours([(0, '0900', '1700'), (4, '2200', '0200')])
+    assert windows[0] == [(540, 1020)]
+    assert windows[4] == [(1320, 1560)]
+    assert windows_for_day(windows, 5) == [(0, 120)]
+    assert windows_for_day(None, 0) is None
+    assert parse_hours([{'hours_type': 'SPECIAL', 'open': [{'day': 0, 'start': '0900', 'end': '1000'}]}]) == {day: [] for day in range(7)}
+
+def test_format_minutes():
+    assert format_minutes(0) == '00:00'
+    assert format_minutes(545.4) == '09:05'
+    assert format_minutes(1500) == '01:00'
+
+def test_visits_wait_for_opening_and_closed_businesses_are_left_out():
+    early, late, closed = activity(0), activity(1), activity(2)
+    business_hours = {'b0': hours([(0, '0800', '2000')]), 'b1': hours([(0, '1100', '1200')]), 'b2': hours([(1, '0800', '2000')])}
+
+    visits, unscheduled = ItineraryScheduler(ORIGIN, 9 * 60, 0).schedule([early, late, closed], business_hours)
+    assert unscheduled == [closed]
+    assert [v.activity for v in visits] == [early, late]
+    assert visits[1].start == 11 * 60
+    assert visits[1].arrival < visits[1].start
+
+def test_random_schedules_respect_the_opening_hours():
+    rng = random.Random(0)
+    listed = [activity(i, ORIGIN['latitude'] + rng.uniform(-0.05, 0.05), ORIGIN['longitude'] + rng.uniform(-0.05, 0.05)) for i in range(12)]
+    business_hours = {}
+    for a in listed:
+        start = rng.randint(7, 14)
+        business_hours[a.business.business_id] = hours([(2, f'{start:02d}00', f'{start + rng.randint(2, 8):02d}00')])
+
+    scheduler = ItineraryScheduler(ORIGIN, 8 * 60, 2, visit_minutes=45)
+    visits, unscheduled = scheduler.schedule(listed, business_hours)
+    assert visits
+    assert sorted(a.name for a in [v.activity for v in visits] + unscheduled) == sorted(a.name for a in listed)
+
+    leave = scheduler.start
+    for visit in visits:
+        windows = windows_for_day(business_hours[visit.activity.business.business_id], 2)
+        assert any(open_time <= visit.start and visit.departure <= close_time for open_time, close_time in windows)
+        assert visit.arrival >= leave
+        assert visit.start >= visit.arrival
+        assert visit.departure == visit.start + 45
+        leave = visit.departure
+
+def test_schedule_visits_needs_a_location(monkeypatch, capsys):
+    from Yelist import ActivityList, UI, YelpAPIHandler
+
+    ui = object.__new__(UI)
+    ui.a_list = ActivityList()
+    ui.handler = YelpAPIHandler(None, 'San Francisco', 1609, client=object())
+    ui.days = None
+    answers = iter(['y', '09:00'])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+
+    # Nothing to schedule, and then a single business without coordinates
+    ui.schedule_visits()
+    stop = activity(0)
+    stop.business.coordinates = None
+    ui.a_list.add_to_list(stop)
+    answers = iter(['y', '09:00'])
+    ui.schedule_visits()
+    assert capsys.readouterr().out.count('cannot be scheduled') == 2
@@ -0,0 +1,75 @@
+'''
+Tests of the HTTP planner service, run against the local stand-in for YelpAPI.
+'''
+
+import asyncio
+import json
+
+import service
+from service import PlannerService
+from stub_yelp import StubYelpAPI
+from yelp_categories import CategoryTree
+
+CATEGORIES = [{'alias': 'food', 'title': 'Food', 'parents': []}, {'alias': 'coffee', 'title': 'Coffee & Tea', 'parents': ['food'], 'country_whitelist': ['US']}]
+
+def request(planner, raw):
+
+    async def exchange():
+        server = await asyncio.start_server(planner.handle_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response
+
+    head, _, body = asyncio.run(exchange()).partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+def post(path, data):
+    body = json.dumps(data).encode()
+    return f'POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+
+def test_malformed_requests_are_rejected():
+    planner = PlannerService(CategoryTree(CATEGORIES), client=StubYelpAPI())
+    assert request(planner, b'GET\r\n\r\n')[0] == 400
+    assert request(planner, b'GET /categories HTTP/1.1\r\nContent-Length: -1\r\n\r\n')[0] == 400
+    assert request(planner, post('/plans', {'activities': [{'category': 'coffee', 'name': 7}]}))[0] == 400
+    planner.executor.shutdown()
+
+def test_internal_errors_are_not_blamed_on_the_client():
+    planner = PlannerService(CategoryTree(CATEGORIES), client=StubYelpAPI())
+    status, plan = request(planner, post('/plans', {'activities': [{'category': 'coffee'}]}))
+    assert status == 201
+
+    def broken(*args):
+        raise ValueError('bug')
+
+    planner.search_plan = broken
+    status, payload = request(planner, post(f"/plans/{plan['id']}/search", {'address': 'San Francisco'}))
+    assert status == 500
+    assert 'bug' in payload['error']
+    planner.executor.shutdown()
+
+def test_oldest_plans_are_dropped(monkeypatch):
+    monkeypatch.setattr(service, 'MAX_PLANS', 3)
+    planner = PlannerService(CategoryTree(CATEGORIES), client=StubYelpAPI())
+    plans = [planner.create_plan(f'tenant{i % 2}', {'activities': [{'category': 'food'}]}) for i in range(5)]
+
+    assert sum(len(tenant_plans) for tenant_plans in planner.plans.values()) == 3
+    assert plans[0].plan_id not in planner.plans['tenant0']
+    assert planner.get_plan('tenant0', plans[4].plan_id) is plans[4]
+    planner.executor.shutdown()
+
+def test_country_views_are_built_up_front():
+    tree = CategoryTree(CATEGORIES)
+    planner = PlannerService(tree, client=StubYelpAPI())
+    views = dict(tree._country_views)
+
+    assert planner.search_categories('coffee', 'US')['categories'][0]['alias'] == 'coffee'
+    assert planner.search_categories('coffee', 'FR')['categories'] == []
+    assert tree._country_views == views
+    planner.executor.shutdown()
@@ -0,0 +1,38 @@
+'''
+Tests of the batch search across worker processes, with the local stand-in for the Yelp API.
+'''
+
+from stub_yelp import StubYelpAPI
+from worker_pool import run_batch
+from yelp_categories import CategoryTree
+
+CATEGORIES = [
+    {'alias': 'food', 'title': 'Food', 'parents': []},
+    {'alias': 'coffee', 'title': 'Coffee & Tea', 'parents': ['food']},
+    {'alias': 'poutine', 'title': 'Poutineries', 'parents': ['food'], 'country_whitelist': ['CA']},
+]
+
+def test_malformed_plans_do_not_fail_the_batch():
+    good = {'address': 'San Francisco', 'sort': 'rating', 'activities': [{'category': 'coffee'}]}
+    plans = [
+        good,
+        {'activities': [{'category': 'coffee'}]},
+        {'address': 'San Francisco', 'activities': [{'category': 'missing'}]},
+        {'address': 'San Francisco', 'radius': 50000, 'activities': [{'category': 'coffee'}]},
+        {'address': 'San Francisco', 'activities': 'coffee'},
+        {'address': 'San Francisco', 'activities': [{'category': 'poutine'}]},
+        {'address': 'San Francisco', 'activities': [{'category': 'coffee', 'priority': 3}]},
+        ['not', 'a', 'plan'],
+    ]
+    results = run_batch(plans, CategoryTree(CATEGORIES), client_factory=StubYelpAPI, processes=2, chunksize=1)
+
+    assert len(results) == len(plans)
+    assert 'error' not in results[0]
+    assert results[0]['activities'][0]['business'] is not None
+    assert results[1] == {'error': '"address" is required'}
+    assert results[2] == {'error': 'Unknown category: missing'}
+    assert 'radius' in results[3]['error']
+    assert 'activities' in results[4]['error']
+    assert results[5] == {'error': 'Category poutine is not available in US'}
+    assert 'Priority' in results[6]['error']
+    assert 'error' in results[7]
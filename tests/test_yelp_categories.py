@@ -0,0 +1,81 @@
+'''
+Tests of the category tree and of its country views.
+'''
+
+from yelp_categories import OTHER_COUNTRIES, Category, CategoryTree, collation_key, format_level
+
+CATEGORIES = [
+    {'alias': 'food', 'title': 'Food', 'parents': []},
+    {'alias': 'coffee', 'title': 'Coffee & Tea', 'parents': ['food']},
+    {'alias': 'poutine', 'title': 'Poutineries', 'parents': ['food'], 'country_whitelist': ['CA']},
+    {'alias': 'bbq', 'title': 'Barbeque', 'parents': ['food'], 'country_blacklist': ['FR']},
+    {'alias': 'quebec', 'title': 'Quebec Classics', 'parents': ['poutine']},
+    {'alias': 'shopping', 'title': 'Shopping', 'parents': [], 'country_whitelist': ['US', 'CA']},
+]
+
+def aliases(categories):
+    return [cat.alias for cat in categories]
+
+def test_country_views_filter_the_tree():
+    tree = CategoryTree(CATEGORIES)
+    food = tree.nodes['food']
+
+    assert aliases(tree.country_view('us').roots()) == ['food', 'shopping']
+    assert aliases(tree.country_view('US').children(food)) == ['bbq', 'coffee']
+    assert aliases(tree.country_view('CA').children(food)) == ['bbq', 'coffee', 'poutine']
+    assert aliases(tree.country_view('FR').children(food)) == ['coffee']
+
+    # A category is only available where its parents are
+    assert tree.nodes['quebec'] in tree.country_view('CA')
+    assert tree.nodes['quebec'] not in tree.country_view('US')
+
+def test_countries_without_their_own_bit():
+    tree = CategoryTree(CATEGORIES)
+    assert tree.country_bit('JP') == tree.country_bit('BR') == OTHER_COUNTRIES
+
+    view = tree.country_view('JP')
+    assert aliases(view.roots()) == ['food']
+    assert aliases(view.children(tree.nodes['food'])) == ['bbq', 'coffee']
+    assert tree.country_view('jp') is view
+
+def test_views_are_built_up_front():
+    tree = CategoryTree(CATEGORIES)
+    view = tree.country_view('CA')
+    assert set(view._children) == set(tree.nodes)
+    assert view.children(tree.nodes['quebec']) == []
+
+def titles(categories):
+    return [cat.title for cat in categories]
+
+def test_collation_ignores_case_and_accents():
+    assert collation_key('Crêperies') < collation_key('Cupcakes')
+    assert collation_key('ATV Rentals/Tours') < collation_key('Auto Repair')
+    assert collation_key('Active Life') < collation_key('ATV Rentals/Tours')
+
+    # Titles only differing by case or accents still have a fixed order
+    assert collation_key('Cafe') != collation_key('Café')
+    assert sorted(['Café', 'cafe', 'Cafe'], key=collation_key) == ['Cafe', 'Café', 'cafe']
+
+def test_sorted_children_follow_new_children():
+    parent = Category('food', 'Food', [])
+    for title in ['Éclairs', 'bagels', 'Donuts', 'Cupcakes']:
+        parent.add_child(Category(title.lower(), title, ['food']))
+    assert titles(parent.sorted_children()) == ['bagels', 'Cupcakes', 'Donuts', 'Éclairs']
+    assert parent.sorted_children() is parent.sorted_children()
+
+    parent.add_child(Category('acai', 'Açaí Bowls', ['food']))
+    assert titles(parent.sorted_children())[0] == 'Açaí Bowls'
+
+def test_format_level_lists_a_short_level():
+    level = [Category(str(i), f'Category {i}', []) for i in range(3)]
+    assert format_level(level) == ('Category 0\nCategory 1\nCategory 2\n', 1)
+
+def test_format_level_pages_a_long_level_in_columns():
+    level = [Category(str(i), f'C{i:02}', []) for i in range(10)]
+    text, pages = format_level(level, width=15, rows=2)
+    assert pages == 2
+    assert text == 'C00  C02  C04\nC01  C03  C05\n\n(Page 1 of 2, enter "MORE" to see more categories)\n'
+
+    # Each column is as wide as the longest title, plus two spaces
+    text, _ = format_level(level, page=1, width=14, rows=2)
+    assert text == 'C04  C06\nC05  C07\n\n(Page 2 of 3, enter "MORE" to see more categories)\n'